@@ -6,9 +6,15 @@ aiida plugin for mobility calculations
 
 __version__ = "0.1.0a0"
 
+import json
+
+from aiida.common import exceptions
 from aiida.engine import CalcJob
 from aiida.orm import Bool
 
+from aiida_mobility.utils.resources import get_npool
+from aiida_mobility.utils.scheduler import get_dependency_markers
+
 
 class BaseCalculation(CalcJob):
     """
@@ -19,6 +25,8 @@ class BaseCalculation(CalcJob):
     _PREFIX = "aiida"
     _DEFAULT_INPUT_FILE = "aiida.in"
     _DEFAULT_OUTPUT_FILE = "aiida.out"
+    # the `-npools` and OpenMP threads of the job, stored with the input files
+    _PARALLELIZATION_FILE = "parallelization.json"
 
     _DEFAULT_METADATA_RESOURCES = {
         "num_machines": 1,
@@ -64,6 +72,89 @@ class BaseCalculation(CalcJob):
             help="""If True, clean the work dir upon the completion of a successfull calculation.""",
         )
 
+    def get_dependencies(self, settings):
+        """Get the working directories of the jobs the job waits for, the `DEPENDS_ON` key of the `settings` (popped).
+
+        Used by the eager mode of the workchains, the calculation is submitted before its parents have run, see
+        `aiida_mobility.workflows.eager`. The dependency markers are added to the `custom_scheduler_commands` option
+        by the workchain, see `aiida_mobility.workflows.eager.get_eager_options`, and resolved by the `mobility.*`
+        schedulers.
+
+        :param settings: the settings dict of the calculation
+        :raises InputValidationError: if the markers are not in the `custom_scheduler_commands` option
+        :return: the working directories of the parent jobs
+        :rtype: list
+        """
+        directories = list(settings.pop("DEPENDS_ON", []))
+        custom_scheduler_commands = (
+            self.node.get_option("custom_scheduler_commands") or ""
+        )
+        markers = get_dependency_markers(directories)
+        if markers not in custom_scheduler_commands:
+            raise exceptions.InputValidationError(
+                "The dependency markers of `DEPENDS_ON` are missing in the `custom_scheduler_commands` option."
+            )
+        return directories
+
+    def get_parallelization(self, settings, num_kpoints):
+        """Get the `-npools` and the OpenMP threads of the calculation from its `resources`.
+
+        The MPI ranks and OpenMP threads are planned by the workchains before submission, see
+        `aiida_mobility.utils.resources.plan_options`. The number of pools is `npools` of the `settings` (popped),
+        or the largest one which divides the number of MPI ranks and is not larger than `num_kpoints`.
+
+        :param settings: the settings dict of the calculation
+        :param num_kpoints: number of kpoints distributed over the pools, None if unknown
+        :return: `npools`, `num_mpiprocs_per_machine`, `num_threads` and `num_kpoints`
+        :rtype: dict
+        """
+        resources = self.node.get_option("resources")
+        num_mpiprocs_per_machine = (
+            resources.get("num_mpiprocs_per_machine", None)
+            or self.inputs.code.computer.get_default_mpiprocs_per_machine()
+            or 1
+        )
+        if "num_machines" in resources:
+            num_procs = resources["num_machines"] * num_mpiprocs_per_machine
+        else:
+            num_procs = resources.get("tot_num_mpiprocs", num_mpiprocs_per_machine)
+        npools = settings.pop("npools", None)
+        return {
+            "npools": get_npool(num_procs, num_kpoints or num_procs)
+            if npools is None
+            else int(npools),
+            "num_mpiprocs_per_machine": num_mpiprocs_per_machine,
+            "num_threads": resources.get("num_cores_per_mpiproc", None) or 1,
+            "num_kpoints": num_kpoints,
+        }
+
+    def write_parallelization(self, folder, parallelization):
+        """Write the parallelization to the sandbox `folder`, to be recorded by the parser, see `read_parallelization`.
+
+        :return: the prepend text exporting `OMP_NUM_THREADS`, empty if it is in the `environment_variables` option
+        :rtype: str
+        """
+        with folder.open(self._PARALLELIZATION_FILE, "w") as handle:
+            json.dump(parallelization, handle)
+        environment_variables = (
+            self.node.get_option("environment_variables") or {}
+        )
+        if "OMP_NUM_THREADS" in environment_variables:
+            return ""
+        return f"export OMP_NUM_THREADS={parallelization['num_threads']}"
+
+    @classmethod
+    def read_parallelization(cls, node):
+        """The parallelization written by `write_parallelization` in the repository of the calculation `node`.
+
+        :return: the parallelization, None if not found
+        :rtype: dict
+        """
+        try:
+            return json.loads(node.get_object_content(cls._PARALLELIZATION_FILE))
+        except (IOError, OSError, ValueError):
+            return None
+
     def on_terminated(self):
         """Clean remote folders of the calculations called in the workchain if the clean_workdir input is True."""
 
@@ -1,38 +1,121 @@
 import numpy as np
 from aiida import orm
 from aiida.engine import calcfunction
+from aiida_mobility.utils.kmesh import (
+    get_kpoints_mesh_list,
+    get_irreducible_kpoints,
+    get_kmesh_hash,
+)
+
+# extra set on the `convert_kpoints_mesh_to_list` node, used to find the result of an identical request
+KMESH_HASH_EXTRA = "kmesh_hash"
+
+
+def _get_kmesh(kmesh):
+    try:  # test if it is a mesh
+        mesh, offset = kmesh.get_kpoints_mesh()
+    except AttributeError as e:
+        e.args = ("input does not contain a mesh!",)
+        raise e
+    try:
+        cell = kmesh.cell
+    except AttributeError:
+        cell = None
+    return mesh, offset, cell
+
+
+def _get_symmetry_args(structure, symprec):
+    kind_numbers = {kind.name: index for index, kind in enumerate(structure.kinds)}
+    positions = np.array([site.position for site in structure.sites])
+    positions = positions @ np.linalg.inv(np.array(structure.cell))
+    numbers = [kind_numbers[site.kind_name] for site in structure.sites]
+    return structure.cell, positions, numbers, symprec
 
 
 @calcfunction
-def convert_kpoints_mesh_to_list(kmesh):
+def convert_kpoints_mesh_to_list(kmesh, structure=None, symprec=None):
     """works just like `kmesh.pl` in Wannier90
 
-    :param kmesh: contains a N1 * N2 * N3 mesh
+    If `structure` is given, the mesh is reduced to the irreducible wedge by spglib,
+    the weights are the multiplicities of the irreducible kpoints and the array `mapping`
+    of the output gives the index of the irreducible kpoint of each kpoint of the full mesh.
+
+    :param kmesh: contains a N1 * N2 * N3 mesh, the offset is honored
     :type kmesh: aiida.orm.KpointsData
+    :param structure: structure used for the symmetry reduction, optional
+    :type structure: aiida.orm.StructureData
+    :param symprec: symmetry tolerance of spglib, default 1e-5
+    :type symprec: aiida.orm.Float
     :raises AttributeError: if kmesh does not contains a mesh
     :return: an explicit list of kpoints
     :rtype: aiida.orm.KpointsData
     """
-    try:  # test if it is a mesh
-        results = kmesh.get_kpoints_mesh()
-    except AttributeError as e:
-        e.args = ("input does not contain a mesh!",)
-        raise e
-    else:
-        # currently offset is ignored
-        mesh = results[0]
-
-        # following is similar to wannier90/kmesh.pl
-        totpts = np.prod(mesh)
-        weights = np.ones([totpts]) / totpts
-
-        kpoints = np.zeros([totpts, 3])
-        ind = 0
-        for x in range(mesh[0]):
-            for y in range(mesh[1]):
-                for z in range(mesh[2]):
-                    kpoints[ind, :] = [x / mesh[0], y / mesh[1], z / mesh[2]]
-                    ind += 1
-        klist = orm.KpointsData()
+    mesh, offset, cell = _get_kmesh(kmesh)
+
+    klist = orm.KpointsData()
+    if cell is not None:
+        klist.set_cell(cell)
+    if structure is None:
+        kpoints = get_kpoints_mesh_list(mesh, offset)
+        weights = np.full(kpoints.shape[0], 1 / kpoints.shape[0])
         klist.set_kpoints(kpoints=kpoints, cartesian=False, weights=weights)
-        return klist
\ No newline at end of file
+    else:
+        symprec = 1e-5 if symprec is None else symprec.value
+        reduced = get_irreducible_kpoints(
+            mesh, offset, *_get_symmetry_args(structure, symprec)
+        )
+        klist.set_kpoints(kpoints=reduced["kpoints"], cartesian=False, weights=reduced["weights"])
+        klist.set_array("mapping", reduced["mapping"])
+    return klist
+
+
+def get_explicit_kpoints(kmesh, structure=None, symprec=None, metadata=None):
+    """Run `convert_kpoints_mesh_to_list`, reusing the output of an identical earlier request.
+
+    The request is identified by a content hash of mesh, offset, cell and, if reduced by symmetry,
+    the structure and `symprec`. If a finished `convert_kpoints_mesh_to_list` with the same hash
+    exists, its output is returned and no new node is created.
+
+    :param kmesh: contains a N1 * N2 * N3 mesh
+    :type kmesh: aiida.orm.KpointsData
+    :param structure: structure used for the symmetry reduction, optional
+    :type structure: aiida.orm.StructureData
+    :param symprec: symmetry tolerance of spglib
+    :type symprec: aiida.orm.Float
+    :param metadata: metadata of the calcfunction, e.g. `call_link_label`
+    :type metadata: dict
+    :return: an explicit list of kpoints
+    :rtype: aiida.orm.KpointsData
+    """
+    mesh, offset, cell = _get_kmesh(kmesh)
+    symmetry = None
+    if structure is not None:
+        symmetry = _get_symmetry_args(
+            structure, 1e-5 if symprec is None else symprec.value
+        )
+    kmesh_hash = get_kmesh_hash(mesh, offset, cell, symmetry)
+
+    qb = orm.QueryBuilder()
+    qb.append(
+        orm.CalcFunctionNode,
+        filters={
+            "attributes.function_name": convert_kpoints_mesh_to_list.__name__,
+            "attributes.exit_status": 0,
+            f"extras.{KMESH_HASH_EXTRA}": kmesh_hash,
+        },
+        tag="calc",
+    )
+    qb.append(orm.KpointsData, with_incoming="calc", project="*")
+    qb.limit(1)
+    cached = qb.first()
+    if cached is not None:
+        return cached[0]
+
+    inputs = {"kmesh": kmesh, "metadata": metadata or {}}
+    if structure is not None:
+        inputs["structure"] = structure
+        if symprec is not None:
+            inputs["symprec"] = symprec
+    klist, node = convert_kpoints_mesh_to_list.run_get_node(**inputs)
+    node.set_extra(KMESH_HASH_EXTRA, kmesh_hash)
+    return klist
@@ -0,0 +1,45 @@
+import numpy as np
+from aiida import orm
+from aiida.engine import calcfunction
+
+
+@calcfunction
+def merge_trans_sweep(temperatures, values, **conductivities):
+    """Merge the `conductivity` outputs of the `trans` calculations of a (T, n) or (T, Ef) sweep.
+
+    The rows of the temper files of the `trans` calculations must follow the order of
+    `get_temper_grid`, i.e. temperature as the slow index, split into consecutive blocks
+    whose outputs are passed with labels sorted in the same order.
+
+    :param temperatures: temperatures of the sweep, length nT
+    :type temperatures: aiida.orm.List
+    :param values: carrier concentrations or Fermi levels of the sweep, length nV
+    :type values: aiida.orm.List
+    :param conductivities: `conductivity` outputs of the `trans` calculations
+    :type conductivities: aiida.orm.ArrayData
+    :raises ValueError: if the total number of rows is not nT * nV
+    :return: arrays `temperatures`, `values`, `fermi_level`, `carrier_concentration` of shape (nT, nV),
+        `conductivity` and `mobility` (if present) of shape (nT, nV, 6)
+    :rtype: aiida.orm.ArrayData
+    """
+    temperatures = np.array(temperatures.get_list(), dtype=np.float64)
+    values = np.array(values.get_list(), dtype=np.float64)
+    shape = (len(temperatures), len(values))
+
+    tables = [conductivities[label] for label in sorted(conductivities)]
+
+    keys = ["fermi_level", "carrier_concentration", "conductivity"]
+    if all("mobility" in table.get_arraynames() for table in tables):
+        keys.append("mobility")
+
+    array = orm.ArrayData()
+    array.set_array("temperatures", temperatures)
+    array.set_array("values", values)
+    for key in keys:
+        merged = np.concatenate([table.get_array(key) for table in tables])
+        if merged.shape[0] != np.prod(shape):
+            raise ValueError(
+                f"Got {merged.shape[0]} rows of `{key}`, expected {shape[0]} x {shape[1]}."
+            )
+        array.set_array(key, merged.reshape(shape + merged.shape[1:]))
+    return array
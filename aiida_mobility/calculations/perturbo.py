@@ -8,7 +8,24 @@ from aiida.common import datastructures, exceptions
 #     QE2pertParser,
 # )
 from aiida_mobility.calculations import BaseCalculation
+from aiida_mobility.utils.perturbo import (
+    format_temper,
+    get_temper_grid,
+    get_temper_rows,
+)
+from aiida_mobility.utils.resources import get_number_of_kpoints
 from aiida import orm
+import numpy as np
+
+# the calc modes run back to back in one job in `chain` mode
+CHAIN_MODES = ("setup", "imsigma", "trans")
+# keys of the parameters written to the temper file instead of the namelist
+_TEMPER_KEYS = (
+    "temperatures",
+    "fermi_levels",
+    "carrier_concentrations",
+    "temper_grid",
+)
 
 
 class PerturboCalculation(BaseCalculation):
@@ -28,6 +45,12 @@ class PerturboCalculation(BaseCalculation):
         _DEFAULT_INPUT_FILE,
         _DEFAULT_OUTPUT_FILE,
     ]
+    # output files of each calc mode
+    _RETRIEVE_FILES = {
+        "setup": [f"{_PREFIX}.doping", f"{_PREFIX}.dos", _DEFAULT_TEMPER_FILE],
+        "imsigma": [f"{_PREFIX}.imsigma", f"{_PREFIX}.imsigma_mode"],
+        "trans": [f"{_PREFIX}.tdf", f"{_PREFIX}.cond"],
+    }
     _DEFAULT_PARAMETERS = {"prefix": _PREFIX, "ftemper": f"{_PREFIX}.temper"}
     _blocked_keys = [
         "prefix",
@@ -38,7 +61,7 @@ class PerturboCalculation(BaseCalculation):
     ]
     _DEFAULT_SETTINGS = {
         "PARENT_FOLDER_SYMLINK": True
-        # npools
+        # npools, see `get_parallelization`
     }
     _default_symlink_usage = False
 
@@ -55,11 +78,12 @@ class PerturboCalculation(BaseCalculation):
             valid_type=str,
             default=cls._DEFAULT_OUTPUT_FILE,
         )
+        spec.inputs["metadata"]["options"]["parser_name"].default = "perturbo"
         spec.input("metadata.options.withmpi", valid_type=bool, default=True)
         spec.input(
             "calc_mode",
             valid_type=orm.Str,
-            help="The calculation mode.",
+            help="The calculation mode, `chain` runs `setup`, `imsigma` and `trans` back to back in a single job.",
         )
         spec.input(
             "parameters",
@@ -96,6 +120,49 @@ class PerturboCalculation(BaseCalculation):
             valid_type=orm.Dict,
             help="The `output_parameters` output node of the successful calculation.",
         )
+        spec.output(
+            "doping",
+            valid_type=orm.ArrayData,
+            required=False,
+            help="`setup` mode: temperature, fermi_level and carrier_concentration of `prefix.doping`.",
+        )
+        spec.output(
+            "dos",
+            valid_type=orm.XyData,
+            required=False,
+            help="`setup` mode: density of states of `prefix.dos`.",
+        )
+        spec.output(
+            "imsigma",
+            valid_type=orm.ArrayData,
+            required=False,
+            help="`imsigma` mode: per-band imaginary self-energy of `prefix.imsigma` of shape (nT, nk, nbnd).",
+        )
+        spec.output(
+            "imsigma_mode",
+            valid_type=orm.ArrayData,
+            required=False,
+            help="`imsigma` mode: per-band and per-mode imaginary self-energy of `prefix.imsigma_mode`.",
+        )
+        spec.output(
+            "conductivity",
+            valid_type=orm.ArrayData,
+            required=False,
+            help="`trans` mode: conductivity and mobility tensors per temperature of `prefix.cond`.",
+        )
+        spec.output(
+            "tdf",
+            valid_type=orm.ArrayData,
+            required=False,
+            help="`trans` mode: transport distribution function vs energy of `prefix.tdf`.",
+        )
+        spec.output_namespace(
+            "stage_parameters",
+            valid_type=orm.Dict,
+            required=False,
+            dynamic=True,
+            help="`chain` mode: the output parameters of each stage, including its `exit_status`.",
+        )
         spec.exit_code(
             300,
             "ERROR_NO_RETRIEVED_TEMPORARY_FOLDER",
@@ -132,6 +199,16 @@ class PerturboCalculation(BaseCalculation):
             "ERROR_OUTPUT_STDOUT_INCOMPLETE",
             message="The stdout output file was incomplete probably because the calculation got interrupted.",
         )
+        spec.exit_code(
+            320,
+            "ERROR_OUTPUT_FILES_PARSE",
+            message="The output files could not be parsed.",
+        )
+        spec.exit_code(
+            330,
+            "ERROR_CHAIN_STAGE_FAILED",
+            message="The `{stage}` stage of the chain failed.",
+        )
 
     def validate_parent_calc(self):
         calc_mode = self.inputs.calc_mode.value.lower()
@@ -145,13 +222,13 @@ class PerturboCalculation(BaseCalculation):
                     "Parent folder has not provided."
                 )
         parent_calc = get_calc_from_folder(parent_folder)
-        if calc_mode == "setup":
+        if calc_mode in ("setup", "chain"):
             if (
                 parent_calc.process_type
                 != "aiida.calculations:mobility.qe2pert"
             ):
                 raise exceptions.InputValidationError(
-                    "Parent Calculation of perturbo that in `setup` mode is not a qe2pert calculation."
+                    f"Parent Calculation of perturbo that in `{calc_mode}` mode is not a qe2pert calculation."
                 )
         elif parent_calc.process_type != "aiida.calculations:mobility.perturbo":
             raise exceptions.InputValidationError(
@@ -160,9 +237,25 @@ class PerturboCalculation(BaseCalculation):
         # TODO: verify calc_mode of parent calculations.
         return parent_calc
 
+    def get_number_of_kpoints(self, parameters):
+        """Number of kpoints of the `kpoints` input or of the `boltz_kdim` grid, None if unknown."""
+        if "kpoints" in self.inputs:
+            return get_number_of_kpoints(self.inputs.kpoints)
+        kdim = [parameters.get(f"boltz_kdim({i})", None) for i in (1, 2, 3)]
+        if None in kdim:
+            return None
+        return int(np.prod(kdim))
+
     def write_temper_file(
-        self, folder, temperatures, fermi_levels, carrier_concentrations
+        self,
+        folder,
+        temperatures,
+        fermi_levels,
+        carrier_concentrations,
+        temper_grid=False,
     ):
+        """Write the temper file, pairing the i-th temperature with the i-th n or Ef,
+        or for the whole (T, n) or (T, Ef) grid if `temper_grid` is True."""
         if temperatures is None:
             raise exceptions.InputValidationError(
                 "You haven't explicit `temperatures` in parameters."
@@ -171,44 +264,90 @@ class PerturboCalculation(BaseCalculation):
             raise exceptions.InputValidationError(
                 "You haven't explicit `carrier_concentrations` or `fermi_levels` in parameters."
             )
-        if carrier_concentrations is not None and len(temperatures) != len(
-            carrier_concentrations
-        ):
-            raise exceptions.InputValidationError(
-                "The length of `carrier_concentrations` != length of `temperatures` in parameters."
+        get_rows = get_temper_grid if temper_grid else get_temper_rows
+        try:
+            rows, find_efermi = get_rows(
+                temperatures,
+                carrier_concentrations=carrier_concentrations,
+                fermi_levels=fermi_levels,
             )
+        except ValueError as exception:
+            raise exceptions.InputValidationError(str(exception))
+
         dst = folder.get_abs_path(self._DEFAULT_TEMPER_FILE)
         with open(dst, "w", encoding="utf8") as target:
-            if carrier_concentrations is not None:
-                target.write(f"{len(temperatures)}\tT")
-                for i in range(0, len(temperatures)):
-                    target.write(
-                        f"{temperatures[i]}\t0.00\t{carrier_concentrations[i]}\n"
-                    )
-            else:
-                target.write(f"{len(temperatures)}\t F\n")
-                for i in range(0, len(temperatures)):
-                    target.write(
-                        f"{temperatures[i]}\t{fermi_levels[i]}\t1.0E10\n"
-                    )
+            target.write(format_temper(rows, find_efermi))
+
+    def get_stage_parameters(self, calc_mode):
+        """Get the parameters of each perturbo run of the calculation.
+
+        In `chain` mode, the `parameters` input holds the parameters of each stage under the `setup`, `imsigma`
+        and `trans` keys, the other keys are shared by all the stages.
+
+        :return: dict of calc mode -> parameters
+        :rtype: dict
+        """
+        parameters = self.inputs.parameters.get_dict()
+        if calc_mode != "chain":
+            return {calc_mode: parameters}
+        stages = {stage: parameters.pop(stage, {}) for stage in CHAIN_MODES}
+        return {
+            stage: dict(parameters, **stage_parameters)
+            for stage, stage_parameters in stages.items()
+        }
+
+    @classmethod
+    def get_chain_filenames(cls, stage):
+        """The input and the stdout filenames of a stage in `chain` mode."""
+        return f"{cls._PREFIX}_{stage}.in", f"{cls._PREFIX}_{stage}.out"
+
+    @classmethod
+    def get_stdout_filenames(cls, node):
+        """The stdout filenames of the perturbo runs of the calculation `node`, in the order they run."""
+        if node.inputs.calc_mode.value.lower() != "chain":
+            return [node.get_option("output_filename")]
+        return [cls.get_chain_filenames(stage)[1] for stage in CHAIN_MODES]
+
+    def get_stage_filenames(self, calc_mode, stage):
+        """The input and the stdout filenames of a stage, the `metadata.options` ones unless in `chain` mode."""
+        if calc_mode != "chain":
+            return self.options.input_filename, self.options.output_filename
+        return self.get_chain_filenames(stage)
 
     def prepare_for_submission(self, folder):
         calc_mode = self.inputs.calc_mode.value.lower()
-        parameters = self.inputs.parameters.get_dict()
-        parameters.update({"kpoints": self.inputs.kpoints})
+        stage_parameters = self.get_stage_parameters(calc_mode)
+        for parameters in stage_parameters.values():
+            parameters.update({"kpoints": self.inputs.kpoints})
 
-        if calc_mode == "setup":
+        # the temper file is written in `setup` mode, and in the other modes it is linked
+        # from the parent folder, unless the temperatures are explicitly given (e.g. in a sweep)
+        first_parameters = next(iter(stage_parameters.values()))
+        temperatures = first_parameters.get("temperatures", None)
+        fermi_levels = first_parameters.get("fermi_levels", None)
+        carrier_concentrations = first_parameters.get(
+            "carrier_concentrations", None
+        )
+        temper_grid = first_parameters.get("temper_grid", False)
+        for parameters in stage_parameters.values():
+            for key in _TEMPER_KEYS:
+                parameters.pop(key, None)
+        write_temper = (
+            calc_mode in ("setup", "chain") or temperatures is not None
+        )
+        if write_temper:
             self.write_temper_file(
                 folder,
-                temperatures=parameters.pop("temperatures", None),
-                fermi_levels=parameters.pop("fermi_levels", None),
-                carrier_concentrations=parameters.pop(
-                    "carrier_concentrations", None
-                ),
+                temperatures=temperatures,
+                fermi_levels=fermi_levels,
+                carrier_concentrations=carrier_concentrations,
+                temper_grid=temper_grid,
             )
 
-        perturbo_parser = PerturboParser(calc_mode=calc_mode, **parameters)
-        parent_calc = self.validate_parent_calc()
+        perturbo_parsers = {
+            stage: PerturboParser(calc_mode=stage, **parameters)
+            for stage, parameters in stage_parameters.items()
+        }
         parent_folder = self.inputs.parent_folder
 
         settings = self.inputs.settings.get_dict()
@@ -216,12 +355,21 @@ class PerturboCalculation(BaseCalculation):
         remote_copy_list = []
         remote_symlink_list = []
         retrieve_list = []
-        retrieve_list.extend(self._DEFAULT_RETRIEVE_LIST)
 
         symlink = settings.pop(
             "PARENT_FOLDER_SYMLINK", self._default_symlink_usage
         )  # a boolean
 
+        if self.get_dependencies(settings):
+            # eager mode: the parent calculation has not run yet, its folder is only known by its path
+            if not symlink:
+                raise exceptions.InputValidationError(
+                    "The files of the parent calculation can only be symlinked with `DEPENDS_ON`."
+                )
+            parent_calc = None
+        else:
+            parent_calc = self.validate_parent_calc()
+
         if symlink:
             remote_symlink_list.append(
                 (
@@ -244,169 +392,75 @@ class PerturboCalculation(BaseCalculation):
                     ".",
                 )
             )  # copy the epwan.h5 file
-        if calc_mode == "setup":
-            retrieve_list.extend(
-                [f"{self._PREFIX}.doping", f"{self._PREFIX}.dos"]
-            )
-        elif calc_mode == "imsigma":
-            retrieve_list.extend(
-                [f"{self._PREFIX}.imsigma", f"{self._PREFIX}.imsigma_mode"]
-            )
-            if symlink:
-                remote_symlink_list.append(
-                    (
-                        parent_folder.computer.uuid,
-                        os.path.join(
-                            parent_folder.get_remote_path(),
-                            self._DEFAULT_TEMPER_FILE,
-                        ),
-                        self._DEFAULT_TEMPER_FILE,
-                    )
-                )  # copy the temper file
-                remote_symlink_list.append(
-                    (
-                        parent_folder.computer.uuid,
-                        os.path.join(
-                            parent_folder.get_remote_path(),
-                            f"{self._PREFIX}_tet.h5",
-                        ),
-                        f"{self._PREFIX}_tet.h5",
-                    )
-                )  # copy the tet.h5 file
-                remote_symlink_list.append(
-                    (
-                        parent_folder.computer.uuid,
-                        os.path.join(
-                            parent_folder.get_remote_path(),
-                            f"{self._PREFIX}_tet.kpt",
-                        ),
-                        f"{self._PREFIX}_tet.kpt",
-                    )
-                )  # copy the tet.kpt file
-            else:
-                remote_copy_list.append(
-                    (
-                        parent_folder.computer.uuid,
-                        os.path.join(
-                            parent_folder.get_remote_path(),
-                            self._DEFAULT_TEMPER_FILE,
-                        ),
-                        ".",
-                    )
-                )  # copy the temper file
-                remote_copy_list.append(
-                    (
-                        parent_folder.computer.uuid,
-                        os.path.join(
-                            parent_folder.get_remote_path(),
-                            f"{self._PREFIX}_tet.h5",
-                        ),
-                        ".",
-                    )
-                )  # copy the tet.h5 file
-                remote_copy_list.append(
-                    (
-                        parent_folder.computer.uuid,
-                        os.path.join(
-                            parent_folder.get_remote_path(),
-                            f"{self._PREFIX}_tet.kpt",
-                        ),
-                        ".",
-                    )
-                )  # copy the tet.kpt file
+        # files of the parent perturbo calculation required by the current calc mode,
+        # in `chain` mode all the stages run in the same folder so only the epwan file is needed
+        parent_files = []
+        for stage in perturbo_parsers:
+            retrieve_list.extend(self.get_stage_filenames(calc_mode, stage))
+            retrieve_list.extend(self._RETRIEVE_FILES.get(stage, []))
+        if calc_mode == "imsigma":
+            parent_files = [
+                self._DEFAULT_TEMPER_FILE,
+                f"{self._PREFIX}_tet.h5",
+                f"{self._PREFIX}_tet.kpt",
+            ]
         elif calc_mode == "trans":
-            retrieve_list.extend(
-                [f"{self._PREFIX}.tdf", f"{self._PREFIX}.cond"]
+            parent_files = [
+                self._DEFAULT_TEMPER_FILE,
+                f"{self._PREFIX}_tet.h5",
+                f"{self._PREFIX}.imsigma",
+            ]
+        if write_temper and self._DEFAULT_TEMPER_FILE in parent_files:
+            parent_files.remove(self._DEFAULT_TEMPER_FILE)
+
+        for filename in parent_files:
+            remote_path = os.path.join(
+                parent_folder.get_remote_path(), filename
             )
             if symlink:
                 remote_symlink_list.append(
-                    (
-                        parent_folder.computer.uuid,
-                        os.path.join(
-                            parent_folder.get_remote_path(),
-                            self._DEFAULT_TEMPER_FILE,
-                        ),
-                        self._DEFAULT_TEMPER_FILE,
-                    )
-                )  # copy the temper file
-                remote_symlink_list.append(
-                    (
-                        parent_folder.computer.uuid,
-                        os.path.join(
-                            parent_folder.get_remote_path(),
-                            f"{self._PREFIX}_tet.h5",
-                        ),
-                        f"{self._PREFIX}_tet.h5",
-                    )
-                )  # copy the tet.h5 file
-                remote_symlink_list.append(
-                    (
-                        parent_folder.computer.uuid,
-                        os.path.join(
-                            parent_folder.get_remote_path(),
-                            f"{self._PREFIX}.imsigma",
-                        ),
-                        f"{self._PREFIX}.imsigma",
-                    )
-                )  # copy the imsigma file
+                    (parent_folder.computer.uuid, remote_path, filename)
+                )
             else:
                 remote_copy_list.append(
-                    (
-                        parent_folder.computer.uuid,
-                        os.path.join(
-                            parent_folder.get_remote_path(),
-                            self._DEFAULT_TEMPER_FILE,
-                        ),
-                        ".",
-                    )
-                )  # copy the temper file
-                remote_copy_list.append(
-                    (
-                        parent_folder.computer.uuid,
-                        os.path.join(
-                            parent_folder.get_remote_path(),
-                            f"{self._PREFIX}_tet.h5",
-                        ),
-                        ".",
-                    )
-                )  # copy the tet.h5 file
-                remote_copy_list.append(
-                    (
-                        parent_folder.computer.uuid,
-                        os.path.join(
-                            parent_folder.get_remote_path(),
-                            f"{self._PREFIX}.imsigma",
-                        ),
-                        ".",
-                    )
-                )  # copy the imsigma file
+                    (parent_folder.computer.uuid, remote_path, ".")
+                )
 
-        # write input file
-        dst = folder.get_abs_path(self._DEFAULT_INPUT_FILE)
-        perturbo_parser.write(dst)
+        parallelization = self.get_parallelization(
+            settings, self.get_number_of_kpoints(first_parameters)
+        )
+        cmdline = list(settings.pop("CMDLINE", []))
 
-        codeinfo = datastructures.CodeInfo()
-        codeinfo.code_uuid = self.inputs.code.uuid
+        # write the input files, one code per stage run back to back in the same job
+        codes_info = []
+        for stage, perturbo_parser in perturbo_parsers.items():
+            input_filename, output_filename = self.get_stage_filenames(
+                calc_mode, stage
+            )
+            perturbo_parser.write(folder.get_abs_path(input_filename))
 
-        npools = settings.get(
-            "npools",
-            self.inputs.metadata.options.resources["num_mpiprocs_per_machine"],
-        )
-        codeinfo.cmdline_params = list(settings.pop("CMDLINE", [])) + [
-            "-npools",
-            npools,
-            "-in",
-            self.metadata.options.input_filename,
-        ]
-        codeinfo.stdout_name = self.options.output_filename
-        codeinfo.withmpi = self.inputs.metadata.options.withmpi
+            codeinfo = datastructures.CodeInfo()
+            codeinfo.code_uuid = self.inputs.code.uuid
+            codeinfo.cmdline_params = cmdline + [
+                "-npools",
+                str(parallelization["npools"]),
+                "-in",
+                input_filename,
+            ]
+            codeinfo.stdout_name = output_filename
+            codeinfo.withmpi = self.inputs.metadata.options.withmpi
+            codes_info.append(codeinfo)
 
         calcinfo = datastructures.CalcInfo()
-        calcinfo.codes_info = [codeinfo]
+        calcinfo.codes_info = codes_info
+        calcinfo.codes_run_mode = datastructures.CodeRunMode.SERIAL
+        calcinfo.prepend_text = self.write_parallelization(
+            folder, parallelization
+        )
         calcinfo.local_copy_list = local_copy_list
         calcinfo.remote_copy_list = remote_copy_list
         calcinfo.remote_symlink_list = remote_symlink_list
         calcinfo.retrieve_list = retrieve_list
         # calcinfo.retrieve_temporary_list = self._DEFAULT_RETRIEVE_TEMP_LIST
 
-        return calcinfo
\ No newline at end of file
+        return calcinfo
@@ -131,7 +131,10 @@ class PhRecoverCalculation(CalcJob):
 
         if "settings" in parent_calc.inputs:
             ph_settings = parent_calc.inputs.settings.get_dict()
-            settings = ph_settings.update(settings)
+            # the parent may be the initialization run of the concurrent q-points of `PhBaseWorkChain`
+            ph_settings.pop("ONLY_INITIALIZATION", None)
+            ph_settings.update(settings)
+            settings = ph_settings
 
         # If the parent calculation is a `PhCalculation` we are restarting
         restart_flag = True
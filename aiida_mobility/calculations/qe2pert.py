@@ -5,10 +5,42 @@ from aiida_mobility.parsers.data_parser.qe2pert_parser import (
     QE2pertParser,
 )
 from aiida_mobility.calculations import BaseCalculation
+from aiida_mobility.utils.transfer import (
+    TRANSFER_MODES,
+    estimate_dvscf_bytes,
+    format_bytes,
+    format_manifest,
+    get_dvscf_manifest,
+    get_transfer_script,
+)
+from aiida_mobility.utils.resources import get_number_of_kpoints
 from aiida import orm
 import numpy as np
 
 
+# extra of the `QE2PertCalculation` with `lwannier=False`, set by the workchain which submits it
+EPHMAT_KEY_EXTRA = "ephmat_key"
+
+
+def get_ephmat_key(ph_calc, nscf_folder, dft_band_min, dft_band_max, kpoints):
+    """The data which must be the same for two qe2pert calculations to share their e-ph matrix elements.
+
+    :param ph_calc: the ph calculation, or the `PhRecoverCalculation` on its folder
+    :return: a JSON serializable dict, stored in the `ephmat_key` extra
+    """
+    if "qpoints" not in ph_calc.inputs and "parent_folder" in ph_calc.inputs:
+        # `PhRecoverCalculation`
+        ph_calc = get_calc_from_folder(ph_calc.inputs.parent_folder)
+    mesh = kpoints.get_kpoints_mesh()[0]
+    return {
+        "ph_calc": ph_calc.uuid,
+        "nscf_folder": nscf_folder.uuid,
+        "dft_band_min": int(dft_band_min),
+        "dft_band_max": int(dft_band_max),
+        "kpoints": [int(nk) for nk in mesh],
+    }
+
+
 class QE2PertCalculation(BaseCalculation):
     """
     qe2pert calculation.
@@ -27,7 +59,7 @@ class QE2PertCalculation(BaseCalculation):
     ]
     _DEFAULT_SETTINGS = {
         "PARENT_FOLDER_SYMLINK": True
-        # npools
+        # npools, see `get_parallelization`
     }
     _INPUT_PH_SUBFOLDER = "./save/"
     _INPUT_NSCF_SUBFOLDER = "./out/"
@@ -38,6 +70,10 @@ class QE2PertCalculation(BaseCalculation):
         _QE_FOLDER_DYNAMICAL_MATRIX, "dynamical-matrix-"
     )
     _QE_DVSCF_PREFIX = "dvscf"
+    # e-ph matrix elements in the Bloch basis, one file per pool in the `outdir`
+    _QE_EPHMAT_FILES = f"{_PREFIX}_ephmat_p*.h5"
+    _PH_TRANSFER_MANIFEST = "ph_transfer.txt"
+    _PH_TRANSFER_SCRIPT = "ph_transfer.sh"
     _default_symlink_usage = False
 
     @classmethod
@@ -86,12 +122,12 @@ class QE2PertCalculation(BaseCalculation):
             default=lambda: orm.Bool(True),
             help="A logical flag. When it is .true., the e-ph matrix elements are computed using the Bloch wave functions rotated with the Wannier unitary matrix. If .false., the e-ph matrix elements are computed using the Bloch wave functions, and the e-ph matrix elements are then rotated using the Wannier unitary matrix.",
         )
-        # spec.input(
-        #     "load_ephmat",
-        #     valid_type=orm.Int,
-        #     default=lambda: orm.Bool(False),
-        #     help="A logical flag. If .true., reuse e-ph matrix elements in Bloch function basis computed previously.",
-        # )
+        spec.input(
+            "ephmat_folder",
+            valid_type=orm.RemoteData,
+            required=False,
+            help="The remote folder of an earlier calculation with `lwannier=False` on the same ph and nscf calculations, band window and kpoints. Its e-ph matrix elements in the Bloch basis are reused with `load_ephmat`, only the Wannier rotation is recomputed.",
+        )
         spec.input(
             "system_2d",
             valid_type=orm.Bool,
@@ -124,6 +160,12 @@ class QE2PertCalculation(BaseCalculation):
             valid_type=orm.Dict,
             help="The `output_parameters` output node of the successful calculation.",
         )
+        spec.output(
+            "epwan_decay",
+            valid_type=orm.ArrayData,
+            required=False,
+            help="The decay of the e-ph matrix elements in Wannier basis, i.e. max|g| vs |R|, parsed from the epwan file.",
+        )
         spec.exit_code(
             300,
             "ERROR_NO_RETRIEVED_TEMPORARY_FOLDER",
@@ -194,6 +236,95 @@ class QE2PertCalculation(BaseCalculation):
         kpoints = wannier90.inputs.scf__kpoints
         return number_wfs, kpoints
 
+    def validate_ephmat_folder(self, ephmat_key, settings):
+        """Check that the calculation of the `ephmat_folder` input computed the same e-ph matrix elements.
+
+        The files are split by pool, so `npools` of the `settings` is set to the one of that calculation.
+
+        :param ephmat_key: the `ephmat_key` of this calculation, None if the ph calculation has not run yet
+        """
+        if self.inputs.lwannier.value:
+            raise exceptions.InputValidationError(
+                "`ephmat_folder` needs `lwannier=False`, the e-ph matrix elements are reused in the Bloch basis."
+            )
+        ephmat_folder = self.inputs.ephmat_folder
+        ephmat_calc = get_calc_from_folder(ephmat_folder)
+        previous_key = ephmat_calc.get_extra(EPHMAT_KEY_EXTRA, None)
+        if ephmat_calc.process_type != self.node.process_type or (
+            previous_key is None
+            or (ephmat_key is not None and previous_key != ephmat_key)
+        ):
+            raise exceptions.InputValidationError(
+                f"ephmat_folder<{ephmat_folder.pk}> is not the folder of a qe2pert calculation with `lwannier=False` on the same ph and nscf calculations, band window and kpoints."
+            )
+        if "output_parameters" in ephmat_calc.outputs:
+            parallelization = ephmat_calc.outputs.output_parameters.get_attribute(
+                "parallelization", {}
+            )
+            if "npools" in parallelization:
+                settings.setdefault("npools", parallelization["npools"])
+        return ephmat_folder
+
+    def plan_ph_transfer(self, folder, ph_folder, number_of_qpoints, mode):
+        """Transfer the dvscf, phsave and dyn files of the ph.x calculation in one server-side pass.
+
+        Instead of one transport operation per file, a manifest and a script are written to the
+        sandbox folder, and the script is run at the beginning of the job by the prepend text of the calcinfo,
+        i.e. after the prepend texts of the computer and the code, before the `prepend_text` option.
+
+        :return: the line of the `prepend_text` of the calcinfo running the script
+        :rtype: str
+        """
+        manifest = get_dvscf_manifest(
+            number_of_qpoints,
+            prefix=self._PREFIX,
+            dvscf_prefix=f"{self._PREFIX}.{self._QE_DVSCF_PREFIX}",
+            output_subfolder=self._QE_OUTPUT_SUBFOLDER,
+            destination=self._INPUT_PH_SUBFOLDER,
+        )
+        with folder.open(self._PH_TRANSFER_MANIFEST, "w") as handle:
+            handle.write(format_manifest(manifest))
+        with folder.open(self._PH_TRANSFER_SCRIPT, "w") as handle:
+            handle.write(
+                get_transfer_script(
+                    ph_folder.get_remote_path(),
+                    self._PH_TRANSFER_MANIFEST,
+                    mode,
+                    folders=[
+                        (
+                            self._QE_FOLDER_DYNAMICAL_MATRIX,
+                            self._INPUT_PH_SUBFOLDER.strip("./"),
+                        )
+                    ],
+                )
+            )
+
+        size = self.estimate_dvscf_bytes(number_of_qpoints)
+        self.report(
+            "{} {} dvscf files in a single `{}` pass, estimated {} moved".format(
+                "linking" if mode == "symlink" else "copying",
+                number_of_qpoints,
+                mode,
+                "0 B" if mode == "symlink" else size,
+            )
+        )
+        return f"bash {self._PH_TRANSFER_SCRIPT}"
+
+    def estimate_dvscf_bytes(self, number_of_qpoints):
+        """Estimate the size of the dvscf files from the FFT grid of the nscf calculation."""
+        nscf_calc = get_calc_from_folder(self.inputs.nscf_folder)
+        parameters = nscf_calc.outputs.output_parameters
+        fft_grid = parameters.get_attribute("fft_grid", None)
+        if fft_grid is None:
+            return "unknown bytes"
+        size = estimate_dvscf_bytes(
+            number_of_qpoints,
+            len(nscf_calc.inputs.structure.sites),
+            fft_grid,
+            parameters.get_attribute("number_of_spin_components", 1),
+        )
+        return format_bytes(size)
+
     def prepare_for_submission(self, folder):
         nbands = self.get_nbands()
         number_wfs, kpoints = self.get_number_wfs_and_kpoints()
@@ -212,72 +343,84 @@ class QE2PertCalculation(BaseCalculation):
 
         # copy ph data from remote folder
         ph_folder = self.inputs.ph_folder
-        ph_calcs = ph_folder.get_incoming(node_class=orm.CalcJobNode).all()
-        if not ph_calcs:
-            raise exceptions.NotExistent(
-                f"parent_folder<{ph_folder.pk}> has no parent calculation"
-            )
-        elif len(ph_calcs) > 1:
-            raise exceptions.UniquenessError(
-                f"parent_folder<{ph_folder.pk}> has multiple parent calculations"
-            )
-        ph_calc = ph_calcs[0].node
         folder.get_subfolder(self._INPUT_PH_SUBFOLDER, create=True)
-
-        if symlink:
-            remote_symlink_list.append(
-                (
-                    ph_folder.computer.uuid,
-                    os.path.join(
-                        ph_folder.get_remote_path(),
-                        self._QE_FOLDER_DYNAMICAL_MATRIX,
-                        "*",
-                    ),
-                    self._INPUT_PH_SUBFOLDER,
+        if self.get_dependencies(settings):
+            # eager mode: the ph calculation has not run yet, its folder is only known by its path
+            ph_calc = None
+            number_of_qpoints = settings.pop("NUMBER_OF_QPOINTS", None)
+            if not number_of_qpoints:
+                raise exceptions.InputValidationError(
+                    "`NUMBER_OF_QPOINTS` of the settings is required with `DEPENDS_ON`."
                 )
-            )
         else:
-            remote_copy_list.append(
-                (
-                    ph_folder.computer.uuid,
-                    os.path.join(
-                        ph_folder.get_remote_path(),
-                        self._QE_FOLDER_DYNAMICAL_MATRIX,
-                        "*",
-                    ),
-                    self._INPUT_PH_SUBFOLDER,
+            ph_calcs = ph_folder.get_incoming(node_class=orm.CalcJobNode).all()
+            if not ph_calcs:
+                raise exceptions.NotExistent(
+                    f"parent_folder<{ph_folder.pk}> has no parent calculation"
+                )
+            elif len(ph_calcs) > 1:
+                raise exceptions.UniquenessError(
+                    f"parent_folder<{ph_folder.pk}> has multiple parent calculations"
                 )
-            )  # copy dyn files
+            ph_calc = ph_calcs[0].node
 
-        number_of_qpoints = ph_calc.outputs.output_parameters.get_attribute(
-            "number_of_qpoints", None
-        )
-        if not number_of_qpoints:
-            raise exceptions.NotExistent(
-                f"parent_folder<{ph_folder.pk}>'s parent calculation has no number_of_qpoints."
+            number_of_qpoints = ph_calc.outputs.output_parameters.get_attribute(
+                "number_of_qpoints", None
             )
+            if not number_of_qpoints:
+                raise exceptions.NotExistent(
+                    f"parent_folder<{ph_folder.pk}>'s parent calculation has no number_of_qpoints."
+                )
 
-        dvscf_prefix = f"{self._PREFIX}.{self._QE_DVSCF_PREFIX}"
+        # `auto`: symlink on the same filesystem, otherwise a single tar stream
+        transfer_mode = settings.pop("PH_TRANSFER_MODE", "auto")
+        if transfer_mode == "auto":
+            transfer_mode = "symlink" if symlink else "tar"
+        if transfer_mode not in TRANSFER_MODES:
+            raise exceptions.InputValidationError(
+                f"Invalid `PH_TRANSFER_MODE` {transfer_mode}, valid modes are {TRANSFER_MODES}."
+            )
+        if transfer_mode == "remote" and ph_calc is None:
+            raise exceptions.InputValidationError(
+                "`PH_TRANSFER_MODE` `remote` needs the files of the ph calculation at the upload, it cannot be used with `DEPENDS_ON`."
+            )
 
-        if symlink:
-            remote_symlink_list.append(
-                (
-                    ph_folder.computer.uuid,
-                    os.path.join(
-                        ph_folder.get_remote_path(),
-                        self._QE_OUTPUT_SUBFOLDER,
-                        "_ph0",
-                        f"{dvscf_prefix}1",
-                    ),
-                    os.path.join(
-                        self._INPUT_PH_SUBFOLDER, f"{dvscf_prefix}_q1"
-                    ),
+        prepend_text = []
+        if transfer_mode != "remote":
+            prepend_text.append(
+                self.plan_ph_transfer(
+                    folder, ph_folder, number_of_qpoints, transfer_mode
+                )
+            )
+        else:
+            if symlink:
+                remote_symlink_list.append(
+                    (
+                        ph_folder.computer.uuid,
+                        os.path.join(
+                            ph_folder.get_remote_path(),
+                            self._QE_FOLDER_DYNAMICAL_MATRIX,
+                            "*",
+                        ),
+                        self._INPUT_PH_SUBFOLDER,
+                    )
                 )
-            )  # link dvscf(default: `aiida.dvscf1`) of q1 to `aiida.dvscf_q1`
+            else:
+                remote_copy_list.append(
+                    (
+                        ph_folder.computer.uuid,
+                        os.path.join(
+                            ph_folder.get_remote_path(),
+                            self._QE_FOLDER_DYNAMICAL_MATRIX,
+                            "*",
+                        ),
+                        self._INPUT_PH_SUBFOLDER,
+                    )
+                )  # copy dyn files
 
-            for idx in range(
-                2, number_of_qpoints + 1
-            ):  # link dvscf(default: `aiida.dvscf1`) of q* to `aiida.dvscf_q*`
+            dvscf_prefix = f"{self._PREFIX}.{self._QE_DVSCF_PREFIX}"
+
+            if symlink:
                 remote_symlink_list.append(
                     (
                         ph_folder.computer.uuid,
@@ -285,48 +428,48 @@ class QE2PertCalculation(BaseCalculation):
                             ph_folder.get_remote_path(),
                             self._QE_OUTPUT_SUBFOLDER,
                             "_ph0",
-                            f"{self._PREFIX}.q_{idx}",
                             f"{dvscf_prefix}1",
                         ),
                         os.path.join(
-                            self._INPUT_PH_SUBFOLDER, f"{dvscf_prefix}_q{idx}"
+                            self._INPUT_PH_SUBFOLDER, f"{dvscf_prefix}_q1"
                         ),
                     )
-                )
+                )  # link dvscf(default: `aiida.dvscf1`) of q1 to `aiida.dvscf_q1`
 
-            remote_symlink_list.append(
-                (
-                    ph_folder.computer.uuid,
-                    os.path.join(
-                        ph_folder.get_remote_path(),
-                        self._QE_OUTPUT_SUBFOLDER,
-                        "_ph0",
-                        f"{self._PREFIX}.phsave",
-                    ),
-                    os.path.join(
-                        self._INPUT_PH_SUBFOLDER, f"{self._PREFIX}.phsave"
-                    ),
-                )
-            )  # link `aiida.phsave`
-        else:
-            remote_copy_list.append(
-                (
-                    ph_folder.computer.uuid,
-                    os.path.join(
-                        ph_folder.get_remote_path(),
-                        self._QE_OUTPUT_SUBFOLDER,
-                        "_ph0",
-                        f"{dvscf_prefix}1",
-                    ),
-                    os.path.join(
-                        self._INPUT_PH_SUBFOLDER, f"{dvscf_prefix}_q1"
-                    ),
-                )
-            )  # copy dvscf(default: `aiida.dvscf1`) of q1 to `aiida.dvscf_q1`
+                for idx in range(
+                    2, number_of_qpoints + 1
+                ):  # link dvscf(default: `aiida.dvscf1`) of q* to `aiida.dvscf_q*`
+                    remote_symlink_list.append(
+                        (
+                            ph_folder.computer.uuid,
+                            os.path.join(
+                                ph_folder.get_remote_path(),
+                                self._QE_OUTPUT_SUBFOLDER,
+                                "_ph0",
+                                f"{self._PREFIX}.q_{idx}",
+                                f"{dvscf_prefix}1",
+                            ),
+                            os.path.join(
+                                self._INPUT_PH_SUBFOLDER, f"{dvscf_prefix}_q{idx}"
+                            ),
+                        )
+                    )
 
-            for idx in range(
-                2, number_of_qpoints + 1
-            ):  # copy dvscf(default: `aiida.dvscf1`) of q* to `aiida.dvscf_q*`
+                remote_symlink_list.append(
+                    (
+                        ph_folder.computer.uuid,
+                        os.path.join(
+                            ph_folder.get_remote_path(),
+                            self._QE_OUTPUT_SUBFOLDER,
+                            "_ph0",
+                            f"{self._PREFIX}.phsave",
+                        ),
+                        os.path.join(
+                            self._INPUT_PH_SUBFOLDER, f"{self._PREFIX}.phsave"
+                        ),
+                    )
+                )  # link `aiida.phsave`
+            else:
                 remote_copy_list.append(
                     (
                         ph_folder.computer.uuid,
@@ -334,27 +477,45 @@ class QE2PertCalculation(BaseCalculation):
                             ph_folder.get_remote_path(),
                             self._QE_OUTPUT_SUBFOLDER,
                             "_ph0",
-                            f"{self._PREFIX}.q_{idx}",
                             f"{dvscf_prefix}1",
                         ),
                         os.path.join(
-                            self._INPUT_PH_SUBFOLDER, f"{dvscf_prefix}_q{idx}"
+                            self._INPUT_PH_SUBFOLDER, f"{dvscf_prefix}_q1"
                         ),
                     )
-                )
+                )  # copy dvscf(default: `aiida.dvscf1`) of q1 to `aiida.dvscf_q1`
 
-            remote_copy_list.append(
-                (
-                    ph_folder.computer.uuid,
-                    os.path.join(
-                        ph_folder.get_remote_path(),
-                        self._QE_OUTPUT_SUBFOLDER,
-                        "_ph0",
-                        f"{self._PREFIX}.phsave",
-                    ),
-                    self._INPUT_PH_SUBFOLDER,
-                )
-            )  # copy `aiida.phsave`
+                for idx in range(
+                    2, number_of_qpoints + 1
+                ):  # copy dvscf(default: `aiida.dvscf1`) of q* to `aiida.dvscf_q*`
+                    remote_copy_list.append(
+                        (
+                            ph_folder.computer.uuid,
+                            os.path.join(
+                                ph_folder.get_remote_path(),
+                                self._QE_OUTPUT_SUBFOLDER,
+                                "_ph0",
+                                f"{self._PREFIX}.q_{idx}",
+                                f"{dvscf_prefix}1",
+                            ),
+                            os.path.join(
+                                self._INPUT_PH_SUBFOLDER, f"{dvscf_prefix}_q{idx}"
+                            ),
+                        )
+                    )
+
+                remote_copy_list.append(
+                    (
+                        ph_folder.computer.uuid,
+                        os.path.join(
+                            ph_folder.get_remote_path(),
+                            self._QE_OUTPUT_SUBFOLDER,
+                            "_ph0",
+                            f"{self._PREFIX}.phsave",
+                        ),
+                        self._INPUT_PH_SUBFOLDER,
+                    )
+                )  # copy `aiida.phsave`
 
         # copy nscf data from remote folder
         nscf_folder = self.inputs.nscf_folder
@@ -427,6 +588,30 @@ class QE2PertCalculation(BaseCalculation):
             )  # copy aiida_u.mat and aiida_u_dis.mat
         # TODO: whether or not to copy aiida_band.kpt
 
+        if ph_calc is not None:
+            ephmat_key = get_ephmat_key(
+                ph_calc,
+                nscf_folder,
+                dft_band_min,
+                dft_band_max,
+                self.inputs.kpoints if "kpoints" in self.inputs else kpoints,
+            )
+        else:
+            ephmat_key = None
+        if "ephmat_folder" in self.inputs:
+            ephmat_folder = self.validate_ephmat_folder(ephmat_key, settings)
+            (remote_symlink_list if symlink else remote_copy_list).append(
+                (
+                    ephmat_folder.computer.uuid,
+                    os.path.join(
+                        ephmat_folder.get_remote_path(),
+                        self._QE_OUTPUT_SUBFOLDER,
+                        self._QE_EPHMAT_FILES,
+                    ),
+                    self._QE_OUTPUT_SUBFOLDER,
+                )
+            )  # link or copy the e-ph matrix elements of the earlier calculation
+
         # write input file
         dst = folder.get_abs_path(self._DEFAULT_INPUT_FILE)
         qe2pert_parser = QE2pertParser(
@@ -441,6 +626,7 @@ class QE2PertCalculation(BaseCalculation):
                 "dft_band_max": dft_band_max,
                 "num_wann": num_wann,
                 "lwannier": self.inputs.lwannier.value,
+                "load_ephmat": "ephmat_folder" in self.inputs,
                 "system_2d": self.inputs.system_2d.value,
             }
         )
@@ -449,13 +635,13 @@ class QE2PertCalculation(BaseCalculation):
         codeinfo = datastructures.CodeInfo()
         codeinfo.code_uuid = self.inputs.code.uuid
 
-        npools = settings.get(
-            "npools",
-            self.inputs.metadata.options.resources["num_mpiprocs_per_machine"],
+        num_kpoints = get_number_of_kpoints(
+            self.inputs.kpoints if "kpoints" in self.inputs else kpoints
         )
+        parallelization = self.get_parallelization(settings, num_kpoints)
         codeinfo.cmdline_params = list(settings.pop("CMDLINE", [])) + [
             "-npools",
-            npools,
+            str(parallelization["npools"]),
             "-in",
             self.metadata.options.input_filename,
         ]
@@ -464,6 +650,8 @@ class QE2PertCalculation(BaseCalculation):
 
         calcinfo = datastructures.CalcInfo()
         calcinfo.codes_info = [codeinfo]
+        prepend_text.append(self.write_parallelization(folder, parallelization))
+        calcinfo.prepend_text = "\n".join(filter(None, prepend_text))
         calcinfo.local_copy_list = local_copy_list
         calcinfo.remote_copy_list = remote_copy_list
         calcinfo.remote_symlink_list = remote_symlink_list
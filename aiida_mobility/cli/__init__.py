@@ -1,17 +1,51 @@
 # -*- coding: utf-8 -*-
-# pylint: disable=wrong-import-position,wildcard-import
-"""Module for the command line interface."""
+"""Module for the command line interface.
+
+The subcommands are only imported when they are invoked, see `LazyGroup`,
+keep the heavy imports (workflows, aiida_quantumespresso, ase, scipy, ...) inside the command bodies.
+"""
+import importlib
+import os
+
 import click
-import click_completion
 
 from aiida.cmdline.params import options, types
 
-# Activate the completion of parameter types provided by the click_completion package
-click_completion.init()
+if os.environ.get("_AIIDA_MOBILITY_COMPLETE"):
+    # Activate the completion of parameter types provided by the click_completion package
+    import click_completion
+
+    click_completion.init()
+
+
+class LazyGroup(click.Group):
+    """A click group whose subcommands are imported on first use.
+
+    :param lazy_subcommands: dict of command name -> `module:attribute` of the command
+    """
+
+    def __init__(self, *args, lazy_subcommands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_subcommands = lazy_subcommands or {}
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_subcommands))
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name in self.lazy_subcommands and cmd_name not in self.commands:
+            module_name, attribute = self.lazy_subcommands[cmd_name].split(":")
+            module = importlib.import_module(module_name, __name__)
+            self.add_command(getattr(module, attribute), cmd_name)
+        return super().get_command(ctx, cmd_name)
 
 
 @click.group(
     "aiida-mobility",
+    cls=LazyGroup,
+    lazy_subcommands={
+        "protocols": ".protocols:cmd_protocols",
+        "monitor": ".monitor:cmd_monitor",
+    },
     context_settings={"help_option_names": ["-h", "--help"]},
 )
 @options.PROFILE(type=types.ProfileParamType(load_profile=True))
@@ -19,10 +53,16 @@ def cmd_root(profile):  # pylint: disable=unused-argument
     """CLI for the `aiida-mobility` plugin."""
 
 
-@cmd_root.group("launch")
+@cmd_root.group(
+    "launch",
+    cls=LazyGroup,
+    lazy_subcommands={
+        "relax": ".workflows.relax:launch_relax",
+        "ph_bands": ".workflows.ph_bands:launch_ph_bands",
+        "automated_wannier": ".workflows.wannier:launch_automated_wannier",
+        "perturbo": ".workflows.perturbo:launch_perturbo",
+        "batch": ".workflows.batch:launch_batch",
+    },
+)
 def cmd_launch():
     """Commands to launch and interact with jobs."""
-
-
-from .workflows import *
-from .protocols import cmd_protocols
\ No newline at end of file
@@ -0,0 +1,209 @@
+import time
+from datetime import datetime
+
+import click
+from aiida.cmdline.utils import decorators
+
+PROCESS_LABELS = ("QE2PertCalculation", "PerturboCalculation")
+PROGRESS_STATE_EXTRA = "progress_monitor"
+# maximum number of bytes read from a stdout at each poll
+MAX_CHUNK_SIZE = 1024 ** 2
+
+
+def get_monitored_calculations(pks=None):
+    """Get the qe2pert and perturbo calculations which are running in the scheduler."""
+    from aiida import orm
+    from aiida.common.datastructures import CalcJobState
+
+    filters = {
+        "attributes.process_label": {"in": PROCESS_LABELS},
+        "attributes.state": CalcJobState.WITHSCHEDULER.value,
+    }
+    if pks:
+        filters["id"] = {"in": list(pks)}
+    qb = orm.QueryBuilder()
+    qb.append(orm.CalcJobNode, filters=filters, project="*")
+    return [node for node, in qb.iterall()]
+
+
+def get_stdout_filename(transport, node):
+    """The stdout of a calculation, for a perturbo `chain` the one of the current stage, i.e. the last one present."""
+    from aiida_mobility.calculations.perturbo import PerturboCalculation
+
+    if node.process_label != PerturboCalculation.__name__:
+        return node.get_option("output_filename")
+    filenames = PerturboCalculation.get_stdout_filenames(node)
+    if len(filenames) == 1:
+        return filenames[0]
+    try:
+        present = set(transport.listdir(node.get_remote_workdir()))
+    except OSError:
+        return filenames[0]
+    return next(
+        (filename for filename in reversed(filenames) if filename in present),
+        filenames[0],
+    )
+
+
+def read_stdout(transport, node, filename, offset):
+    """Read the remote stdout `filename` of a calculation from the byte `offset`, at most `MAX_CHUNK_SIZE` bytes.
+
+    :return: the text and its size in bytes, an empty text if the file does not exist yet
+    """
+    import os
+    from aiida.common.escaping import escape_for_bash
+
+    path = os.path.join(node.get_remote_workdir(), filename)
+    retval, stdout, _ = transport.exec_command_wait(
+        f"tail -c +{offset + 1} {escape_for_bash(path)} 2>/dev/null | head -c {MAX_CHUNK_SIZE}"
+    )
+    if retval != 0:
+        return "", 0
+    return stdout, len(stdout.encode("utf8"))
+
+
+def get_elapsed(node, state, now):
+    """Seconds since the start of the job, from the scheduler if known, otherwise since the first read."""
+    job_info = node.get_last_job_info()
+    elapsed = getattr(job_info, "wallclock_time_seconds", None)
+    if elapsed is not None:
+        return elapsed
+    samples = state["samples"]
+    return now - samples[0][0] if samples else 0
+
+
+def kill_calculation(node, message):
+    from aiida.manage.manager import get_manager
+
+    get_manager().get_process_controller().kill_process(node.pk, msg=message)
+    node.set_extra("progress_killed", message)
+
+
+def monitor_calculation(transport, node, kill_overrun, margin, stall_timeout):
+    """Read the new part of the stdout of a calculation and update its extras.
+
+    :return: a row of the report table
+    """
+    from aiida_mobility.utils.progress import (
+        estimate_eta,
+        new_progress_state,
+        predict_overrun,
+        update_progress,
+    )
+
+    now = time.time()
+    state = node.get_extra(PROGRESS_STATE_EXTRA, None) or new_progress_state()
+    filename = get_stdout_filename(transport, node)
+    if state.get("stdout", filename) != filename:
+        # the next stage of a perturbo `chain`, its stdout is read from the start
+        state = new_progress_state()
+    state["stdout"] = filename
+    chunk, num_bytes = read_stdout(transport, node, filename, state["offset"])
+    state = update_progress(state, chunk, now, num_bytes=num_bytes)
+    if state["updated"] is None:
+        state["updated"] = now
+
+    eta = estimate_eta(state)
+    stalled = now - state["updated"] > stall_timeout
+    extras = {
+        PROGRESS_STATE_EXTRA: state,
+        "progress": state["progress"],
+        "progress_eta": None
+        if eta is None
+        else datetime.fromtimestamp(now + eta).isoformat(timespec="seconds"),
+        "progress_stalled": stalled,
+    }
+    node.set_extra_many(extras)
+
+    status = "stalled" if stalled else ""
+    max_wallclock_seconds = node.get_option("max_wallclock_seconds")
+    if max_wallclock_seconds and predict_overrun(
+        state,
+        get_elapsed(node, state, now),
+        max_wallclock_seconds,
+        margin=margin,
+    ):
+        status = "overrun"
+        if kill_overrun:
+            kill_calculation(
+                node,
+                f"killed by the progress monitor: predicted to exceed the walltime of {max_wallclock_seconds} s",
+            )
+            status = "killed"
+
+    return [
+        node.pk,
+        node.process_label,
+        "-" if state["progress"] is None else f"{state['progress']:.2f}%",
+        extras["progress_eta"] or "-",
+        "-" if state["memory"] is None else f"{state['memory']:.0f} MB",
+        status,
+    ]
+
+
+@click.command("monitor")
+@click.argument("pks", nargs=-1, type=int)
+@click.option(
+    "-i",
+    "--interval",
+    type=float,
+    default=600,
+    show_default=True,
+    help="Seconds between two reads of the stdout.",
+)
+@click.option("--once", is_flag=True, help="Read the stdout once and exit.")
+@click.option(
+    "--kill-overrun",
+    is_flag=True,
+    help="Kill the calculations predicted to exceed their walltime, to restart them with more resources.",
+)
+@click.option(
+    "--margin",
+    type=float,
+    default=1.1,
+    show_default=True,
+    help="Predicted total time over walltime ratio above which a calculation is overrun.",
+)
+@click.option(
+    "--stall-timeout",
+    type=float,
+    default=3600,
+    show_default=True,
+    help="Seconds without new output after which a calculation is reported as stalled.",
+)
+@decorators.with_dbenv()
+def cmd_monitor(pks, interval, once, kill_overrun, margin, stall_timeout):
+    """Follow the progress of the running qe2pert and perturbo calculations.
+
+    The remote stdout of the calculations PKS, default all the running ones, is read incrementally through the
+    transport. The progress, the ETA and the memory are stored in the extras of the calculations.
+    """
+    from tabulate import tabulate
+
+    while True:
+        nodes_by_computer = {}
+        for node in get_monitored_calculations(pks):
+            nodes_by_computer.setdefault(node.computer.pk, []).append(node)
+
+        rows = []
+        for nodes in nodes_by_computer.values():
+            # a single connection for all the calculations of a computer
+            with nodes[0].get_transport() as transport:
+                for node in nodes:
+                    rows.append(
+                        monitor_calculation(
+                            transport, node, kill_overrun, margin, stall_timeout
+                        )
+                    )
+        if rows:
+            click.echo(
+                tabulate(
+                    rows,
+                    headers=["PK", "Process", "Progress", "ETA", "Memory", "Status"],
+                )
+            )
+        else:
+            click.echo("No running calculations to monitor.")
+        if once:
+            return
+        time.sleep(interval)
@@ -1,15 +1,11 @@
 import sys
 import json
 import importlib
-from ase.atoms import default
 import click
-from aiida_mobility.cli.utils.options import PARAMETERS_SET
-from aiida_mobility.utils import get_protocol
-from . import cmd_root
 from aiida_mobility.cli.utils import options
 
 
-@cmd_root.group("protocols")
+@click.group("protocols")
 def cmd_protocols():
     """Commands to show protocols."""
 
@@ -56,6 +52,7 @@ def show_protocol(protocol_type, protocol, parameters_set, structure):
     )
 
     if protocol_type == "pw":
+        from aiida_mobility.utils import get_protocol
 
         protocol, recommended_cutoffs = get_protocol(
             structure=structure,
@@ -97,4 +94,20 @@ def show_protocol(protocol_type, protocol, parameters_set, structure):
         protocol = get_ph_protocol_parameters(protocol, parameters_set)
         s += json.dumps(protocol, sort_keys=True, indent=2)
 
-    sys.stdout.write(s)
\ No newline at end of file
+    sys.stdout.write(s)
+
+
+@cmd_protocols.command("precompile")
+@click.option(
+    "-o",
+    "--output",
+    help="output file, default is `$AIIDA_MOBILITY_PROTOCOL_CACHE` or `protocols.pickle` in the AiiDA config folder.",
+    default=None,
+    type=click.Path(dir_okay=False),
+)
+def precompile(output):
+    """Precompile the pseudo families of the pw protocols, used instead of the jsons while they are unchanged."""
+    from aiida_mobility.utils.protocols.pw import precompile_protocols
+
+    filename = precompile_protocols(output)
+    sys.stdout.write("protocols precompiled to {}\n".format(filename))
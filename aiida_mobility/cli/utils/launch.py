@@ -7,12 +7,15 @@ import click
 from .display import echo_process_results
 
 
+ACTIVE_PROCESS_STATES = ("created", "waiting", "running")
+
+
 def add_to_group(node, group_name):
     if group_name is not None:
         try:
             g = orm.Group.get(label=group_name)
             group_statistics = "that already contains {} nodes".format(
-                len(g.nodes)
+                g.count()
             )
         except NotExistent:
             g = orm.Group(label=group_name)
@@ -26,6 +29,52 @@ def add_to_group(node, group_name):
         )
 
 
+def add_nodes_to_group(nodes, group_name):
+    """Add the nodes to the group with a single `add_nodes` call, the group is created if needed.
+
+    :param nodes: list of stored nodes
+    :param group_name: label of the group
+    :return: the group
+    """
+    group, created = orm.Group.objects.get_or_create(label=group_name)
+    if nodes:
+        group.add_nodes(nodes)
+    click.echo(
+        "{} nodes added to the {}group {}".format(
+            len(nodes), "new " if created else "", group_name
+        )
+    )
+    return group
+
+
+def store_nodes(nodes):
+    """Store the unstored nodes in a single database transaction.
+
+    :param nodes: list of nodes
+    :return: the list of nodes, all stored
+    """
+    from aiida.manage.manager import get_manager
+
+    with get_manager().get_backend().transaction():
+        for node in nodes:
+            if not node.is_stored:
+                node.store()
+    return nodes
+
+
+def count_active_processes(process_label=None):
+    """Count the processes that are created, waiting or running.
+
+    :param process_label: only count the processes with this label, e.g. the name of the workchain
+    :return: number of active processes
+    """
+    filters = {"attributes.process_state": {"in": list(ACTIVE_PROCESS_STATES)}}
+    if process_label is not None:
+        filters["attributes.process_label"] = process_label
+    qb = orm.QueryBuilder().append(orm.ProcessNode, filters=filters)
+    return qb.count()
+
+
 def launch_process(process, daemon, **inputs):
     """Launch a process with the given inputs.
 
@@ -1,8 +1,6 @@
 # -*- coding: utf-8 -*-
 """Pre-defined overridable options for commonly used command line interface parameters."""
 from aiida import orm
-from aiida_mobility.utils import read_structure
-from ase.atoms import default
 import click
 
 from aiida.cmdline.params import types
@@ -17,6 +15,8 @@ class StructureParamType(click.ParamType):
     name = "structure"
 
     def convert(self, value, param, ctx):
+        from aiida_mobility.utils import read_structure
+
         try:
             if isinstance(value, orm.StructureData):
                 return value
@@ -1,13 +1 @@
-from aiida_mobility.utils.scdm import __all__
-
-from .relax import launch_relax
-from .ph_bands import launch_ph_bands
-from .wannier import launch_automated_wannier
-from .perturbo import launch_perturbo
-
-__all__ = (
-    "launch_relax",
-    "launch_ph_bands",
-    "launch_automated_wannier",
-    "launch_perturbo",
-)
+"""Commands of the `launch` group, imported by the lazy group only when invoked."""
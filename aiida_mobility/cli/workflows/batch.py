@@ -0,0 +1,218 @@
+import json
+import os
+import time
+
+import click
+from aiida.cmdline.utils import decorators
+from ..utils import options
+from ..utils import launch
+from .relax import code_str, get_relax_inputs
+
+MANIFEST_VERSION = 1
+
+
+def read_structures(path):
+    """Read the structures of a directory (one or more structures per file) or of a trajectory file.
+
+    :param path: directory or ASE readable file, e.g. `.traj`, `.xyz`
+    :return: list of (key, ase.Atoms), the key is `filename` or `filename@index` for multi-frame files
+    """
+    from ase.io import read as aseread
+
+    if os.path.isdir(path):
+        filenames = [
+            os.path.join(path, name)
+            for name in sorted(os.listdir(path))
+            if os.path.isfile(os.path.join(path, name))
+        ]
+    else:
+        filenames = [path]
+
+    structures = []
+    for filename in filenames:
+        try:
+            frames = aseread(filename, index=":")
+        except Exception as exc:  # pylint: disable=broad-except
+            click.echo(f"Skip {filename}: {exc}", err=True)
+            continue
+        name = os.path.basename(filename)
+        if len(frames) == 1:
+            structures.append((name, frames[0]))
+        else:
+            structures.extend(
+                (f"{name}@{index}", atoms) for index, atoms in enumerate(frames)
+            )
+    return structures
+
+
+def get_default_manifest(path):
+    return os.path.abspath(path).rstrip(os.sep) + ".batch.json"
+
+
+def load_manifest(filename):
+    """Load the resume manifest, a dict of key -> {"structure": pk, "process": pk or None}."""
+    if not os.path.isfile(filename):
+        return {}
+    with open(filename) as handle:
+        data = json.load(handle)
+    if data.get("version") != MANIFEST_VERSION:
+        raise click.ClickException(
+            f"unsupported version of the manifest {filename}"
+        )
+    return data["entries"]
+
+
+def save_manifest(filename, entries):
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, "w") as handle:
+        json.dump(
+            {"version": MANIFEST_VERSION, "entries": entries}, handle, indent=1
+        )
+    os.replace(tmp_filename, filename)
+
+
+@click.command("batch")
+@click.argument("path", type=click.Path(exists=True))
+@options.PROTOCOL()
+@options.PARAMETERS_SET()
+@options.PARAMETERS()
+@options.PSEUDO_FAMILY()
+@options.KPOINTS_MESH()
+@options.CUTOFFS()
+@options.SYSTEM_2D()
+@options.VC_RELAX()
+@options.SOC()
+@options.QUEUE_NAME()
+@options.COMPUTER(
+    help=f"Computer that codes run on. <prerequisite: install codes you will run and set names to {code_str}.>"
+)
+@options.MAX_WALLCLOCK_SECONDS(default=24 * 3600)
+@options.MAX_NUM_MACHINES()
+@options.NUM_MPIPROCS_PER_MACHINE()
+@options.GROUP_NAME()
+@click.option(
+    "--max-active",
+    type=int,
+    default=100,
+    show_default=True,
+    help="Maximum number of active (created, waiting or running) workchains, the submission waits below it.",
+)
+@click.option(
+    "--poll-interval",
+    type=float,
+    default=30,
+    show_default=True,
+    help="Seconds between two checks of the number of active workchains.",
+)
+@click.option(
+    "--manifest",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Resume manifest, default is `PATH.batch.json`. Structures already submitted in it are skipped.",
+)
+@decorators.with_dbenv()
+def launch_batch(
+    path,
+    protocol,
+    parameters_set,
+    parameters,
+    pseudo_family,
+    kpoints_mesh,
+    cutoffs,
+    system_2d,
+    vc_relax,
+    soc,
+    queue,
+    computer,
+    max_wallclock_seconds,
+    max_num_machines,
+    num_mpiprocs_per_machine,
+    group_name,
+    max_active,
+    poll_interval,
+    manifest,
+):
+    """Submit the relax workchains of all the structures in PATH to the daemon.
+
+    PATH is a directory of structure files or a trajectory file.
+    """
+    from aiida import orm
+    from aiida.engine import submit
+    from aiida_mobility.workflows.pw.relax import PwRelaxWorkChain
+
+    process_label = PwRelaxWorkChain.__name__
+    if group_name is None:
+        group_name = process_label
+    if manifest is None:
+        manifest = get_default_manifest(path)
+    entries = load_manifest(manifest)
+
+    pending = []
+    for key, atoms in read_structures(path):
+        entry = entries.get(key, {})
+        if entry.get("process") is not None:
+            continue
+        if entry.get("structure") is not None:
+            structure = orm.load_node(entry["structure"])
+        else:
+            structure = orm.StructureData(ase=atoms)
+        pending.append((key, structure))
+    num_submitted = sum(
+        1 for entry in entries.values() if entry.get("process") is not None
+    )
+    click.echo(
+        f"{len(pending)} structures to submit, {num_submitted} already submitted"
+    )
+    if not pending:
+        return
+
+    # build all the inputs before storing anything, so that an invalid input does not leave a partial batch
+    pw_code = code_str + "@{}".format(computer)
+    all_inputs = [
+        get_relax_inputs(
+            structure,
+            pw_code,
+            protocol,
+            parameters_set,
+            parameters,
+            pseudo_family,
+            kpoints_mesh,
+            cutoffs,
+            system_2d,
+            vc_relax,
+            soc,
+            queue,
+            max_wallclock_seconds,
+            max_num_machines,
+            num_mpiprocs_per_machine,
+        )
+        for _, structure in pending
+    ]
+
+    launch.store_nodes([structure for _, structure in pending])
+    for key, structure in pending:
+        entries[key] = {"structure": structure.pk, "process": None}
+    save_manifest(manifest, entries)
+
+    submitted = []
+    try:
+        index = 0
+        while index < len(pending):
+            slots = max_active - launch.count_active_processes(process_label)
+            if slots <= 0:
+                time.sleep(poll_interval)
+                continue
+            for (key, _), inputs in zip(
+                pending[index : index + slots], all_inputs[index : index + slots]
+            ):
+                node = submit(PwRelaxWorkChain, **inputs)
+                entries[key]["process"] = node.pk
+                submitted.append(node)
+            index += slots
+            save_manifest(manifest, entries)
+            click.echo(
+                f"Submitted {min(index, len(pending))}/{len(pending)} {process_label}"
+            )
+    finally:
+        save_manifest(manifest, entries)
+        launch.add_nodes_to_group(submitted, group_name)
@@ -1,4 +1,3 @@
-from .. import cmd_launch
 import click
 from aiida.orm.utils import load_node
 from aiida import orm
@@ -9,7 +8,7 @@ from ..utils import options
 from ..utils import launch
 
 
-@cmd_launch.command("perturbo")
+@click.command("perturbo")
 @click.option(
     "--ph",
     required=True,
@@ -75,6 +74,26 @@ from ..utils import launch
     type=int,
     help="Contains the maximum number of iterations in the iterative scheme for solving Boltzmann equation. Default is `0`, which uses RTA.",
 )
+@click.option(
+    "--chain",
+    is_flag=True,
+    help="Run setup, imsigma and trans of each carrier in a single scheduler job.",
+)
+@click.option(
+    "--eager-submit",
+    is_flag=True,
+    help="Submit each calculation right after its parent, with a scheduler dependency. Needs a `mobility.*` scheduler.",
+)
+@click.option(
+    "--reuse-ephmat",
+    is_flag=True,
+    help="Reuse the e-ph matrix elements of an earlier qe2pert run on the same ph and nscf, e.g. after a new Wannierization.",
+)
+@click.option(
+    "--resume",
+    type=int,
+    help="PK of a failed or finished perturbo workflow, the stages it completed are skipped.",
+)
 @options.SYSTEM_2D()
 @options_core.CODES(help="qe2pert code, perturbo code")
 @options.MAX_NUM_MACHINES()
@@ -95,6 +114,10 @@ def launch_perturbo(
     nsamples,
     cauchy_scale,
     boltz_nstep,
+    chain,
+    eager_submit,
+    reuse_ephmat,
+    resume,
     system_2d,
     codes,
     max_num_machines,
@@ -114,6 +137,9 @@ def launch_perturbo(
             "system_2d": orm.Bool(system_2d),
         },
         "pert_code": codes[1],
+        "chain": orm.Bool(chain),
+        "eager_submit": orm.Bool(eager_submit),
+        "reuse_ephmat": orm.Bool(reuse_ephmat),
         "clean_workdir": orm.Bool(clean_workdir),
         "metadata": {
             "description": "Perturbo workflow",
@@ -129,6 +155,8 @@ def launch_perturbo(
         ),
     }
 
+    if resume is not None:
+        inputs["resume"] = {"workchain": orm.Int(resume)}
     if bands_energy_threshold is not None:
         inputs["bands_energy_threshold"] = orm.Float(bands_energy_threshold)
     if temperature is not None and len(temperature) == 3:
@@ -1,10 +1,3 @@
-from aiida_mobility.utils import (
-    get_metadata_options,
-    get_protocol,
-    get_pw_common_inputs,
-)
-from aiida_mobility.workflows.ph.bands import PhBandsWorkChain
-from .. import cmd_launch
 import click
 from aiida import orm
 from aiida.cmdline.utils import decorators
@@ -17,7 +10,7 @@ str_q2r = "q2r"
 str_matdyn = "matdyn"
 
 
-@cmd_launch.command("ph_bands")
+@click.command("ph_bands")
 @options.STRUCTURE()
 @options.PROTOCOL()
 @options.PARAMETERS_SET()
@@ -53,6 +46,18 @@ str_matdyn = "matdyn"
     is_flag=True,
     default=False,
 )
+@click.option(
+    "--parallelize-qpoints",
+    help="Run the irreducible qpoints as concurrent ph calculations sharing the scf folder.",
+    is_flag=True,
+    default=False,
+)
+@click.option(
+    "--qpoints-per-job",
+    type=int,
+    help="Number of irreducible qpoints computed by each concurrent ph calculation, default is 1",
+    default=1,
+)
 @options.PH_EPSIL()
 @options.QPOINTS_MESH()
 @options.QPOINTS_DISTANCE()
@@ -85,6 +90,8 @@ def launch_ph_bands(
     check_imaginary_frequencies,
     frequency_threshold,
     separated_qpoints,
+    parallelize_qpoints,
+    qpoints_per_job,
     epsil,
     qpoints_mesh,
     qpoints_distance,
@@ -100,6 +107,13 @@ def launch_ph_bands(
     num_mpiprocs_per_machine,
     daemon,
 ):
+    from aiida_mobility.utils import (
+        get_metadata_options,
+        get_protocol,
+        get_pw_common_inputs,
+    )
+    from aiida_mobility.workflows.ph.bands import PhBandsWorkChain
+
     print("running ph bands workflow for {}".format(structure.get_formula()))
 
     pw_code = orm.Code.get_from_string(f"{str_pw}@{computer}")
@@ -197,6 +211,8 @@ def launch_ph_bands(
         "check_imaginary_frequencies": orm.Bool(check_imaginary_frequencies),
         "frequency_threshold": orm.Float(frequency_threshold),
         "separated_qpoints": orm.Bool(separated_qpoints),
+        "parallelize_qpoints": orm.Bool(parallelize_qpoints),
+        "qpoints_per_job": orm.Int(qpoints_per_job),
     }
 
     if qpoints_mesh is not None:
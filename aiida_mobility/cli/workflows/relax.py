@@ -1,9 +1,4 @@
-from aiida_mobility.workflows.pw.relax import PwRelaxWorkChain
-from aiida_mobility.utils import (
-    get_protocol,
-    get_pw_common_inputs,
-)
-from .. import cmd_launch
+import click
 from aiida import orm
 from aiida.cmdline.utils import decorators
 from aiida.cmdline.params import options as options_core
@@ -14,7 +9,7 @@ from ..utils import launch
 code_str = "pw"
 
 
-@cmd_launch.command("relax")
+@click.command("relax")
 @options.STRUCTURE()
 @options.PROTOCOL()
 @options.PARAMETERS_SET()
@@ -52,13 +47,59 @@ def launch_relax(
     num_mpiprocs_per_machine,
     daemon,
 ):
+    from aiida_mobility.workflows.pw.relax import PwRelaxWorkChain
+
     print(
         "running relax structure calculation for {}".format(
             structure.get_formula()
         )
     )
 
-    pw_code = code_str + "@{}".format(computer)
+    relax_workchain_parameters = get_relax_inputs(
+        structure,
+        code_str + "@{}".format(computer),
+        protocol,
+        parameters_set,
+        parameters,
+        pseudo_family,
+        kpoints_mesh,
+        cutoffs,
+        system_2d,
+        vc_relax,
+        soc,
+        queue,
+        max_wallclock_seconds,
+        max_num_machines,
+        num_mpiprocs_per_machine,
+    )
+
+    launch.launch_process(
+        PwRelaxWorkChain, daemon, **relax_workchain_parameters
+    )
+
+
+def get_relax_inputs(
+    structure,
+    pw_code,
+    protocol,
+    parameters_set,
+    parameters,
+    pseudo_family,
+    kpoints_mesh,
+    cutoffs,
+    system_2d,
+    vc_relax,
+    soc,
+    queue,
+    max_wallclock_seconds,
+    max_num_machines,
+    num_mpiprocs_per_machine,
+):
+    """Get the inputs of the `PwRelaxWorkChain` for the structure, also used by `launch batch`."""
+    from aiida_mobility.utils import (
+        get_protocol,
+        get_pw_common_inputs,
+    )
 
     protocol, recommended_cutoffs = get_protocol(
         structure, parameters_set, protocol
@@ -67,7 +108,6 @@ def launch_relax(
     if soc:
         protocol.update({"lspinorb": True, "noncolin": True})
 
-    # Submit the Relax workchain
     relax_mode = "vc-relax" if vc_relax else "relax"
     relax_workchain_parameters = {
         "structure": structure,
@@ -95,6 +135,4 @@ def launch_relax(
     if kpoints_mesh is not None:
         relax_workchain_parameters["base"]["kpoints"] = kpoints_mesh
 
-    launch.launch_process(
-        PwRelaxWorkChain, daemon, **relax_workchain_parameters
-    )
\ No newline at end of file
+    return relax_workchain_parameters
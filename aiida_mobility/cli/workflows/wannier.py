@@ -1,11 +1,9 @@
 from aiida.common.exceptions import NotExistent
-from .. import cmd_launch
 import click
 from aiida import orm
 from aiida.cmdline.utils import decorators
 from ..utils import options
 from ..utils import launch
-from aiida_mobility.workflows.wannier.bands import Wannier90BandsWorkChain
 
 str_pw = "pw"
 str_pw2wan = "pw2wannier90"
@@ -14,7 +12,7 @@ str_wan = "wannier"
 str_opengrid = "opengrid"
 
 
-@cmd_launch.command("automated_wannier")
+@click.command("automated_wannier")
 @options.STRUCTURE()
 @options.PROTOCOL()
 @options.PARAMETERS_SET()
@@ -99,6 +97,8 @@ def launch_automated_wannier(
     num_mpiprocs_per_machine,
     daemon,
 ):
+    from aiida_mobility.workflows.wannier.bands import Wannier90BandsWorkChain
+
     try:
         codes = dict(
             pw=orm.Code.get_from_string(f"{str_pw}@{computer}"),
@@ -0,0 +1,218 @@
+from aiida import orm
+from aiida.common.exceptions import NotExistent
+from aiida.parsers.parser import Parser
+from aiida.engine import ExitCode
+import re
+import numpy as np
+from aiida_mobility.utils.perturbo import (
+    read_columns,
+    read_cond,
+    read_imsigma,
+    read_tdf,
+    TENSOR_COMPONENTS,
+)
+from aiida_mobility.calculations.perturbo import (
+    CHAIN_MODES,
+    PerturboCalculation,
+)
+
+
+class PerturboParser(Parser):
+    """Parser for an `PerturboCalculation` job.
+
+    The output files are streamed line by line from the retrieved folder into numpy arrays,
+    e.g. the `prefix.imsigma` files can be hundreds of MB and are never loaded as a whole string.
+    """
+
+    _PREFIX = "aiida"
+
+    def parse(self, **kwargs):
+        """Parse the contents of the output files stored in the `retrieved` output node."""
+
+        try:
+            retrieved = self.retrieved
+        except NotExistent:
+            self.logger.error("No retrieved folder found")
+            return self.exit_codes.ERROR_NO_RETRIEVED_FOLDER
+
+        calc_mode = self.node.inputs.calc_mode.value.lower()
+        if calc_mode == "chain":
+            return self.parse_chain(retrieved)
+
+        # The stdout is required for parsing
+        filename_stdout = self.node.get_attribute("output_filename")
+        exit_code, parameters = self.parse_stage(
+            retrieved, calc_mode, filename_stdout
+        )
+        if exit_code is not None:
+            return exit_code
+
+        self.add_parallelization(parameters)
+        self.out("output_parameters", orm.Dict(dict=parameters))
+        return ExitCode(0)
+
+    def add_parallelization(self, parameters):
+        """Add the `-npools` and OpenMP threads of the job to the output `parameters`, if they were recorded."""
+        parallelization = PerturboCalculation.read_parallelization(self.node)
+        if parallelization is not None:
+            parameters["parallelization"] = parallelization
+
+    def parse_stage(self, retrieved, calc_mode, filename_stdout):
+        """Parse the stdout and the output files of a perturbo run in `calc_mode`.
+
+        :return: the exit code, None if the run is successful, and the output parameters
+        :rtype: tuple
+        """
+        if filename_stdout not in retrieved.list_object_names():
+            return self.exit_codes.ERROR_OUTPUT_STDOUT_MISSING, None
+
+        try:
+            stdout = retrieved.get_object_content(filename_stdout)
+        except (IOError, OSError):
+            return self.exit_codes.ERROR_OUTPUT_STDOUT_READ, None
+
+        if re.search(r"JOB DONE", stdout) is None:
+            self.logger.error("ERROR_OUTPUT_STDOUT_INCOMPLETE")
+            return self.exit_codes.ERROR_OUTPUT_STDOUT_INCOMPLETE, None
+
+        cpu_time = re.search(
+            r"([\d\.]+h)?([\d\.]+m)?([\d\.]+s)?(?=\W+CPU)", stdout
+        )
+        wall_time = re.search(
+            r"([\d\.]+h)?([\d\.]+m)?([\d\.]+s)?(?=\W+WALL)", stdout
+        )
+        parameters = {
+            "calc_mode": calc_mode,
+            "cpu_time": cpu_time.group() if cpu_time else None,
+            "wall_time": wall_time.group() if wall_time else None,
+        }
+
+        parse_method = getattr(self, f"parse_{calc_mode}", None)
+        if parse_method is not None:
+            try:
+                exit_code = parse_method(retrieved, parameters)
+            except (IOError, OSError, ValueError) as exception:
+                self.logger.error(f"Failed to parse `{calc_mode}` output files: {exception}")
+                return self.exit_codes.ERROR_OUTPUT_FILES_PARSE, None
+            if exit_code is not None:
+                return exit_code, None
+        return None, parameters
+
+    def parse_chain(self, retrieved):
+        """Parse the `setup`, `imsigma` and `trans` stages run in a single job.
+
+        The stages are parsed in order up to the first failed one, the output parameters of each stage
+        are attached in the `stage_parameters` namespace, together with a summary in `output_parameters`.
+        """
+        summary = {"calc_mode": "chain", "stages": {}}
+        failed_stage = None
+        for stage in CHAIN_MODES:
+            exit_code, parameters = self.parse_stage(
+                retrieved,
+                stage,
+                PerturboCalculation.get_chain_filenames(stage)[1],
+            )
+            status = 0 if exit_code is None else exit_code.status
+            summary["stages"][stage] = status
+            if exit_code is not None:
+                self.logger.error(
+                    f"`{stage}` stage failed with exit status {status}"
+                )
+                failed_stage = stage
+                break
+            parameters["exit_status"] = status
+            self.out(f"stage_parameters.{stage}", orm.Dict(dict=parameters))
+
+        self.add_parallelization(summary)
+        self.out("output_parameters", orm.Dict(dict=summary))
+        if failed_stage is not None:
+            return self.exit_codes.ERROR_CHAIN_STAGE_FAILED.format(
+                stage=failed_stage
+            )
+        return ExitCode(0)
+
+    def _has_files(self, retrieved, *filenames):
+        names = retrieved.list_object_names()
+        missing = [filename for filename in filenames if filename not in names]
+        if missing:
+            self.logger.error(f"Missing output files: {missing}")
+            return False
+        return True
+
+    def parse_setup(self, retrieved, parameters):
+        """Parse `prefix.doping` (T, Ef, n) and `prefix.dos` (E, DOS)."""
+        doping_file = f"{self._PREFIX}.doping"
+        dos_file = f"{self._PREFIX}.dos"
+        if not self._has_files(retrieved, doping_file, dos_file):
+            return self.exit_codes.ERROR_OUTPUT_FILES
+
+        with retrieved.open(doping_file) as handle:
+            doping = read_columns(handle, 3)
+        array = orm.ArrayData()
+        array.set_array("temperature", doping[:, 0])
+        array.set_array("fermi_level", doping[:, 1])
+        array.set_array("carrier_concentration", doping[:, 2])
+        self.out("doping", array)
+
+        with retrieved.open(dos_file) as handle:
+            dos = read_columns(handle, 2)
+        xy = orm.XyData()
+        xy.set_x(dos[:, 0], "energy", "eV")
+        xy.set_y(dos[:, 1], "dos", "states/eV/unit.cell")
+        self.out("dos", xy)
+
+        parameters["fermi_levels"] = doping[:, 1].tolist()
+        parameters["carrier_concentrations"] = doping[:, 2].tolist()
+
+    def parse_imsigma(self, retrieved, parameters):
+        """Parse `prefix.imsigma` (per band) and `prefix.imsigma_mode` (per band and mode)."""
+        imsigma_file = f"{self._PREFIX}.imsigma"
+        if not self._has_files(retrieved, imsigma_file):
+            return self.exit_codes.ERROR_OUTPUT_FILES
+
+        for filename, link_label in (
+            (imsigma_file, "imsigma"),
+            (f"{self._PREFIX}.imsigma_mode", "imsigma_mode"),
+        ):
+            if filename not in retrieved.list_object_names():
+                continue
+            with retrieved.open(filename) as handle:
+                data = read_imsigma(handle)
+            array = orm.ArrayData()
+            for name, value in data.items():
+                array.set_array(name, value)
+            self.out(link_label, array)
+
+        parameters["temperatures"] = data["temperatures"].tolist()
+        parameters["chemical_potentials"] = data["chemical_potentials"].tolist()
+
+    def parse_trans(self, retrieved, parameters):
+        """Parse the conductivity/mobility tensors per T of `prefix.cond` and the TDF of `prefix.tdf`."""
+        cond_file = f"{self._PREFIX}.cond"
+        tdf_file = f"{self._PREFIX}.tdf"
+        if not self._has_files(retrieved, cond_file):
+            return self.exit_codes.ERROR_OUTPUT_FILES
+
+        with retrieved.open(cond_file) as handle:
+            cond = read_cond(handle)
+        array = orm.ArrayData()
+        for name, value in cond.items():
+            array.set_array(name, value)
+        self.out("conductivity", array)
+
+        if tdf_file in retrieved.list_object_names():
+            with retrieved.open(tdf_file) as handle:
+                tdf = read_tdf(handle)
+            array = orm.ArrayData()
+            for name, value in tdf.items():
+                array.set_array(name, value)
+            self.out("tdf", array)
+
+        parameters["temperatures"] = cond["temperature"].tolist()
+        parameters["tensor_components"] = list(TENSOR_COMPONENTS)
+        if "mobility" in cond:
+            # average of the diagonal xx, yy, zz components, for quick queries
+            diagonal = [TENSOR_COMPONENTS.index(key) for key in ("xx", "yy", "zz")]
+            parameters["mobility_average"] = np.mean(
+                cond["mobility"][:, diagonal], axis=1
+            ).tolist()
@@ -5,6 +5,11 @@ from aiida.engine import ExitCode
 import os
 import re
 from aiida_mobility.calculations.qe2pert import QE2PertCalculation
+from aiida_mobility.utils.epwan import (
+    DEFAULT_CHUNK_SIZE,
+    analyze_epwan,
+    read_epwan_rvectors,
+)
 
 
 class QE2PertParser(Parser):
@@ -48,15 +53,16 @@ class QE2PertParser(Parser):
                 wall_time = re.search(
                     "([\d\.]+h)?([\d\.]+m)?([\d\.]+s)?(?=\W+WALL)", stdout
                 ).group()
-                self.out(
-                    "output_parameters",
-                    orm.Ditc(
-                        dict={
-                            "cpu_time": cpu_time,
-                            "wall_time": wall_time,
-                        }
-                    ),
+                output_parameters = {
+                    "cpu_time": cpu_time,
+                    "wall_time": wall_time,
+                }
+                parallelization = QE2PertCalculation.read_parallelization(
+                    self.node
                 )
+                if parallelization is not None:
+                    # the e-ph matrix elements files are split by pool, see `validate_ephmat_folder`
+                    output_parameters["parallelization"] = parallelization
 
                 retrieve_temporary_list = self.node.get_attribute(
                     "retrieve_temporary_list", None
@@ -70,42 +76,68 @@ class QE2PertParser(Parser):
                             "ERROR_NO_RETRIEVED_TEMPORARY_FOLDER. [This will be an error in future versions.]"
                         )
                         # return self.exit_codes.ERROR_NO_RETRIEVED_TEMPORARY_FOLDER
-                    # # epwan.hdf5
-                    # filename = os.path.join(
-                    #     retrieved_temporary_folder,
-                    #     QE2PertCalculation._DEFAULT_EPWAN_FILE,
-                    # )
+                    else:
+                        # epwan.hdf5
+                        filename = os.path.join(
+                            retrieved_temporary_folder,
+                            QE2PertCalculation._DEFAULT_EPWAN_FILE,
+                        )
+                        if os.path.isfile(filename):
+                            # used to plan the ranks of the perturbo calculations
+                            output_parameters["epwan_size"] = os.path.getsize(
+                                filename
+                            )
+                            self.parse_epwan(filename)
+                self.out(
+                    "output_parameters", orm.Dict(dict=output_parameters)
+                )
         except (IOError, OSError):
             return self.exit_codes.ERROR_OUTPUT_STDOUT_READ
         return ExitCode(0)
 
-    def read_epwan(self, filename):
-        """read_epwan Read epwan data from an HDF5 file .
+    def parse_epwan(self, filename):
+        """Attach the decay of the e-ph matrix elements in Wannier basis as the `epwan_decay` output.
+
+        The chunk size (in bytes) can be set with the `EPWAN_CHUNK_SIZE` key of the `settings` input.
+        Failures are only logged since the epwan file itself is still valid for perturbo.
+        """
+        settings = self.node.inputs.settings.get_dict()
+        chunk_size = settings.get("EPWAN_CHUNK_SIZE", DEFAULT_CHUNK_SIZE)
+        try:
+            decay = self.read_epwan(filename, chunk_size=chunk_size)
+        except ImportError:
+            self.logger.warning("h5py is not installed, skip parsing epwan.")
+            return
+        except (KeyError, ValueError) as exception:
+            self.logger.warning(f"Failed to parse epwan: {exception}")
+            return
+
+        epwan_decay = orm.ArrayData()
+        for name, array in decay.items():
+            epwan_decay.set_array(name, array)
+        self.out("epwan_decay", epwan_decay)
+
+    @staticmethod
+    def read_epwan(filename, chunk_size=DEFAULT_CHUNK_SIZE):
+        """read_epwan Read the decay of e-ph matrix elements from an HDF5 file.
+
+        Thin wrapper of `aiida_mobility.utils.epwan.analyze_epwan`, which reads every
+        `ep_hop_r_*` dataset once in chunks of at most `chunk_size` bytes. The decay is
+        given vs |R| with the R vectors stored in the file, vs the index of R if not found.
 
         Args:
-            filename ([type]): [h5 file path]
+            filename ([str]): [h5 file path]
+            chunk_size ([int]): [maximum number of bytes read at once]
+
+        Returns:
+            [dict]: [`max_g`, `el_decay` and `ph_decay` arrays]
 
-        TODO: read ep_hop data to generate figures [arXiv:2105.04192v1: First-principles predictions of Hall and drift mobilities in semiconductors]
+        see arXiv:2105.04192v1: First-principles predictions of Hall and drift mobilities in semiconductors
         """
-        import h5py
-
-        h5 = h5py.File(filename)
-        na = h5["basic_data"]["nat"][()]
-        nb = h5["basic_data"]["num_wann"][()]
-        eph_matrix_wannier = h5["eph_matrix_wannier"]
-        ni, nj, _ = eph_matrix_wannier["ep_hop_r_1_1_1"].shape
-        for ri in range(0, ni):
-            for rj in range(0, nj):
-                max_cur = 0
-                for ia in range(1, na + 1):
-                    for jw in range(1, nb + 1):
-                        for iw in range(1, nb + 1):
-                            try:
-                                ep_hop = eph_matrix_wannier[
-                                    f"ep_hop_r_{ia}_{jw}_{iw}"
-                                ]
-                                temp = max(abs(ep_hop[ri, rj, :]))
-                            except Exception:
-                                continue
-                            if max_cur < temp:
-                                max_cur = temp
+        rvectors_el, rvectors_ph = read_epwan_rvectors(filename)
+        return analyze_epwan(
+            filename,
+            chunk_size=chunk_size,
+            rvectors_el=rvectors_el,
+            rvectors_ph=rvectors_ph,
+        )
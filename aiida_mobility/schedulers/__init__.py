@@ -0,0 +1 @@
+"""Schedulers which submit the dependent jobs of the eager mode of the workchains with an `afterok` dependency."""
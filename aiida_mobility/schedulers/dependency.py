@@ -0,0 +1,143 @@
+"""Scheduler plugins resolving the dependency markers of the submit scripts when the jobs are submitted.
+
+A job submitted before its parent has run (see `aiida_mobility.workflows.eager`) has one `#MOBILITY_AFTEROK`
+header line per parent working directory. Every job submitted by these schedulers writes its job id to its
+working directory, so at submission the markers are replaced by the `afterok` directive of the scheduler.
+If a parent job is not submitted yet, the submission fails and is retried by the engine.
+"""
+import os
+import tempfile
+
+from aiida.common.escaping import escape_for_bash
+from aiida.schedulers import SchedulerError
+from aiida.schedulers.datastructures import JobState
+from aiida.schedulers.plugins.direct import DirectScheduler
+from aiida.schedulers.plugins.pbspro import PbsproScheduler
+from aiida.schedulers.plugins.slurm import SlurmScheduler
+from aiida.schedulers.plugins.torque import TorqueScheduler
+
+from aiida_mobility.utils.scheduler import (
+    JOB_ID_FILENAME,
+    JOB_STATUS_FILENAME,
+    get_dependency_directories,
+    set_dependency_directive,
+)
+
+__all__ = (
+    "SlurmDependencyScheduler",
+    "PbsproDependencyScheduler",
+    "TorqueDependencyScheduler",
+    "DirectDependencyScheduler",
+)
+
+
+class DependencySchedulerMixin:
+    """Mixin of a scheduler plugin replacing the dependency markers with the `afterok` directive."""
+
+    # key of `aiida_mobility.utils.scheduler.DEPENDENCY_DIRECTIVES`
+    _dependency_type = None
+
+    def _read_file(self, path):
+        retval, stdout, stderr = self.transport.exec_command_wait(
+            f"cat {escape_for_bash(path)}"
+        )
+        if retval != 0:
+            raise SchedulerError(f"could not read {path}: {stderr}")
+        return stdout
+
+    def _write_file(self, path, content):
+        with tempfile.NamedTemporaryFile("w") as handle:
+            handle.write(content)
+            handle.flush()
+            self.transport.putfile(handle.name, path)
+
+    def _get_dependency_job_ids(self, directories):
+        """Get the ids of the jobs of the working `directories` which are still in the queue."""
+        job_ids = []
+        for directory in directories:
+            try:
+                job_ids.append(
+                    self._read_file(
+                        os.path.join(directory, JOB_ID_FILENAME)
+                    ).strip()
+                )
+            except SchedulerError:
+                raise SchedulerError(
+                    f"the parent job of {directory} is not submitted yet"
+                )
+        try:
+            jobs = self.get_jobs(jobs=job_ids, as_dict=True)
+        except SchedulerError:
+            return job_ids
+        # the jobs which have left the queue are over, a failed parent is handled by the workchain
+        return [
+            job_id
+            for job_id in job_ids
+            if job_id in jobs and jobs[job_id].job_state != JobState.DONE
+        ]
+
+    def submit_from_script(self, working_directory, submit_script):
+        self.transport.chdir(working_directory)
+        submit_script_path = os.path.join(working_directory, submit_script)
+        script = self._read_file(submit_script_path)
+        self._dependency_directories = get_dependency_directories(script)
+        if self._dependency_directories:
+            job_ids = self._get_dependency_job_ids(self._dependency_directories)
+            self._write_file(
+                submit_script_path,
+                set_dependency_directive(
+                    script, self._dependency_type, job_ids
+                ),
+            )
+        job_id = super().submit_from_script(working_directory, submit_script)
+        self._write_file(
+            os.path.join(working_directory, JOB_ID_FILENAME), f"{job_id}\n"
+        )
+        return job_id
+
+
+class SlurmDependencyScheduler(DependencySchedulerMixin, SlurmScheduler):
+    """SLURM with the `afterok` dependencies of the eager mode."""
+
+    _dependency_type = "slurm"
+
+
+class PbsproDependencyScheduler(DependencySchedulerMixin, PbsproScheduler):
+    """PBS Pro with the `afterok` dependencies of the eager mode."""
+
+    _dependency_type = "pbspro"
+
+
+class TorqueDependencyScheduler(DependencySchedulerMixin, TorqueScheduler):
+    """Torque with the `afterok` dependencies of the eager mode."""
+
+    _dependency_type = "torque"
+
+
+class DirectDependencyScheduler(DependencySchedulerMixin, DirectScheduler):
+    """Local stand-in of a batch scheduler honoring the `afterok` dependencies, to test the eager mode.
+
+    A job waits until the processes of its parent jobs have exited, and runs only if they all succeeded,
+    i.e. wrote `0` to their `.aiida_job_status` file. Otherwise, or if the job id of a parent cannot be read,
+    it exits with status `1` without running its script.
+    """
+
+    _dependency_type = "direct"
+    # seconds between two checks of the parent processes
+    _poll_interval = 5
+
+    def _get_submit_command(self, submit_script):
+        # any failure of the wait, e.g. a missing parent directory, aborts the job before its script runs
+        checks = "".join(
+            f"pid=$(cat {escape_for_bash(os.path.join(directory, JOB_ID_FILENAME))}) && [ -n \"$pid\" ] || abort; "
+            f"while kill -0 $pid 2>/dev/null; do sleep {self._poll_interval}; done; "
+            f'[ "$(cat {escape_for_bash(os.path.join(directory, JOB_STATUS_FILENAME))} 2>/dev/null)" = 0 ] '
+            f"|| abort; "
+            for directory in getattr(self, "_dependency_directories", [])
+        )
+        command = (
+            f"abort() {{ echo 1 > {JOB_STATUS_FILENAME}; exit 1; }}; "
+            f"{checks}bash {submit_script}; status=$?; "
+            f"echo $status > {JOB_STATUS_FILENAME}; exit $status"
+        )
+        return f"nohup bash -c {escape_for_bash(command)} > /dev/null 2>&1 & echo $!"
@@ -1,8 +1,7 @@
 #!/usr/bin/env runaiida
 import argparse
 import json
-from aiida import orm
-from aiida_wannier90_workflows.utils.upf import get_number_of_electrons_from_upf, get_number_of_projections_from_upf
+from aiida_mobility.utils.upf import get_pseudo_metadata_cache
 
 if __name__ == '__main__':
     OUTPUT_FILENAME = 'sssp_nelec_nproj.json'
@@ -18,26 +17,26 @@ if __name__ == '__main__':
     with open(args.file) as f:
         sssp = json.load(f)
 
+    # parse all the pseudos of the json file not cached yet, with a single query
+    cache = get_pseudo_metadata_cache()
+    md5s = [sssp[element]['md5'] for element in sssp]
+    cache.populate(filters={'attributes.md5': {'in': md5s}})
+
     results = {}
     for element in sssp:
         md5 = sssp[element]['md5']
-        builder = orm.QueryBuilder()
-        builder.append(orm.UpfData, filters={'attributes.md5': md5}, project=['uuid', 'attributes.element'])
-        res = builder.all()
-        if len(res) >= 1:
-            this_uuid, this_element = res[0]
-            this_upf = orm.load_node(this_uuid)
-            if element == this_element:
-                results[element] = dict(
-                    filename=sssp[element]['filename'],
-                    md5=md5,
-                    num_elec=get_number_of_electrons_from_upf(this_upf),
-                    num_proj=get_number_of_projections_from_upf(this_upf),
-                )
-        else:
+        metadata = cache.get(md5)
+        if metadata is None:
             raise Exception('Upf of {} not found'.format(element))
+        if element == metadata['element']:
+            results[element] = dict(
+                filename=sssp[element]['filename'],
+                md5=md5,
+                num_elec=metadata['z_valence'],
+                num_proj=metadata['number_of_pswfc'],
+            )
 
     with open(OUTPUT_FILENAME, 'w') as f:
         json.dump(results, f, indent=2)
 
-    print(f'written to file {OUTPUT_FILENAME}')
\ No newline at end of file
+    print(f'written to file {OUTPUT_FILENAME}')
@@ -46,7 +46,7 @@ def add_to_group(node, group_name):
         try:
             g = orm.Group.get(label=group_name)
             group_statistics = "that already contains {} nodes".format(
-                len(g.nodes)
+                g.count()
             )
         except NotExistent:
             g = orm.Group(label=group_name)
@@ -0,0 +1,107 @@
+import typing
+import numpy as np
+
+__all__ = ('BandsInfo', 'get_band_extrema', 'classify_bands')
+
+
+class BandsInfo(typing.NamedTuple):
+    """Band windows of electrons and holes, band indices start from 1 as in Perturbo."""
+
+    type: str
+    fermi_energy: float
+    el_min_band: int
+    el_max_band: int
+    el_e_min: float
+    el_e_max: float
+    hole_min_band: typing.Optional[int] = None
+    hole_max_band: typing.Optional[int] = None
+    hole_e_min: typing.Optional[float] = None
+    hole_e_max: typing.Optional[float] = None
+
+    @property
+    def is_metal(self) -> bool:
+        return self.type == 'metal'
+
+    def as_dict(self) -> dict:
+        """Return a plain dict without the unset hole keys, e.g. to be stored in the context of a workchain."""
+        return {key: value for key, value in self._asdict().items() if value is not None}
+
+
+def get_band_extrema(bands: np.array) -> typing.Tuple[np.array, np.array]:
+    """Get the minimum and maximum of each band of each spin channel over all the kpoints.
+
+    :param bands: band energies of shape (nk, nbnd) or (nspin, nk, nbnd)
+    :type bands: np.array
+    :raises ValueError: if the array is not 2D or 3D
+    :return: band minima and maxima, each of shape (nspin, nbnd), nspin is 1 for a 2D array
+    :rtype: tuple
+    """
+    bands = np.asarray(bands)
+    if bands.ndim not in (2, 3):
+        raise ValueError(f'bands must be of shape (nk, nbnd) or (nspin, nk, nbnd), got {bands.shape}')
+    if bands.ndim == 2:
+        bands = bands[None]
+    return bands.min(axis=1), bands.max(axis=1)
+
+
+def classify_bands(bands: np.array, fermi_energy: float, distance: float = 0.3) -> BandsInfo:
+    """Find the band windows for the transport calculations of electrons and holes.
+
+    A band is selected if its energy range is within `distance` of the Fermi energy for a metal,
+    of the conduction band minimum for electrons or of the valence band maximum for holes.
+    The system is a metal if a band of a spin channel crosses the Fermi energy, the band edges
+    are taken over all the spin channels. Only the per-band minima and maxima are computed from
+    the full array, all the selections are boolean masks on them.
+
+    :param bands: band energies of shape (nk, nbnd) or (nspin, nk, nbnd), spin channels share the band indices
+    :type bands: np.array
+    :param fermi_energy: the Fermi energy, in the same unit as `bands`
+    :type fermi_energy: float
+    :param distance: the energy window around the Fermi energy or the band edges
+    :type distance: float
+    :raises ValueError: if no band is found in one of the windows
+    :return: the band windows
+    :rtype: BandsInfo
+    """
+    band_min, band_max = get_band_extrema(bands)
+    fermi_energy = float(fermi_energy)
+
+    if np.any((band_min < fermi_energy) & (band_max >= fermi_energy)):
+        # distance between the Fermi energy and the energy range of each band of each spin
+        gap = np.maximum.reduce([band_min - fermi_energy, fermi_energy - band_max, np.zeros_like(band_min)])
+        calc_bands = np.flatnonzero(np.any(gap < distance, axis=0))
+        if calc_bands.size == 0:
+            raise ValueError('No bands between fermi energy {} +- {}.'.format(fermi_energy, distance))
+        return BandsInfo(
+            type='metal',
+            fermi_energy=fermi_energy,
+            el_min_band=int(calc_bands[0]) + 1,
+            el_max_band=int(calc_bands[-1]) + 1,
+            el_e_min=fermi_energy - distance,
+            el_e_max=fermi_energy + distance,
+        )
+
+    occupied = band_max < fermi_energy
+    if np.all(occupied):
+        raise ValueError('Cannot get el bands from bands data.')
+    if not np.any(occupied):
+        raise ValueError('Cannot get hole bands from bands data.')
+
+    el_min = band_min[~occupied].min()
+    hole_max = band_max[occupied].max()
+    el_selected = ~occupied & (band_min - el_min < distance)
+    hole_selected = occupied & (hole_max - band_max < distance)
+    calc_el_bands = np.flatnonzero(np.any(el_selected, axis=0))
+    calc_hole_bands = np.flatnonzero(np.any(hole_selected, axis=0))
+    return BandsInfo(
+        type='semiconductor',
+        fermi_energy=fermi_energy,
+        el_min_band=int(calc_el_bands[0]) + 1,
+        el_max_band=int(calc_el_bands[-1]) + 1,
+        el_e_min=float(el_min),
+        el_e_max=float(band_max[:, calc_el_bands[-1]][el_selected[:, calc_el_bands[-1]]].max()),
+        hole_min_band=int(calc_hole_bands[0]) + 1,
+        hole_max_band=int(calc_hole_bands[-1]) + 1,
+        hole_e_min=float(band_min[:, calc_hole_bands[0]][hole_selected[:, calc_hole_bands[0]]].min()),
+        hole_e_max=float(hole_max),
+    )
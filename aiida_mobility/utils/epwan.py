@@ -0,0 +1,172 @@
+import re
+import typing
+import numpy as np
+
+__all__ = ('DEFAULT_CHUNK_SIZE', 'reduce_ep_hop_max', 'get_epwan_decay', 'read_epwan_rvectors', 'analyze_epwan')
+
+# maximum number of bytes read from a `ep_hop_*` dataset at once, i.e. 64 MB
+DEFAULT_CHUNK_SIZE = 64 * 1024**2
+
+_EP_HOP_PATTERN = re.compile(r'^ep_hop_r_(\d+)_(\d+)_(\d+)$')
+# names of the datasets of the electron and phonon R vectors of the e-ph matrix elements, in the
+# `eph_matrix_wannier` or `basic_data` group
+_RVECTOR_DATASETS = {
+    'el': ('rvec_set_el', 'rvec_el'),
+    'ph': ('rvec_set_ph', 'rvec_ph'),
+}
+
+
+def _iter_row_slices(shape: tuple, itemsize: int, chunk_size: int) -> typing.Iterator[slice]:
+    """Yield slices along the first axis so that one slice holds at most `chunk_size` bytes.
+
+    At least one row is always returned, even if a single row is larger than `chunk_size`.
+    """
+    row_size = int(np.prod(shape[1:])) * itemsize
+    rows = max(1, chunk_size // max(row_size, 1))
+    for start in range(0, shape[0], rows):
+        yield slice(start, min(start + rows, shape[0]))
+
+
+def reduce_ep_hop_max(eph_matrix_wannier, chunk_size: int = DEFAULT_CHUNK_SIZE) -> np.array:
+    """Reduce all the `ep_hop_r_{ia}_{jw}_{iw}` datasets to max|g(Re, Rp)|.
+
+    Every dataset is visited exactly once and read in blocks of rows of at most `chunk_size` bytes,
+    the maximum over atoms, Wannier function pairs and cartesian directions is accumulated in place.
+    If the imaginary part `ep_hop_i_*` is present, the modulus of the complex matrix element is used.
+    No AiiDA or h5py dependencies: any mapping of name -> array-like with `shape`/`dtype` works.
+
+    :param eph_matrix_wannier: the `eph_matrix_wannier` group of the epwan HDF5 file
+    :type eph_matrix_wannier: h5py.Group or dict
+    :param chunk_size: maximum number of bytes to read per dataset at once
+    :type chunk_size: int
+    :raises ValueError: if no `ep_hop_r_*` dataset is found or the datasets have different shapes
+    :return: max|g| of shape (number of electron R vectors, number of phonon R vectors)
+    :rtype: np.array
+    """
+    names = sorted(
+        (name for name in eph_matrix_wannier.keys() if _EP_HOP_PATTERN.match(name)),
+        key=lambda name: tuple(int(i) for i in _EP_HOP_PATTERN.match(name).groups()),
+    )
+    if len(names) == 0:
+        raise ValueError('No `ep_hop_r_*` dataset found in `eph_matrix_wannier`')
+
+    shape = eph_matrix_wannier[names[0]].shape
+    max_g = np.zeros(shape[:2], dtype=np.float64)
+    for name in names:
+        ep_hop_r = eph_matrix_wannier[name]
+        if ep_hop_r.shape != shape:
+            raise ValueError(f'Shape of `{name}` {ep_hop_r.shape} differs from {shape}')
+        imag_name = name.replace('ep_hop_r_', 'ep_hop_i_', 1)
+        ep_hop_i = eph_matrix_wannier[imag_name] if imag_name in eph_matrix_wannier else None
+        itemsize = ep_hop_r.dtype.itemsize * (1 if ep_hop_i is None else 2)
+
+        for rows in _iter_row_slices(shape, itemsize, chunk_size):
+            if ep_hop_i is None:
+                block = np.abs(ep_hop_r[rows])
+            else:
+                block = np.hypot(ep_hop_r[rows], ep_hop_i[rows])
+            # reduce the cartesian directions (and any trailing axes)
+            block = block.reshape(block.shape[0], block.shape[1], -1).max(axis=-1)
+            np.maximum(max_g[rows], block, out=max_g[rows])
+    return max_g
+
+
+def get_epwan_decay(max_g: np.array, rvectors: np.array = None, cell: np.array = None, axis: int = 0) -> np.array:
+    """Build a decay-vs-|R| table from the max|g(Re, Rp)| array.
+
+    :param max_g: output of `reduce_ep_hop_max`
+    :type max_g: np.array
+    :param rvectors: R vectors along `axis` in fractional coordinates, shape (N, 3);
+        if None, the index of the R vector is used instead of |R|
+    :type rvectors: np.array
+    :param cell: lattice vectors in rows, used to convert `rvectors` to cartesian; identity if None
+    :type cell: np.array
+    :param axis: 0 for the decay along electron R vectors, 1 along phonon R vectors
+    :type axis: int
+    :return: shape (N, 2), 0th column |R| (sorted ascending), 1st column max|g| over the other R vectors
+    :rtype: np.array
+    """
+    decay = max_g.max(axis=1 - axis)
+    if rvectors is None:
+        distance = np.arange(decay.shape[0], dtype=np.float64)
+    else:
+        rvectors = np.asarray(rvectors, dtype=np.float64)
+        if cell is not None:
+            rvectors = rvectors @ np.asarray(cell, dtype=np.float64)
+        distance = np.linalg.norm(rvectors, axis=1)
+    if distance.shape[0] != decay.shape[0]:
+        raise ValueError(f'Number of R vectors {distance.shape[0]} != {decay.shape[0]}')
+    order = np.argsort(distance, kind='stable')
+    return np.column_stack((distance[order], decay[order]))
+
+
+def read_epwan_rvectors(filename: str) -> typing.Tuple[typing.Optional[np.array], typing.Optional[np.array]]:
+    """Read the electron and phonon R vectors of the e-ph matrix elements of an epwan HDF5 file.
+
+    They are looked up in the `eph_matrix_wannier` group, then in `basic_data`, stored as (3, N) by qe2pert.x
+    or (N, 3). The R vectors are ignored if their number differs from the one of the `ep_hop_r_*` datasets.
+
+    :param filename: path of the epwan HDF5 file written by qe2pert.x
+    :type filename: str
+    :return: the electron and phonon R vectors of shape (N, 3) in fractional coordinates, None if not found
+    :rtype: tuple
+    """
+    import h5py
+
+    rvectors = {}
+    with h5py.File(filename, 'r') as h5:
+        eph_matrix_wannier = h5['eph_matrix_wannier']
+        name = next((name for name in eph_matrix_wannier.keys() if _EP_HOP_PATTERN.match(name)), None)
+        if name is None:
+            return None, None
+        shape = eph_matrix_wannier[name].shape
+        for axis, kind in enumerate(('el', 'ph')):
+            datasets = [
+                h5[group][key] for group in ('eph_matrix_wannier', 'basic_data') if group in h5
+                for key in _RVECTOR_DATASETS[kind] if key in h5[group]
+            ]
+            if not datasets:
+                continue
+            array = np.asarray(datasets[0][()], dtype=np.float64)
+            if array.ndim == 2 and array.shape[0] == 3 and array.shape[1] != 3:
+                array = array.T
+            if array.shape == (shape[axis], 3):
+                rvectors[kind] = array
+    return rvectors.get('el', None), rvectors.get('ph', None)
+
+
+def analyze_epwan(filename: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                  rvectors_el: np.array = None, rvectors_ph: np.array = None) -> typing.Dict[str, np.array]:
+    """Analyze the spatial decay of the e-ph matrix elements in Wannier basis stored in an epwan HDF5 file.
+
+    see arXiv:2105.04192v1: First-principles predictions of Hall and drift mobilities in semiconductors
+
+    Usage:
+        decay = analyze_epwan('aiida_epwan.h5', chunk_size=16 * 1024**2)
+        decay['el_decay'][:, 1]
+
+    :param filename: path of the epwan HDF5 file written by qe2pert.x
+    :type filename: str
+    :param chunk_size: maximum number of bytes to read per dataset at once, bounds the peak memory
+    :type chunk_size: int
+    :param rvectors_el: electron R vectors in fractional coordinates, see `get_epwan_decay`
+    :type rvectors_el: np.array
+    :param rvectors_ph: phonon R vectors in fractional coordinates, see `get_epwan_decay`
+    :type rvectors_ph: np.array
+    :return: dict with `max_g` (Re x Rp), `el_decay` and `ph_decay` (N x 2) arrays
+    :rtype: dict
+    """
+    import h5py
+
+    with h5py.File(filename, 'r') as h5:
+        cell = None
+        if 'at' in h5['basic_data'] and 'alat' in h5['basic_data']:
+            # lattice vectors in units of alat
+            cell = np.asarray(h5['basic_data']['at'][()]).reshape(3, 3) * h5['basic_data']['alat'][()]
+        max_g = reduce_ep_hop_max(h5['eph_matrix_wannier'], chunk_size=chunk_size)
+
+    return {
+        'max_g': max_g,
+        'el_decay': get_epwan_decay(max_g, rvectors_el, cell, axis=0),
+        'ph_decay': get_epwan_decay(max_g, rvectors_ph, cell, axis=1),
+    }
@@ -0,0 +1,138 @@
+import functools
+import hashlib
+import typing
+import numpy as np
+
+__all__ = ('get_kpoints_mesh_list', 'get_irreducible_kpoints', 'get_kmesh_hash')
+
+# size of the functools.lru_cache of `get_kpoints_mesh_list`
+KMESH_CACHE_SIZE = 16
+
+
+def _normalize_mesh(mesh: typing.Sequence[int], offset: typing.Sequence[float] = None) -> tuple:
+    """Return `mesh` and `offset` as hashable tuples of int and float."""
+    mesh = tuple(int(n) for n in mesh)
+    if len(mesh) != 3 or any(n < 1 for n in mesh):
+        raise ValueError(f'Invalid kpoints mesh {mesh}')
+    offset = (0.0, 0.0, 0.0) if offset is None else tuple(float(o) for o in offset)
+    if len(offset) != 3:
+        raise ValueError(f'Invalid kpoints offset {offset}')
+    return mesh, offset
+
+
+@functools.lru_cache(maxsize=KMESH_CACHE_SIZE)
+def _get_kpoints_mesh_list(mesh: tuple, offset: tuple) -> np.array:
+    axes = [(np.arange(n) + o) / n for n, o in zip(mesh, offset)]
+    kpoints = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, 3)
+    kpoints.flags.writeable = False
+    return kpoints
+
+
+def get_kpoints_mesh_list(mesh: typing.Sequence[int], offset: typing.Sequence[float] = None) -> np.array:
+    """Get the explicit list of kpoints of a N1 * N2 * N3 mesh, works just like `kmesh.pl` in Wannier90.
+
+    The 3rd index runs fastest, the kpoints are (i + offset) / N in fractional coordinates.
+    The result is cached, the returned array is read-only.
+
+    :param mesh: N1, N2, N3
+    :type mesh: list
+    :param offset: offset of the mesh in units of the grid spacing, e.g. [0.5, 0.5, 0.5]
+    :type offset: list
+    :raises ValueError: if the mesh or offset is invalid
+    :return: kpoints in fractional coordinates, shape (N1 * N2 * N3, 3)
+    :rtype: np.array
+    """
+    return _get_kpoints_mesh_list(*_normalize_mesh(mesh, offset))
+
+
+def get_irreducible_kpoints(mesh: typing.Sequence[int], offset: typing.Sequence[float],
+                            cell: np.array, positions: np.array, numbers: typing.Sequence[int],
+                            symprec: float = 1e-5, time_reversal: bool = True) -> typing.Dict[str, np.array]:
+    """Reduce a kpoints mesh to the irreducible wedge with spglib.
+
+    The full mesh follows the order of `get_kpoints_mesh_list`, spglib only supports
+    unshifted or half-shifted meshes.
+
+    :param mesh: N1, N2, N3
+    :type mesh: list
+    :param offset: offset of the mesh in units of the grid spacing, each 0 or 0.5
+    :type offset: list
+    :param cell: lattice vectors in rows
+    :type cell: np.array
+    :param positions: atomic positions in fractional coordinates
+    :type positions: np.array
+    :param numbers: atomic numbers or any integer label of the kinds
+    :type numbers: list
+    :param symprec: symmetry tolerance of spglib
+    :type symprec: float
+    :param time_reversal: whether k and -k are equivalent
+    :type time_reversal: bool
+    :raises ValueError: if the offset is not 0 or 0.5, or spglib fails
+    :return: dict with `kpoints` (irreducible kpoints, fractional), `weights` (normalized to 1),
+        `mapping` (index of the irreducible kpoint of each kpoint of the full mesh)
+    :rtype: dict
+    """
+    import spglib
+
+    mesh, offset = _normalize_mesh(mesh, offset)
+    is_shift = np.rint(np.array(offset) * 2).astype(int)
+    if not np.allclose(is_shift / 2, offset) or np.any(is_shift > 1) or np.any(is_shift < 0):
+        raise ValueError(f'spglib only supports offsets of 0 or 0.5, got {offset}')
+
+    structure = (np.asarray(cell, dtype=np.float64), np.asarray(positions, dtype=np.float64),
+                 np.asarray(numbers, dtype=int))
+    result = spglib.get_ir_reciprocal_mesh(
+        mesh, structure, is_shift=is_shift, is_time_reversal=time_reversal, symprec=symprec)
+    if result is None:
+        raise ValueError('spglib failed to find the symmetry of the structure')
+    spg_mapping, grid_address = result
+
+    # spglib runs the 1st index fastest with addresses in [-N/2, N/2], reorder as `get_kpoints_mesh_list`
+    mesh_array = np.array(mesh)
+    address = np.mod(grid_address, mesh_array)
+    order = np.lexsort((address[:, 2], address[:, 1], address[:, 0]))
+    spg_mapping = spg_mapping[order]
+
+    irreducible, mapping, counts = np.unique(spg_mapping, return_inverse=True, return_counts=True)
+    kpoints = (np.mod(grid_address[irreducible], mesh_array) + is_shift / 2) / mesh_array
+    return {
+        'kpoints': kpoints,
+        'weights': counts / counts.sum(),
+        'mapping': mapping.reshape(-1),
+    }
+
+
+def _float_bytes(array) -> bytes:
+    """Return the bytes of a float array rounded to 1e-10, with -0.0 folded into 0.0."""
+    return (np.round(np.asarray(array, dtype=np.float64), 10) + 0.0).tobytes()
+
+
+def get_kmesh_hash(mesh: typing.Sequence[int], offset: typing.Sequence[float] = None, cell: np.array = None,
+                   symmetry: typing.Tuple[np.array, np.array, typing.Sequence[int], float] = None) -> str:
+    """Get a content hash of a kpoints mesh request, identical requests share the same hash.
+
+    :param mesh: N1, N2, N3
+    :type mesh: list
+    :param offset: offset of the mesh in units of the grid spacing
+    :type offset: list
+    :param cell: lattice vectors in rows
+    :type cell: np.array
+    :param symmetry: (cell, positions, numbers, symprec) of the structure if the mesh is reduced by symmetry
+    :type symmetry: tuple
+    :return: sha256 hex digest
+    :rtype: str
+    """
+    mesh, offset = _normalize_mesh(mesh, offset)
+    digest = hashlib.sha256()
+    digest.update(np.array(mesh, dtype=np.int64).tobytes())
+    digest.update(_float_bytes(offset))
+    if cell is not None:
+        digest.update(_float_bytes(cell))
+    if symmetry is not None:
+        structure_cell, positions, numbers, symprec = symmetry
+        digest.update(b'symmetry')
+        digest.update(_float_bytes(structure_cell))
+        digest.update(_float_bytes(positions))
+        digest.update(np.asarray(numbers, dtype=np.int64).tobytes())
+        digest.update(np.float64(symprec).tobytes())
+    return digest.hexdigest()
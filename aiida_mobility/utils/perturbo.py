@@ -0,0 +1,334 @@
+import re
+import typing
+import numpy as np
+
+__all__ = ('get_temper_rows', 'get_temper_grid', 'format_temper', 'read_temper', 'split_temper_rows', 'read_cond', 'read_tdf',
+           'read_imsigma', 'read_columns', 'TENSOR_COMPONENTS')
+
+# order of the tensor components in the perturbo output files
+TENSOR_COMPONENTS = ('xx', 'xy', 'yy', 'xz', 'yz', 'zz')
+
+# Boltzmann constant in meV/K
+KB_MEV = 8.617333262e-2
+
+Lines = typing.Union[str, typing.Iterable[str]]
+
+# placeholder of the unused column of a temper row
+_DEFAULT_FERMI_LEVEL = 0.0
+_DEFAULT_CARRIER_CONCENTRATION = 1.0E10
+
+
+def get_temper_rows(temperatures: typing.Sequence[float],
+                    carrier_concentrations: typing.Sequence[float] = None,
+                    fermi_levels: typing.Sequence[float] = None) -> typing.Tuple[np.array, bool]:
+    """Build the rows of a perturbo temper file pairing the i-th temperature with the i-th n or Ef.
+
+    :param temperatures: temperatures in K
+    :type temperatures: list
+    :param carrier_concentrations: carrier concentrations in cm^-3, the Fermi level is computed by perturbo
+    :type carrier_concentrations: list
+    :param fermi_levels: Fermi levels in eV, used only if `carrier_concentrations` is None
+    :type fermi_levels: list
+    :raises ValueError: if both `carrier_concentrations` and `fermi_levels` are None or the lengths differ
+    :return: rows of (T, Ef, n) of shape (len(T), 3), and whether perturbo should find Ef
+    :rtype: tuple
+    """
+    values = carrier_concentrations if carrier_concentrations is not None else fermi_levels
+    if values is None:
+        raise ValueError('Either `carrier_concentrations` or `fermi_levels` must be provided.')
+    if len(values) != len(temperatures):
+        raise ValueError(f'The length of the carrier concentrations or Fermi levels {len(values)} '
+                         f'!= the length of the temperatures {len(temperatures)}.')
+
+    temperatures = np.asarray(temperatures, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    rows = np.empty((len(temperatures), 3), dtype=np.float64)
+    rows[:, 0] = temperatures
+    if carrier_concentrations is not None:
+        rows[:, 1] = _DEFAULT_FERMI_LEVEL
+        rows[:, 2] = values
+    else:
+        rows[:, 1] = values
+        rows[:, 2] = _DEFAULT_CARRIER_CONCENTRATION
+    return rows, carrier_concentrations is not None
+
+
+def get_temper_grid(temperatures: typing.Sequence[float],
+                    carrier_concentrations: typing.Sequence[float] = None,
+                    fermi_levels: typing.Sequence[float] = None) -> typing.Tuple[np.array, bool]:
+    """Build the rows of a perturbo temper file for the (T, n) or (T, Ef) grid.
+
+    The rows are ordered with the temperature as the slow index, i.e. row `iT * len(n) + i_n`.
+
+    :param temperatures: temperatures in K
+    :type temperatures: list
+    :param carrier_concentrations: carrier concentrations in cm^-3, the Fermi level is computed by perturbo
+    :type carrier_concentrations: list
+    :param fermi_levels: Fermi levels in eV, used only if `carrier_concentrations` is None
+    :type fermi_levels: list
+    :raises ValueError: if both `carrier_concentrations` and `fermi_levels` are None
+    :return: rows of (T, Ef, n) of shape (len(T) * len(n), 3), and whether perturbo should find Ef
+    :rtype: tuple
+    """
+    temperatures = np.asarray(temperatures, dtype=np.float64)
+    if carrier_concentrations is not None:
+        values = np.asarray(carrier_concentrations, dtype=np.float64)
+        find_efermi = True
+    elif fermi_levels is not None:
+        values = np.asarray(fermi_levels, dtype=np.float64)
+        find_efermi = False
+    else:
+        raise ValueError('Either `carrier_concentrations` or `fermi_levels` must be provided.')
+
+    grid_t, grid_v = np.meshgrid(temperatures, values, indexing='ij')
+    rows = np.empty((grid_t.size, 3), dtype=np.float64)
+    rows[:, 0] = grid_t.ravel()
+    if find_efermi:
+        rows[:, 1] = _DEFAULT_FERMI_LEVEL
+        rows[:, 2] = grid_v.ravel()
+    else:
+        rows[:, 1] = grid_v.ravel()
+        rows[:, 2] = _DEFAULT_CARRIER_CONCENTRATION
+    return rows, find_efermi
+
+
+def format_temper(rows: np.array, find_efermi: bool) -> str:
+    """Return the content of a perturbo temper file.
+
+    :param rows: (T, Ef, n) rows, see `get_temper_grid`
+    :type rows: np.array
+    :param find_efermi: if True the Fermi level is computed by perturbo from the carrier concentration
+    :type find_efermi: bool
+    :return: content of the temper file
+    :rtype: str
+    """
+    lines = [f"{len(rows)}\t{'T' if find_efermi else 'F'}"]
+    for temperature, fermi_level, concentration in rows:
+        lines.append(f'{temperature}\t{fermi_level}\t{concentration:.6E}')
+    return '\n'.join(lines) + '\n'
+
+
+def read_temper(content: str) -> typing.Tuple[np.array, bool]:
+    """Read the rows of a perturbo temper file, the inverse of `format_temper`.
+
+    :param content: content of the temper file
+    :type content: str
+    :return: rows of (T, Ef, n) and whether perturbo should find Ef
+    :rtype: tuple
+    """
+    lines = [line.split() for line in content.splitlines() if line.strip()]
+    number_of_rows = int(lines[0][0])
+    find_efermi = len(lines[0]) > 1 and lines[0][1].upper().startswith('T')
+    rows = np.array([[float(val) for val in line[:3]] for line in lines[1:number_of_rows + 1]], dtype=np.float64)
+    if rows.shape != (number_of_rows, 3):
+        raise ValueError(f'Expected {number_of_rows} rows of (T, Ef, n) in the temper file, got {rows.shape}.')
+    return rows, find_efermi
+
+
+def split_temper_rows(rows: np.array, rows_per_job: int) -> typing.List[np.array]:
+    """Split the temper rows into consecutive blocks of at most `rows_per_job` rows.
+
+    :param rows: (T, Ef, n) rows, see `get_temper_grid`
+    :type rows: np.array
+    :param rows_per_job: maximum number of rows in a block
+    :type rows_per_job: int
+    :return: list of blocks of rows
+    :rtype: list
+    """
+    rows_per_job = max(1, int(rows_per_job))
+    return [rows[start:start + rows_per_job] for start in range(0, len(rows), rows_per_job)]
+
+
+def _iter_lines(lines: Lines) -> typing.Iterator[str]:
+    """Iterate over the lines of a str or of an iterable of lines, e.g. an opened file handle."""
+    if isinstance(lines, str):
+        return iter(lines.splitlines())
+    return iter(lines)
+
+
+def read_cond(content: Lines) -> typing.Dict[str, np.array]:
+    """Read the conductivity and mobility tables of a perturbo `prefix.cond` file.
+
+    If a table is written several times, e.g. for each iteration of the iterative solution,
+    the last one is returned.
+
+    :param content: content of the `prefix.cond` file, or an opened file handle
+    :type content: str or typing.Iterable[str]
+    :return: dict with `temperature`, `fermi_level`, `carrier_concentration` of shape (N,),
+        `conductivity` and `mobility` of shape (N, 6) in the order of `TENSOR_COMPONENTS`;
+        `mobility` is absent for metals
+    :rtype: dict
+    """
+    tables = {}
+    section = None
+    rows = []
+
+    def _close():
+        if section is not None and len(rows) > 0:
+            tables[section] = np.array(rows, dtype=np.float64)
+
+    for line in _iter_lines(content):
+        stripped = line.strip()
+        if stripped.startswith('#'):
+            lower = stripped.lower()
+            if 'conductivity' in lower:
+                _close()
+                section, rows = 'conductivity', []
+            elif 'mobility' in lower:
+                _close()
+                section, rows = 'mobility', []
+            continue
+        if section is None or len(stripped) == 0:
+            continue
+        values = stripped.split()
+        if len(values) < 3 + len(TENSOR_COMPONENTS):
+            continue
+        rows.append([float(val) for val in values[:3 + len(TENSOR_COMPONENTS)]])
+    _close()
+
+    if 'conductivity' not in tables:
+        raise ValueError('No conductivity table found in the cond file.')
+
+    conductivity = tables['conductivity']
+    result = {
+        'temperature': conductivity[:, 0],
+        'fermi_level': conductivity[:, 1],
+        'carrier_concentration': conductivity[:, 2],
+        'conductivity': conductivity[:, 3:],
+    }
+    if 'mobility' in tables:
+        result['mobility'] = tables['mobility'][:, 3:]
+    return result
+
+
+def read_columns(content: Lines, ncols: int) -> np.array:
+    """Read the numeric rows with at least `ncols` columns of a text file, skipping the comments.
+
+    Used for `prefix.doping` (T, Ef, n) and `prefix.dos` (E, DOS).
+
+    :param content: content of the file, or an opened file handle
+    :type content: str or typing.Iterable[str]
+    :param ncols: number of leading columns to read
+    :type ncols: int
+    :return: shape (N, ncols)
+    :rtype: np.array
+    """
+    rows = []
+    for line in _iter_lines(content):
+        values = line.split()
+        if len(values) < ncols or line.lstrip().startswith('#'):
+            continue
+        try:
+            rows.append([float(val) for val in values[:ncols]])
+        except ValueError:
+            continue
+    return np.array(rows, dtype=np.float64).reshape(-1, ncols)
+
+
+def read_tdf(content: Lines) -> typing.Dict[str, np.array]:
+    """Read the transport distribution functions of a perturbo `prefix.tdf` file.
+
+    The file contains one block of rows (E, TDF components) per temperature, the blocks are
+    separated by comment lines. Rows are streamed, only the numbers are kept in memory.
+
+    :param content: content of the `prefix.tdf` file, or an opened file handle
+    :type content: str or typing.Iterable[str]
+    :raises ValueError: if no data is found or the blocks have different energy grids
+    :return: `energy` of shape (nE,) and `tdf` of shape (nT, nE, ncomponents)
+    :rtype: dict
+    """
+    blocks = []
+    rows = []
+    for line in _iter_lines(content):
+        stripped = line.strip()
+        if len(stripped) == 0:
+            continue
+        if stripped.startswith('#'):
+            if len(rows) > 0:
+                blocks.append(rows)
+                rows = []
+            continue
+        rows.append([float(val) for val in stripped.split()])
+    if len(rows) > 0:
+        blocks.append(rows)
+
+    if len(blocks) == 0:
+        raise ValueError('No data found in the tdf file.')
+    try:
+        data = np.array(blocks, dtype=np.float64)
+    except ValueError as exception:
+        raise ValueError('The blocks of the tdf file have different shapes.') from exception
+    if data.ndim != 3 or not np.allclose(data[:, :, 0], data[0, :, 0]):
+        raise ValueError('The blocks of the tdf file have different energy grids.')
+    return {'energy': data[0, :, 0], 'tdf': data[:, :, 1:]}
+
+
+_IMSIGMA_HEADER = re.compile(r'NO\.(k|bands|T|modes):\s*(\d+)', re.IGNORECASE)
+_IMSIGMA_TEMPERATURE = re.compile(r'Temperature\(T\)\s*=\s*([-+.\dEe]+)\s*meV.*?=\s*([-+.\dEe]+)', re.IGNORECASE)
+
+
+def read_imsigma(content: Lines) -> typing.Dict[str, np.array]:
+    """Read the imaginary part of the e-ph self-energy of a perturbo `prefix.imsigma` or `prefix.imsigma_mode` file.
+
+    The file is streamed line by line: the header `NO.k: NO.bands: NO.T: NO.modes:` is used to preallocate
+    the arrays, so that the memory is bounded by the size of the arrays instead of the size of the file.
+    A data row is `it ik ibnd E Im(Sigma)` or, for `imsigma_mode`, `it ik ibnd imode E Im(Sigma)`.
+
+    :param content: content of the file, or an opened file handle
+    :type content: str or typing.Iterable[str]
+    :raises ValueError: if the header is missing or a row is out of the range given by the header
+    :return: `temperatures` (K) and `chemical_potentials` (eV) of shape (nT,), `energies` (eV) of shape (nk, nbnd),
+        `imsigma` (meV) of shape (nT, nk, nbnd) or (nT, nk, nbnd, nmodes) for `imsigma_mode`
+    :rtype: dict
+    """
+    header = {}
+    temperatures = []
+    chemical_potentials = []
+    energies = None
+    imsigma = None
+
+    for line in _iter_lines(content):
+        stripped = line.strip()
+        if len(stripped) == 0:
+            continue
+        if stripped.startswith('#'):
+            for key, value in _IMSIGMA_HEADER.findall(stripped):
+                header[key.lower()] = int(value)
+            match = _IMSIGMA_TEMPERATURE.search(stripped)
+            if match:
+                temperatures.append(float(match.group(1)) / KB_MEV)
+                chemical_potentials.append(float(match.group(2)))
+            continue
+
+        values = stripped.split()
+        if imsigma is None:
+            if not {'k', 'bands', 't'}.issubset(header):
+                raise ValueError('Missing `NO.k`, `NO.bands` or `NO.T` in the header of the imsigma file.')
+            shape = (header['t'], header['k'], header['bands'])
+            # `it ik ibnd imode E Im` for `imsigma_mode`, `it ik ibnd E Im` otherwise
+            with_modes = len(values) >= 6
+            if with_modes:
+                shape += (header.get('modes', 1),)
+            energies = np.zeros(shape[1:3], dtype=np.float64)
+            imsigma = np.zeros(shape, dtype=np.float64)
+
+        # the indices are 1-based, a 0 would silently select the last block with a negative index
+        num_indices = 4 if with_modes else 3
+        try:
+            indices = tuple(int(val) - 1 for val in values[:num_indices])
+            energy, value = float(values[num_indices]), float(values[num_indices + 1])
+        except (IndexError, ValueError) as exception:
+            raise ValueError(f'Invalid row `{stripped}` in the imsigma file.') from exception
+        if any(index < 0 or index >= size for index, size in zip(indices, imsigma.shape)):
+            raise ValueError(f'Row `{stripped}` is out of the range given by the header {header}.')
+        energies[indices[1], indices[2]] = energy
+        imsigma[indices] = value
+
+    if imsigma is None:
+        raise ValueError('No data found in the imsigma file.')
+    return {
+        'temperatures': np.array(temperatures, dtype=np.float64),
+        'chemical_potentials': np.array(chemical_potentials, dtype=np.float64),
+        'energies': energies,
+        'imsigma': imsigma,
+    }
@@ -0,0 +1,124 @@
+import re
+import typing
+
+__all__ = ('PROGRESS_PATTERN', 'QPOINT_TIMING_PATTERN', 'MEMORY_PATTERN', 'new_progress_state', 'update_progress',
+           'estimate_eta', 'predict_overrun')
+
+# `progress:  12.50%` of the progress bars of qe2pert.x and perturbo.x
+PROGRESS_PATTERN = re.compile(r'progress:\s*([\d.]+)\s*%', re.IGNORECASE)
+# `iq:  3 / 216  ...  time:  25.1s` of the loop over the q points of qe2pert.x
+QPOINT_TIMING_PATTERN = re.compile(r'\biq\b\s*[:=]?\s*(\d+)(?:\s*/\s*(\d+))?.*?\btime\b\s*[:=]?\s*([\d.]+)\s*s',
+                                   re.IGNORECASE)
+# `Memory usage:  1.23 GB`
+MEMORY_PATTERN = re.compile(r'memory[^:\n]*:\s*([\d.]+)\s*([KMGT])i?B', re.IGNORECASE)
+_MEMORY_UNITS = {'K': 1 / 1024, 'M': 1, 'G': 1024, 'T': 1024**2}
+# number of (time, progress) samples kept for the rate
+MAX_SAMPLES = 20
+
+
+def new_progress_state() -> dict:
+    """Get the state of a monitored stdout before the first read, a JSON serializable dict stored in the extras."""
+    return {
+        'offset': 0,
+        'partial': '',
+        'progress': None,
+        'samples': [],
+        'num_qpoints': None,
+        'last_qpoint': None,
+        'qpoint_times': [],
+        'memory': None,
+        'updated': None,
+    }
+
+
+def update_progress(state: dict, chunk: str, timestamp: float, num_bytes: int = None) -> dict:
+    """Parse a chunk of stdout read from `state['offset']`.
+
+    Only the complete lines are parsed, the last incomplete line is kept for the next chunk.
+
+    :param state: the state of the previous read, see `new_progress_state`
+    :type state: dict
+    :param chunk: the text appended to the stdout since the previous read
+    :type chunk: str
+    :param timestamp: the time of the read, in seconds since the epoch
+    :type timestamp: float
+    :param num_bytes: the size of the chunk in bytes, default is the size of its utf8 encoding
+    :type num_bytes: int
+    :return: the new state
+    :rtype: dict
+    """
+    state = dict(state)
+    if num_bytes is None:
+        num_bytes = len(chunk.encode('utf8'))
+    state['offset'] += num_bytes
+    if num_bytes:
+        state['updated'] = timestamp
+
+    lines = (state['partial'] + chunk).split('\n')
+    state['partial'] = lines.pop()
+
+    progress = None
+    qpoint_times = list(state['qpoint_times'])
+    for line in lines:
+        match = PROGRESS_PATTERN.search(line)
+        if match:
+            progress = float(match.group(1))
+        match = QPOINT_TIMING_PATTERN.search(line)
+        if match:
+            state['last_qpoint'] = int(match.group(1))
+            if match.group(2):
+                state['num_qpoints'] = int(match.group(2))
+            qpoint_times.append(float(match.group(3)))
+        match = MEMORY_PATTERN.search(line)
+        if match:
+            memory = float(match.group(1)) * _MEMORY_UNITS[match.group(2).upper()]
+            state['memory'] = max(memory, state['memory'] or 0)
+    state['qpoint_times'] = qpoint_times[-MAX_SAMPLES:]
+
+    if progress is None and state['num_qpoints'] and state['last_qpoint']:
+        progress = 100 * state['last_qpoint'] / state['num_qpoints']
+    if progress is not None:
+        state['progress'] = progress
+        state['samples'] = (list(state['samples']) + [[timestamp, progress]])[-MAX_SAMPLES:]
+    return state
+
+
+def estimate_eta(state: dict) -> typing.Optional[float]:
+    """Estimate the remaining seconds from the progress rate of the samples.
+
+    :param state: the state, see `update_progress`
+    :type state: dict
+    :return: the remaining seconds, None if the progress has not changed yet
+    :rtype: float
+    """
+    samples = state['samples']
+    if len(samples) < 2:
+        return None
+    (start_time, start_progress), (end_time, end_progress) = samples[0], samples[-1]
+    if end_progress <= start_progress or end_time <= start_time:
+        return None
+    rate = (end_progress - start_progress) / (end_time - start_time)
+    return (100 - end_progress) / rate
+
+
+def predict_overrun(state: dict, elapsed: float, max_wallclock_seconds: float, min_progress: float = 5.0,
+                    margin: float = 1.1) -> bool:
+    """Predict whether a job will exceed its walltime at the current progress rate.
+
+    :param state: the state, see `update_progress`
+    :type state: dict
+    :param elapsed: the seconds since the start of the job
+    :type elapsed: float
+    :param max_wallclock_seconds: the walltime of the job
+    :type max_wallclock_seconds: float
+    :param min_progress: do not predict below this progress, in percent, the first steps are not representative
+    :type min_progress: float
+    :param margin: the predicted total time must exceed the walltime by this factor
+    :type margin: float
+    :return: True if the job is predicted to exceed the walltime
+    :rtype: bool
+    """
+    eta = estimate_eta(state)
+    if eta is None or (state['progress'] or 0) < min_progress:
+        return False
+    return elapsed + eta > max_wallclock_seconds * margin
@@ -1,44 +1,182 @@
 # -*- coding: utf-8 -*-
 """Protocol definitions for workflow input generation."""
+import functools
 import json
 import os
+import pickle
+from collections.abc import Mapping
 from copy import deepcopy
 
 
+# json files of the pseudo families, relative to the current folder
+PSEUDO_FAMILY_FILES = {
+    # SSSP Efficiency & Precision v1.0, see https://www.materialscloud.org/archive/2018.0001/v2
+    "SSSP-efficiency-1.0": "sssp_efficiency_1.0.json",
+    "SSSP-precision-1.0": "sssp_precision_1.0.json",
+    # SSSP Efficiency & Precision v1.1, see https://www.materialscloud.org/archive/2018.0001/v3
+    "SSSP-efficiency-1.1": "sssp_efficiency_1.1.json",
+    "SSSP-precision-1.1": "sssp_precision_1.1.json",
+}
+
+# name of the environment variable overriding the path of the precompiled pseudo families
+PROTOCOL_CACHE_ENVVAR = "AIIDA_MOBILITY_PROTOCOL_CACHE"
+PROTOCOL_CACHE_VERSION = 1
+
+
+def _get_json_path(filename):
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+
+
 def _load_pseudo_metadata(filename):
     """Load from the current folder a json file containing metadata (incl.
 
     suggested cutoffs) for a library of pseudopotentials.
     """
-    with open(
-        os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
-    ) as handle:
+    with open(_get_json_path(filename)) as handle:
         return json.load(handle)
 
 
+def get_protocol_cache_filename():
+    """Return the path of the precompiled pseudo families, None if it cannot be determined.
+
+    It is `$AIIDA_MOBILITY_PROTOCOL_CACHE` if set, otherwise `protocols.pickle`
+    in the `aiida_mobility` subfolder of the AiiDA config folder.
+    """
+    filename = os.environ.get(PROTOCOL_CACHE_ENVVAR)
+    if filename is None:
+        try:
+            from aiida.manage.configuration.settings import AIIDA_CONFIG_FOLDER
+        except ImportError:
+            return None
+        filename = os.path.join(
+            AIIDA_CONFIG_FOLDER, "aiida_mobility", "protocols.pickle"
+        )
+    return filename
+
+
+@functools.lru_cache(maxsize=1)
+def _load_protocol_cache():
+    """Load the precompiled pseudo families, entries whose json file changed are dropped."""
+    filename = get_protocol_cache_filename()
+    if filename is None or not os.path.isfile(filename):
+        return {}
+    try:
+        with open(filename, "rb") as handle:
+            cache = pickle.load(handle)
+    except Exception:  # pylint: disable=broad-except
+        return {}
+    if not isinstance(cache, dict) or cache.get("version") != PROTOCOL_CACHE_VERSION:
+        return {}
+    families = {}
+    for name, (mtime, data) in cache.get("families", {}).items():
+        json_filename = PSEUDO_FAMILY_FILES.get(name)
+        if json_filename is None:
+            continue
+        if os.path.getmtime(_get_json_path(json_filename)) == mtime:
+            families[name] = data
+    return families
+
+
+def precompile_protocols(filename=None):
+    """Precompile all the pseudo families into a pickle, loaded instead of the jsons while they are unchanged.
+
+    :param filename: output filename, default `get_protocol_cache_filename()`
+    :type filename: str
+    :return: the output filename
+    :rtype: str
+    """
+    if filename is None:
+        filename = get_protocol_cache_filename()
+    if filename is None:
+        raise ValueError(
+            f"Cannot determine the protocol cache file, please set ${PROTOCOL_CACHE_ENVVAR}"
+        )
+    families = {
+        name: (
+            os.path.getmtime(_get_json_path(json_filename)),
+            _load_pseudo_metadata(json_filename),
+        )
+        for name, json_filename in PSEUDO_FAMILY_FILES.items()
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+    tmp_filename = f"{filename}.{os.getpid()}.tmp"
+    with open(tmp_filename, "wb") as handle:
+        pickle.dump(
+            {"version": PROTOCOL_CACHE_VERSION, "families": families},
+            handle,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+    os.replace(tmp_filename, filename)
+    _load_protocol_cache.cache_clear()
+    return filename
+
+
+@functools.lru_cache(maxsize=None)
+def get_pseudo_family_metadata(name):
+    """Return the metadata of a pseudo family, loaded on first access and memoized in the process.
+
+    The returned dict is shared, do not modify it.
+    """
+    try:
+        json_filename = PSEUDO_FAMILY_FILES[name]
+    except KeyError as exception:
+        raise ValueError(f"Unknown pseudo family '{name}'") from exception
+    data = _load_protocol_cache().get(name)
+    if data is None:
+        data = _load_pseudo_metadata(json_filename)
+    return data
+
+
+def _get_halved_cutoffs_metadata(name):
+    """The metadata of a pseudo family with the cutoffs divided by 2, for testing purpose."""
+    data = {
+        element: dict(element_data)
+        for element, element_data in get_pseudo_family_metadata(name).items()
+    }
+    for element_data in data.values():
+        element_data["cutoff"] = element_data["cutoff"] / 2
+    return data
+
+
+class PseudoFamilies(Mapping):
+    """Read-only mapping of pseudo family name -> metadata, loaded on first access of each family."""
+
+    def __init__(self, loaders):
+        """:param loaders: dict of family name -> callable returning the metadata"""
+        self._loaders = loaders
+        self._data = {}
+
+    def __getitem__(self, name):
+        if name not in self._data:
+            self._data[name] = self._loaders[name]()
+        return self._data[name]
+
+    def __iter__(self):
+        return iter(self._loaders)
+
+    def __len__(self):
+        return len(self._loaders)
+
+
+def _get_sssp_families():
+    return PseudoFamilies(
+        {
+            name: functools.partial(get_pseudo_family_metadata, name)
+            for name in PSEUDO_FAMILY_FILES
+        }
+    )
+
+
+@functools.lru_cache(maxsize=1)
 def _get_all_protocol_modifiers():
     """Return the information on all possibile modifiers for all known protocols.
 
-    It is a function so we can lazily load the jsons.
+    The pseudo families are `PseudoFamilies` mappings, their jsons are only loaded on first access.
+    The result is memoized, use the getters of `ProtocolManager` which return copies.
     """
     protocols = {
         "theos-ht-1.0": {
-            "pseudo": {
-                # SSSP Efficiency & Precision v1.0, see https://www.materialscloud.org/archive/2018.0001/v2
-                "SSSP-efficiency-1.0": _load_pseudo_metadata(
-                    "sssp_efficiency_1.0.json"
-                ),
-                "SSSP-precision-1.0": _load_pseudo_metadata(
-                    "sssp_precision_1.0.json"
-                ),
-                # SSSP Efficiency & Precision v1.1, see https://www.materialscloud.org/archive/2018.0001/v3
-                "SSSP-efficiency-1.1": _load_pseudo_metadata(
-                    "sssp_efficiency_1.1.json"
-                ),
-                "SSSP-precision-1.1": _load_pseudo_metadata(
-                    "sssp_precision_1.1.json"
-                ),
-            },
+            "pseudo": _get_sssp_families(),
             "pseudo_default": "SSSP-efficiency-1.1",
             "parameters": {
                 "fast": {
@@ -116,20 +254,7 @@ def _get_all_protocol_modifiers():
             "parameters_default": "default",
         },
         "ms-1.0": {
-            "pseudo": {
-                "SSSP-efficiency-1.0": _load_pseudo_metadata(
-                    "sssp_efficiency_1.0.json"
-                ),
-                "SSSP-precision-1.0": _load_pseudo_metadata(
-                    "sssp_precision_1.0.json"
-                ),
-                "SSSP-efficiency-1.1": _load_pseudo_metadata(
-                    "sssp_efficiency_1.1.json"
-                ),
-                "SSSP-precision-1.1": _load_pseudo_metadata(
-                    "sssp_precision_1.1.json"
-                ),
-            },
+            "pseudo": _get_sssp_families(),
             "pseudo_default": "SSSP-efficiency-1.1",
             "parameters": {
                 "default": {
@@ -524,13 +649,21 @@ def _get_all_protocol_modifiers():
     protocols["ms-1.0"]["parameters"]["scdm"]["num_bands_factor"] = 3.0
 
     # a protocol for testing purpose, decrease kmesh density & ecutoff
-    testing = deepcopy(protocols["theos-ht-1.0"])
+    testing = {
+        key: deepcopy(value)
+        for key, value in protocols["theos-ht-1.0"].items()
+        if key != "pseudo"
+    }
     testing["parameters"]["fast"]["kpoints_mesh_density"] = 0.3
     testing["parameters_default"] = "fast"
-    ps_data = testing["pseudo"]["SSSP-efficiency-1.1"]
-    for pseudo in ps_data:
-        ps_data[pseudo]["cutoff"] = ps_data[pseudo]["cutoff"] / 2
-    testing["pseudo"]["SSSP-efficiency-1.1"] = ps_data
+    loaders = {
+        name: functools.partial(get_pseudo_family_metadata, name)
+        for name in PSEUDO_FAMILY_FILES
+    }
+    loaders["SSSP-efficiency-1.1"] = functools.partial(
+        _get_halved_cutoffs_metadata, "SSSP-efficiency-1.1"
+    )
+    testing["pseudo"] = PseudoFamilies(loaders)
     protocols["testing"] = testing
 
     return protocols
@@ -618,7 +751,7 @@ class ProtocolManager:
 
     def get_parameters_data(self, modifier_name):
         """Given a parameter modifier name, return a dictionary of data associated to it."""
-        return self.modifiers["parameters"][modifier_name]
+        return deepcopy(self.modifiers["parameters"][modifier_name])
 
     def get_pseudo_modifier_names(self):
         """Get all valid pseudopotential modifier names."""
@@ -630,7 +763,12 @@ class ProtocolManager:
 
     def get_pseudo_data(self, modifier_name):
         """Given a pseudo modifier name, return the ``pseudo_data`` associated to it."""
-        return self.modifiers["pseudo"][modifier_name]
+        return {
+            element: dict(element_data)
+            for element, element_data in self.modifiers["pseudo"][
+                modifier_name
+            ].items()
+        }
 
     def check_pseudos(self, modifier_name=None, pseudo_data=None):
         """Given a pseudo modifier name, checks which pseudos exist in the DB.
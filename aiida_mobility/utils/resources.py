@@ -0,0 +1,461 @@
+import math
+import typing
+import numpy as np
+
+__all__ = ('CODE_TYPES', 'ResourceModel', 'ResourceEstimate', 'ParallelizationPlan', 'get_kpoints_mesh_size',
+           'get_number_of_kpoints', 'get_npool', 'estimate_epwan_memory', 'plan_parallelization', 'plan_options',
+           'estimate_resources',
+           'get_resource_samples', 'get_resource_model', 'get_memory_per_machine', 'get_resource_options',
+           'record_resource_features')
+
+# the `process_label` of the calculations of each code
+CODE_TYPES = {
+    'pw': 'PwCalculation',
+    'ph': 'PhCalculation',
+    'pw2wannier90': 'Pw2wannier90Calculation',
+    'wannier90': 'Wannier90Calculation',
+    'qe2pert': 'QE2PertCalculation',
+    'perturbo': 'PerturboCalculation',
+}
+# codes which distribute the kpoints over pools with `-npool`
+POOL_CODE_TYPES = ('pw', 'ph')
+# extra of the `CalcJobNode` storing the features, the calculations with it are used for fitting
+RESOURCE_FEATURES_EXTRA = 'resource_features'
+
+# Default log-linear models, y = exp(c0) * prod(feature_i ** c_i) with y the cpu time in core seconds
+# or the total memory in MB. They are rough order-of-magnitude scalings (e.g. pw time: nk * nbnd * npw with
+# nbnd ~ nelec and npw ~ nat * ecutwfc^1.5, the memory grows slower because of the fixed overhead),
+# replaced by fits as soon as the database has timings.
+DEFAULT_MODELS = {
+    'pw': {
+        'features': ('nat', 'nelec', 'ecutwfc', 'nkpts'),
+        'time': (math.log(2.3e-4), 1.0, 1.0, 1.5, 1.0),
+        'memory': (math.log(1.6), 0.5, 0.5, 0.75, 0.0),
+    },
+    'ph': {
+        'features': ('nat', 'nelec', 'ecutwfc', 'nkpts', 'nqpts'),
+        'time': (math.log(4.3e-4), 2.0, 1.0, 1.5, 1.0, 1.0),
+        'memory': (math.log(3.2), 0.5, 0.5, 0.75, 0.0, 0.0),
+    },
+    'pw2wannier90': {
+        'features': ('nat', 'ecutwfc', 'nkpts', 'nbnd', 'num_wann'),
+        'time': (math.log(7.0e-6), 1.0, 1.5, 1.0, 2.0, 0.0),
+        'memory': (math.log(4.2), 0.5, 0.75, 0.0, 0.5, 0.0),
+    },
+    'wannier90': {
+        'features': ('nkpts', 'nbnd', 'num_wann'),
+        'time': (math.log(3.0e-5), 1.0, 2.0, 1.0),
+        'memory': (math.log(7.6e-4), 1.0, 2.0, 0.0),
+    },
+    'qe2pert': {
+        'features': ('nat', 'nkpts', 'nqpts', 'num_wann'),
+        'time': (math.log(3.0e-4), 1.0, 1.0, 1.0, 2.0),
+        'memory': (math.log(7.6e-3), 1.0, 1.0, 0.0, 2.0),
+    },
+    'perturbo': {
+        'features': ('nat', 'nkpts', 'nqpts', 'num_wann'),
+        'time': (math.log(4.0e-7), 1.0, 1.0, 1.0, 2.0),
+        'memory': (math.log(15.0), 1.0, 0.0, 0.0, 2.0),
+    },
+}
+# standard deviation of log(cpu time) of the default models, the margin is two of them, i.e. a factor of 3
+DEFAULT_LOG_STD = 0.55
+# lower bound of the fitted standard deviation
+MIN_LOG_STD = 0.2
+# weight of the default coefficients in the fit, the fit follows the data after a few samples
+PRIOR_WEIGHT = 1.0
+# memory below this (MB) is not worth asking for more machines
+MIN_MEMORY = 100
+
+DEFAULT_TARGET_WALLTIME = 4 * 3600
+DEFAULT_MAX_WALLTIME = 24 * 3600
+MIN_WALLTIME = 1800
+WALLTIME_STEP = 600
+
+
+def _ridge_fit(x: np.array, y: np.array, prior: np.array) -> np.array:
+    """Least squares of `x @ c = y` regularized towards `prior`."""
+    a = x.T @ x + PRIOR_WEIGHT * np.eye(x.shape[1])
+    b = x.T @ y + PRIOR_WEIGHT * prior
+    return np.linalg.solve(a, b)
+
+
+class ResourceModel(typing.NamedTuple):
+    """Log-linear model of the cpu time and memory of a code in terms of cheap features of the inputs."""
+
+    code_type: str
+    features: typing.Tuple[str, ...]
+    time_coefficients: typing.Tuple[float, ...]
+    memory_coefficients: typing.Tuple[float, ...]
+    time_log_std: float = DEFAULT_LOG_STD
+    num_samples: int = 0
+
+    @classmethod
+    def default(cls, code_type: str) -> 'ResourceModel':
+        if code_type not in DEFAULT_MODELS:
+            raise ValueError(f'Unknown code type `{code_type}`, valid types are {tuple(DEFAULT_MODELS)}.')
+        model = DEFAULT_MODELS[code_type]
+        return cls(code_type, model['features'], model['time'], model['memory'])
+
+    def _design(self, features: typing.Mapping[str, float]) -> np.array:
+        missing = [name for name in self.features if name not in features]
+        if missing:
+            raise ValueError(f'Missing features {missing} for the {self.code_type} resource model.')
+        return np.array([1.0] + [math.log(max(float(features[name]), 1.0)) for name in self.features])
+
+    def predict_time(self, features: typing.Mapping[str, float]) -> float:
+        """Predict the cpu time in core seconds."""
+        return math.exp(self._design(features) @ np.array(self.time_coefficients))
+
+    def predict_memory(self, features: typing.Mapping[str, float]) -> float:
+        """Predict the total memory in MB."""
+        return math.exp(self._design(features) @ np.array(self.memory_coefficients))
+
+    def fit(self, samples: typing.Sequence[typing.Tuple[dict, float, typing.Optional[float]]]) -> 'ResourceModel':
+        """Fit the model to the measured samples, the current coefficients are used as prior.
+
+        :param samples: list of (features, cpu time in core seconds, total memory in MB or None)
+        :type samples: list
+        :return: the fitted model
+        :rtype: ResourceModel
+        """
+        samples = [sample for sample in samples if sample[1] and sample[1] > 0]
+        if not samples:
+            return self
+        x = np.array([self._design(features) for features, _, _ in samples])
+        y = np.log([time for _, time, _ in samples])
+        time_coefficients = _ridge_fit(x, y, np.array(self.time_coefficients))
+        residuals = y - x @ time_coefficients
+        time_log_std = max(float(np.sqrt(np.mean(residuals**2))), MIN_LOG_STD) if len(samples) > 1 else self.time_log_std
+
+        memory_coefficients = self.memory_coefficients
+        with_memory = [index for index, sample in enumerate(samples) if sample[2]]
+        if with_memory:
+            memory = np.log([samples[index][2] for index in with_memory])
+            memory_coefficients = _ridge_fit(x[with_memory], memory, np.array(self.memory_coefficients))
+
+        return self._replace(
+            time_coefficients=tuple(float(c) for c in time_coefficients),
+            memory_coefficients=tuple(float(c) for c in memory_coefficients),
+            time_log_std=time_log_std,
+            num_samples=self.num_samples + len(samples),
+        )
+
+
+class ResourceEstimate(typing.NamedTuple):
+    """Predicted resources of a calculation, `npool` is None for codes without kpoint pools."""
+
+    num_machines: int
+    num_mpiprocs_per_machine: int
+    max_wallclock_seconds: int
+    cpu_time: float
+    memory: float
+    npool: typing.Optional[int] = None
+
+    def as_options(self, with_mpi: bool = True) -> dict:
+        """Return the `metadata.options` of the calculation."""
+        return {
+            'resources': {
+                'num_machines': self.num_machines,
+                'num_mpiprocs_per_machine': self.num_mpiprocs_per_machine,
+            },
+            'max_wallclock_seconds': self.max_wallclock_seconds,
+            'withmpi': with_mpi,
+        }
+
+
+def get_kpoints_mesh_size(cell: np.array, distance: float) -> typing.List[int]:
+    """Get the kpoints mesh of the given density without creating a `KpointsData`.
+
+    Same as `KpointsData.set_kpoints_mesh_from_density`, the reciprocal vectors include the 2 pi factor.
+
+    :param cell: the real space cell, 3 * 3 in angstrom
+    :param distance: the kpoints distance in 1/angstrom
+    :return: the mesh
+    :rtype: list
+    """
+    reciprocal_cell = 2 * np.pi * np.linalg.inv(np.asarray(cell, dtype=np.float64)).T
+    return [max(1, int(np.ceil(round(np.linalg.norm(b) / distance, 5)))) for b in reciprocal_cell]
+
+
+def get_number_of_kpoints(kpoints) -> int:
+    """Number of kpoints of a `KpointsData`, either a mesh or an explicit list."""
+    try:
+        return int(np.prod(kpoints.get_kpoints_mesh()[0]))
+    except AttributeError:
+        return len(kpoints.get_kpoints())
+
+
+def get_npool(num_procs: int, num_kpoints: int) -> int:
+    """Get the largest number of pools which divides `num_procs` and is not larger than `num_kpoints`."""
+    num_kpoints = max(int(num_kpoints), 1)
+    return max(npool for npool in range(1, min(num_procs, num_kpoints) + 1) if num_procs % npool == 0)
+
+
+class ParallelizationPlan(typing.NamedTuple):
+    """MPI and OpenMP layout of a calculation with kpoint pools."""
+
+    npools: int
+    num_mpiprocs_per_machine: int
+    num_threads: int
+    memory_per_rank: typing.Optional[float] = None
+
+
+def estimate_epwan_memory(nat: int, num_wann: int, num_kpoints: int, num_qpoints: int) -> float:
+    """Estimate the memory of the e-ph matrix elements in Wannier basis of `epwan.h5`, in MB.
+
+    `eph_matrix_wannier` holds one complex `ep_hop_*` dataset of (nRe, nRp) per atom, direction and
+    Wannier function pair, the number of R vectors is about the number of points of the coarse grids.
+
+    :param nat: number of atoms
+    :param num_wann: number of Wannier functions
+    :param num_kpoints: number of points of the coarse kpoint grid
+    :param num_qpoints: number of points of the coarse qpoint grid
+    :return: the memory in MB
+    :rtype: float
+    """
+    return 16 * 3 * nat * num_wann**2 * num_kpoints * num_qpoints / 1024**2
+
+
+def plan_parallelization(num_machines: int, num_cores_per_machine: int, num_kpoints: int,
+                         memory_per_rank: float = None, memory_per_machine: float = None) -> ParallelizationPlan:
+    """Plan the MPI ranks, OpenMP threads and pools of a calculation which keeps a copy of the data on each rank.
+
+    All the cores of a machine are used by MPI ranks, unless the ranks of a machine do not fit in its memory:
+    then fewer ranks are used, each with more OpenMP threads. The number of pools is the largest one
+    which divides the number of ranks and is not larger than the number of kpoints.
+
+    :param num_machines: number of machines
+    :type num_machines: int
+    :param num_cores_per_machine: number of cores of a machine, i.e. MPI ranks times OpenMP threads
+    :type num_cores_per_machine: int
+    :param num_kpoints: number of kpoints distributed over the pools
+    :type num_kpoints: int
+    :param memory_per_rank: memory needed by a rank in MB, None to ignore the memory
+    :type memory_per_rank: float
+    :param memory_per_machine: memory of a machine in MB, None to ignore the memory
+    :type memory_per_machine: float
+    :return: the plan
+    :rtype: ParallelizationPlan
+    """
+    num_ranks = num_cores_per_machine
+    if memory_per_rank and memory_per_machine:
+        max_ranks = max(int(memory_per_machine // memory_per_rank), 1)
+        # the threads of the ranks must fill the machine exactly
+        num_ranks = max(ranks for ranks in range(1, min(num_ranks, max_ranks) + 1) if num_cores_per_machine % ranks == 0)
+    npools = get_npool(num_machines * num_ranks, num_kpoints)
+    return ParallelizationPlan(npools, num_ranks, num_cores_per_machine // num_ranks, memory_per_rank)
+
+
+def plan_options(options: dict, num_kpoints: int, memory_per_rank: float = None, memory_per_machine: float = None,
+                 default_mpiprocs_per_machine: int = None) -> typing.Tuple[dict, ParallelizationPlan]:
+    """Plan the MPI ranks, OpenMP threads and pools of a calculation before it is submitted.
+
+    If the ranks of a machine do not fit in its memory, i.e. `max_memory_kb` of the options or `memory_per_machine`,
+    the `resources` are changed to fewer MPI ranks with more OpenMP threads, see `plan_parallelization`. The layout
+    is kept if `num_cores_per_mpiproc` is given. `OMP_NUM_THREADS` is added to the `environment_variables`.
+
+    :param options: the `metadata.options` of the calculation
+    :type options: dict
+    :param num_kpoints: number of kpoints distributed over the pools, None if unknown
+    :type num_kpoints: int
+    :param memory_per_rank: memory needed by a rank in MB, None to ignore the memory
+    :type memory_per_rank: float
+    :param memory_per_machine: default memory of a machine of the computer in MB, None if unknown
+    :type memory_per_machine: float
+    :param default_mpiprocs_per_machine: default MPI processes per machine of the computer
+    :type default_mpiprocs_per_machine: int
+    :return: the new options and the plan
+    :rtype: tuple
+    """
+    options = dict(options)
+    resources = dict(options.get('resources', {}))
+    num_mpiprocs_per_machine = resources.get('num_mpiprocs_per_machine', None) or default_mpiprocs_per_machine or 1
+    num_threads = resources.get('num_cores_per_mpiproc', None)
+    if 'num_machines' not in resources or num_threads is not None:
+        if 'num_machines' in resources:
+            num_procs = resources['num_machines'] * num_mpiprocs_per_machine
+        else:
+            num_procs = resources.get('tot_num_mpiprocs', num_mpiprocs_per_machine)
+        plan = ParallelizationPlan(get_npool(num_procs, num_kpoints or num_procs), num_mpiprocs_per_machine,
+                                   num_threads or 1, memory_per_rank)
+    else:
+        max_memory_kb = options.get('max_memory_kb', None)
+        plan = plan_parallelization(resources['num_machines'],
+                                    num_mpiprocs_per_machine,
+                                    num_kpoints or resources['num_machines'] * num_mpiprocs_per_machine,
+                                    memory_per_rank=memory_per_rank,
+                                    memory_per_machine=max_memory_kb / 1024 if max_memory_kb else memory_per_machine)
+        if plan.num_mpiprocs_per_machine != num_mpiprocs_per_machine:
+            resources.update({
+                'num_mpiprocs_per_machine': plan.num_mpiprocs_per_machine,
+                'num_cores_per_mpiproc': plan.num_threads,
+            })
+            options['resources'] = resources
+
+    environment_variables = dict(options.get('environment_variables', None) or {})
+    environment_variables.setdefault('OMP_NUM_THREADS', str(plan.num_threads))
+    options['environment_variables'] = environment_variables
+    return options, plan
+
+
+def estimate_resources(model: ResourceModel, features: typing.Mapping[str, float], num_mpiprocs_per_machine: int = 1,
+                       memory_per_machine: float = None, max_num_machines: int = None, num_machines: int = None,
+                       target_walltime: int = DEFAULT_TARGET_WALLTIME,
+                       max_walltime: int = DEFAULT_MAX_WALLTIME) -> ResourceEstimate:
+    """Estimate the number of machines, the walltime and the pools of a calculation.
+
+    The predicted cpu time and memory are multiplied by a margin of two standard deviations of the model.
+    The number of machines is the smallest one that finishes within `target_walltime` and fits in memory,
+    the walltime is then rounded up to 10 minutes and kept between 30 minutes and `max_walltime`.
+
+    :param model: the resource model of the code
+    :type model: ResourceModel
+    :param features: the features of the model, e.g. nat, nelec, ecutwfc, nkpts
+    :type features: dict
+    :param num_mpiprocs_per_machine: MPI processes per machine
+    :type num_mpiprocs_per_machine: int
+    :param memory_per_machine: memory per machine in MB, None to ignore the memory
+    :type memory_per_machine: float
+    :param max_num_machines: upper bound of the number of machines
+    :type max_num_machines: int
+    :param num_machines: use this number of machines, only estimate the walltime
+    :type num_machines: int
+    :param target_walltime: the walltime to aim for, in seconds
+    :type target_walltime: int
+    :param max_walltime: upper bound of the walltime, in seconds
+    :type max_walltime: int
+    :return: the estimated resources
+    :rtype: ResourceEstimate
+    """
+    margin = math.exp(2 * model.time_log_std)
+    cpu_time = model.predict_time(features) * margin
+    memory = max(model.predict_memory(features) * margin, MIN_MEMORY)
+
+    if num_machines is None:
+        num_machines = math.ceil(cpu_time / (target_walltime * num_mpiprocs_per_machine))
+        if memory_per_machine:
+            num_machines = max(num_machines, math.ceil(memory / memory_per_machine))
+        num_machines = max(num_machines, 1)
+        if max_num_machines is not None:
+            num_machines = min(num_machines, max_num_machines)
+
+    num_procs = num_machines * num_mpiprocs_per_machine
+    walltime = math.ceil(cpu_time / num_procs / WALLTIME_STEP) * WALLTIME_STEP
+    walltime = int(min(max(walltime, MIN_WALLTIME), max_walltime))
+
+    npool = None
+    if model.code_type in POOL_CODE_TYPES and 'nkpts' in features:
+        npool = get_npool(num_procs, features['nkpts'])
+
+    return ResourceEstimate(num_machines, num_mpiprocs_per_machine, walltime, cpu_time, memory, npool)
+
+
+def _get_memory_mb(parameters: dict) -> typing.Optional[float]:
+    """Total memory of the QE estimate in `output_parameters`, in MB."""
+    value = parameters.get('estimated_ram_total', None)
+    if value is None:
+        return None
+    units = parameters.get('estimated_ram_total_units', 'MB')
+    return float(value) * {'KB': 1 / 1024, 'MB': 1, 'GB': 1024}.get(units.upper(), 1)
+
+
+def _get_num_procs(resources: dict) -> typing.Optional[int]:
+    if 'tot_num_mpiprocs' in resources:
+        return int(resources['tot_num_mpiprocs'])
+    if 'num_machines' in resources and 'num_mpiprocs_per_machine' in resources:
+        return int(resources['num_machines']) * int(resources['num_mpiprocs_per_machine'])
+    return None
+
+
+def get_resource_samples(code_type: str, limit: int = 500) -> list:
+    """Get the measured timings of the finished calculations of a code from the database.
+
+    Only the calculations with features recorded by `record_resource_features` are used. The walltime is
+    read from the scheduler job info, or from the `wall_time_seconds` of the output parameters.
+
+    :param code_type: one of `CODE_TYPES`
+    :param limit: the number of most recent calculations to use
+    :return: list of (features, cpu time in core seconds, total memory in MB or None)
+    :rtype: list
+    """
+    from aiida import orm
+
+    qb = orm.QueryBuilder()
+    qb.append(
+        orm.CalcJobNode,
+        filters={
+            'attributes.process_label': CODE_TYPES[code_type],
+            'attributes.exit_status': 0,
+            'extras': {'has_key': RESOURCE_FEATURES_EXTRA},
+        },
+        project=[f'extras.{RESOURCE_FEATURES_EXTRA}', 'attributes.last_job_info', 'attributes.resources'],
+        tag='calc',
+    )
+    qb.append(orm.Dict, with_incoming='calc', edge_filters={'label': 'output_parameters'},
+              project='attributes', outerjoin=True)
+    qb.order_by({'calc': {'ctime': 'desc'}})
+    qb.limit(limit)
+
+    samples = []
+    for features, job_info, resources, parameters in qb.iterall():
+        parameters = parameters or {}
+        walltime = (job_info or {}).get('wallclock_time_seconds', None) or parameters.get('wall_time_seconds', None)
+        num_procs = _get_num_procs(resources or {})
+        if not walltime or not num_procs:
+            continue
+        if 'number_of_k_points' in parameters and 'nkpts' in features:
+            # the same features are recorded for e.g. the scf and nscf of a workchain, use the actual number
+            features = dict(features, nkpts=parameters['number_of_k_points'])
+        samples.append((features, float(walltime) * num_procs, _get_memory_mb(parameters)))
+    return samples
+
+
+def get_resource_model(code_type: str) -> ResourceModel:
+    """Get the default model of a code fitted to the timings of the local database."""
+    return ResourceModel.default(code_type).fit(get_resource_samples(code_type))
+
+
+def get_memory_per_machine(computer) -> typing.Optional[float]:
+    """Default memory per machine of a computer in MB, None if it is not set."""
+    get_memory = getattr(computer, 'get_default_memory_per_machine', None)
+    if get_memory is None or not get_memory():
+        return None
+    # the computer stores it in kB
+    return get_memory() / 1024
+
+
+def get_resource_options(code_type: str, features: typing.Mapping[str, float], code=None, with_mpi: bool = True,
+                         **kwargs) -> typing.Tuple[dict, ResourceEstimate]:
+    """Get the `metadata.options` of a calculation from the fitted model.
+
+    :param code_type: one of `CODE_TYPES`
+    :param features: the features of the model
+    :param code: the code, its computer gives the default MPI processes and memory per machine
+    :type code: aiida.orm.Code
+    :param with_mpi: run with MPI
+    :param kwargs: passed to `estimate_resources`
+    :return: the options and the estimate
+    :rtype: tuple
+    """
+    if code is not None:
+        computer = code.computer
+        kwargs.setdefault('num_mpiprocs_per_machine', computer.get_default_mpiprocs_per_machine() or 1)
+        memory_per_machine = get_memory_per_machine(computer)
+        if memory_per_machine is not None:
+            kwargs.setdefault('memory_per_machine', memory_per_machine)
+    estimate = estimate_resources(get_resource_model(code_type), features, **kwargs)
+    return estimate.as_options(with_mpi=with_mpi), estimate
+
+
+def record_resource_features(node, features: typing.Mapping[str, dict]):
+    """Store the features in the extras of the calculations called by a workchain, for the later fits.
+
+    :param node: the workchain node
+    :param features: dict of code type -> features of the calculations of that code
+    """
+    labels = {CODE_TYPES[code_type]: value for code_type, value in features.items()}
+    for called_descendant in node.called_descendants:
+        value = labels.get(called_descendant.process_label, None)
+        if value is not None and RESOURCE_FEATURES_EXTRA not in called_descendant.extras:
+            called_descendant.set_extra(RESOURCE_FEATURES_EXTRA, {key: float(val) for key, val in value.items()})
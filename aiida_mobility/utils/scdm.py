@@ -4,60 +4,148 @@ from scipy.special import erfc
 from scipy.optimize import curve_fit
 from aiida import orm
 
-__all__ = ('erfc_scdm', 'fit_scdm_mu_sigma', 'fit_scdm_mu_sigma_aiida')
+__all__ = ('erfc_scdm', 'ErfcFit', 'fit_erfc_projectability', 'fit_scdm_mu_sigma', 'fit_scdm_mu_sigma_aiida')
+
+# default number of energy bins of the projectability histogram
+DEFAULT_NUM_BINS = 2000
+# the full fit is done if the R^2 of the binned fit on all the points is lower than this
+DEFAULT_MIN_R2 = 0.5
 
 def erfc_scdm(x, mu, sigma):
     return 0.5 * erfc((x - mu) / sigma)
 
-def fit_erfc(f, xdata, ydata):
-    return curve_fit(f, xdata, ydata, bounds=([-50, 0], [50, 50]))
+def erfc_scdm_jac(x, mu, sigma):
+    """Analytic Jacobian of `erfc_scdm` w.r.t. (mu, sigma), shape N * 2"""
+    t = (x - mu) / sigma
+    dmu = np.exp(-t**2) / (sigma * np.sqrt(np.pi))
+    return np.column_stack((dmu, t * dmu))
+
+def fit_erfc(f, xdata, ydata, sigma=None):
+    return curve_fit(f, xdata, ydata, sigma=sigma, bounds=([-50, 0], [50, 50]), jac=erfc_scdm_jac)
+
+class ErfcFit(typing.NamedTuple):
+    """Result of `fit_erfc_projectability`, r2 and residual are evaluated on all the (k, band) points."""
+    mu: float
+    sigma: float
+    r2: float
+    residual: float
+    binned: bool
+
+def bin_projectability(bands: np.array, projections: np.array, num_bins: int) -> typing.Tuple[np.array, np.array, np.array]:
+    """Bin the projectability by energy into a weighted histogram.
+
+    :return: mean energy, mean projectability and number of points of the non-empty bins
+    :rtype: tuple
+    """
+    counts, edges = np.histogram(bands, bins=num_bins)
+    energy_sum, _ = np.histogram(bands, bins=edges, weights=bands)
+    proj_sum, _ = np.histogram(bands, bins=edges, weights=projections)
+    mask = counts > 0
+    counts = counts[mask]
+    return energy_sum[mask] / counts, proj_sum[mask] / counts, counts
+
+def _get_fit_quality(bands: np.array, projections: np.array, mu: float, sigma: float) -> typing.Tuple[float, float]:
+    residuals = projections - erfc_scdm(bands, mu, sigma)
+    ss_res = np.dot(residuals, residuals)
+    ss_tot = np.sum((projections - projections.mean())**2)
+    r2 = 1 - ss_res / ss_tot if ss_tot > 0 else 1.0
+    return float(r2), float(np.sqrt(ss_res / residuals.size))
+
+def fit_erfc_projectability(bands: np.array, projections: np.array, num_bins: int = DEFAULT_NUM_BINS,
+                            min_r2: float = DEFAULT_MIN_R2) -> ErfcFit:
+    """Fit the projectability vs energy with an erfc(x) function.
+
+    The (k, band) points are first binned by energy, the mean projectability of each bin is fitted
+    with the weights of the number of points, using the analytic Jacobian.
+    If the binned fit fails, or its R^2 on all the points is lower than `min_r2`,
+    all the points are fitted and the better of the two fits is returned.
 
-def fit_scdm_mu_sigma(bands: np.array, projections: np.array, thresholds: dict = {'sigma_factor', 3}, return_data: bool = False) -> typing.Union[typing.Tuple[float, float], typing.Tuple[float, float, np.array]]:
+    :param bands: band energies, any shape
+    :type bands: np.array
+    :param projections: projectabilities, same shape as `bands`
+    :type projections: np.array
+    :param num_bins: number of energy bins, 0 to always fit all the points
+    :type num_bins: int
+    :param min_r2: minimum R^2 of the binned fit
+    :type min_r2: float
+    :return: mu, sigma, R^2, root mean square residual, and whether the binned fit is used
+    :rtype: ErfcFit
+    """
+    bands = np.asarray(bands, dtype=np.float64).ravel()
+    projections = np.asarray(projections, dtype=np.float64).ravel()
+
+    result = None
+    if 0 < num_bins < bands.size:
+        energy, projectability, counts = bin_projectability(bands, projections, num_bins)
+        try:
+            popt, _ = fit_erfc(erfc_scdm, energy, projectability, sigma=1 / np.sqrt(counts))
+        except RuntimeError:
+            pass
+        else:
+            result = ErfcFit(float(popt[0]), float(popt[1]), *_get_fit_quality(bands, projections, *popt), binned=True)
+            if result.r2 >= min_r2:
+                return result
+
+    popt, _ = fit_erfc(erfc_scdm, bands, projections)
+    full_result = ErfcFit(float(popt[0]), float(popt[1]), *_get_fit_quality(bands, projections, *popt), binned=False)
+    if result is not None and result.r2 > full_result.r2:
+        return result
+    return full_result
+
+def fit_scdm_mu_sigma(bands: np.array, projections: np.array, thresholds: dict = None, return_data: bool = False) -> typing.Union[typing.Tuple[float, float], typing.Tuple[float, float, np.array]]:
     '''Fit mu parameter for the SCDM-k method:
-    The projectability of all orbitals is fitted using an erfc(x) function. 
+    The projectability of all orbitals is fitted using an erfc(x) function.
     Mu and sigma are extracted from the fitted distribution,
     with mu = mu_fit - k * sigma, sigma = sigma_fit and
     k a parameter with default k = 3.
 
-    This function accepts numpy array inputs, the function `fit_scdm_mu_sigma_aiida` 
+    This function accepts numpy array inputs, the function `fit_scdm_mu_sigma_aiida`
     is the AiiDA wrapper which accepts AiiDA type as input parameters.
 
     :param bands: output of projwfc, it was computed in the nscf calc
     :param projections: output of projwfc
     :param thresholds: must contain 'sigma_factor'; scdm_mu will be set to::
         scdm_mu = E(projectability==max_projectability) - sigma_factor * scdm_sigma
-        Pass sigma_factor = 0 if you do not want to shift
+        Pass sigma_factor = 0 if you do not want to shift.
+        Optional 'num_bins' and 'min_r2' are passed to `fit_erfc_projectability`
     :return: scdm_mu, scdm_sigma,
         optional data (shape 2 * N, 0th row energy, 1st row projectability)'''
-    # Flattening (projection modulus squared according to QE, energies)
-    projwfc_flat = projections.flatten()
-    bands_flat = bands.flatten()
-
-    # sort by energy
-    #sorted_bands, sorted_projwfc = zip(*sorted(zip(bands_flat, projwfc_flat)))
-    # use numpy, faster
-    data = np.vstack((bands_flat, projwfc_flat)) # shape 2 * N
-    ind = np.argsort(data, axis=1)[0, :] # sort by energy
-    data = data[:, ind]
-    sorted_bands = data[0, :]
-    sorted_projwfc = data[1, :]
-
-    popt, pcov = fit_erfc(erfc_scdm, sorted_bands, sorted_projwfc)
-    mu = popt[0]
-    sigma = popt[1]
-    # TODO maybe check the quality of the fitting
-
-    scdm_sigma = sigma
+    if thresholds is None:
+        thresholds = {'sigma_factor': 3}
     sigma_factor = thresholds.get('sigma_factor', None)
     if sigma_factor is None:
         raise ValueError(f'no sigma_factor in input thresholds {thresholds}')
-    scdm_mu = mu - sigma * sigma_factor
+
+    fit = fit_erfc_projectability(
+        bands, projections,
+        num_bins=thresholds.get('num_bins', DEFAULT_NUM_BINS),
+        min_r2=thresholds.get('min_r2', DEFAULT_MIN_R2))
+
+    scdm_sigma = fit.sigma
+    scdm_mu = fit.mu - fit.sigma * sigma_factor
 
     if return_data:
+        # sort by energy, only needed for plotting
+        data = np.vstack((bands.flatten(), projections.flatten())) # shape 2 * N
+        data = data[:, np.argsort(data[0, :])]
         return scdm_mu, scdm_sigma, data
     else:
         return scdm_mu, scdm_sigma
 
+def sum_projections(projections: orm.ProjectionData) -> np.array:
+    """Sum of the projections on all atomic orbitals, read directly from the `proj_array_*` arrays.
+
+    :return: shape num_kpoints * num_bands
+    :rtype: np.array
+    """
+    names = [name for name in projections.get_arraynames() if name.startswith('proj_array_')]
+    if len(names) == 0:
+        raise ValueError('No projection array found in ProjectionData')
+    total = np.array(projections.get_array(names[0]), dtype=np.float64)
+    for name in names[1:]:
+        total += projections.get_array(name)
+    return total
+
 def fit_scdm_mu_sigma_aiida(bands: orm.BandsData, projections: orm.ProjectionData, thresholds: dict, return_data: bool = False) -> typing.Union[typing.Tuple[float, float], typing.Tuple[float, float, np.array]]:
     """Fit scdm_mu & scdm_sigma based on projectability.
     This is the AiiDA wrapper of `fit_scdm_mu_sigma`.
@@ -70,12 +158,9 @@ def fit_scdm_mu_sigma_aiida(bands: orm.BandsData, projections: orm.ProjectionDat
     :type projections: orm.ProjectionData
     :param thresholds: thresholds of SCDM
     :type thresholds: dict"""
-    # List of specifications of atomic orbitals in dictionary form
-    orbitals_list = [i.get_orbital_dict() for i in projections.get_orbitals()]
     # Sum of the projections on all atomic orbitals, shape num_kpoints * num_bands
-    projections_array = sum([sum([x[1] for x in projections.get_projections(**orb_dict)]) 
-                    for orb_dict in orbitals_list])
+    projections_array = sum_projections(projections)
     # shape num_kpoints * num_bands, TODO support spin
     bands_array = bands.get_bands()
 
-    return fit_scdm_mu_sigma(bands_array, projections_array, thresholds, return_data)
\ No newline at end of file
+    return fit_scdm_mu_sigma(bands_array, projections_array, thresholds, return_data)
@@ -0,0 +1,74 @@
+import os
+import typing
+
+__all__ = ('DEPENDENCY_MARKER', 'JOB_ID_FILENAME', 'JOB_STATUS_FILENAME', 'get_remote_workdir', 'get_dependency_markers',
+           'get_dependency_directories', 'set_dependency_directive')
+
+# header line of the submit script of a job which must run after the job of a working directory
+DEPENDENCY_MARKER = '#MOBILITY_AFTEROK'
+# files written in the working directory of a job by the `mobility.*` schedulers
+JOB_ID_FILENAME = '.aiida_job_id'
+JOB_STATUS_FILENAME = '.aiida_job_status'
+
+# the `afterok` dependency directive of each scheduler, None if it is resolved by the submit command
+DEPENDENCY_DIRECTIVES = {
+    'slurm': '#SBATCH --dependency=afterok:{}',
+    'pbspro': '#PBS -W depend=afterok:{}',
+    'torque': '#PBS -W depend=afterok:{}',
+    'direct': None,
+}
+
+
+def get_remote_workdir(workdir: str, uuid: str, username: str = None) -> str:
+    """Get the remote working directory of a calculation before it is uploaded, same as the `execmanager`.
+
+    :param workdir: the working directory of the computer, e.g. `/scratch/{username}/aiida/`
+    :type workdir: str
+    :param uuid: the uuid of the calculation
+    :type uuid: str
+    :param username: the remote username, only required if the working directory contains `{username}`
+    :type username: str
+    :raises ValueError: if the working directory contains `{username}` but `username` is not given
+    :return: the remote working directory
+    :rtype: str
+    """
+    if '{username}' in workdir:
+        if not username:
+            raise ValueError(f'the username is required to format the working directory `{workdir}`')
+        workdir = workdir.format(username=username)
+    return os.path.join(workdir, uuid[:2], uuid[2:4], uuid[4:])
+
+
+def get_dependency_markers(directories: typing.Sequence[str]) -> str:
+    """Get the header lines of a job which runs after the jobs of the working `directories` succeed."""
+    return '\n'.join(f'{DEPENDENCY_MARKER} {directory}' for directory in directories)
+
+
+def get_dependency_directories(script: str) -> typing.List[str]:
+    """Get the working directories of the dependency markers of a submit script."""
+    return [
+        line[len(DEPENDENCY_MARKER):].strip() for line in script.splitlines() if line.startswith(DEPENDENCY_MARKER)
+    ]
+
+
+def set_dependency_directive(script: str, scheduler_type: str, job_ids: typing.Sequence[str]) -> str:
+    """Replace the dependency markers of a submit script with the `afterok` directive of the scheduler.
+
+    The markers are removed if no job is left to wait for, i.e. all the jobs have left the queue.
+
+    :param script: the submit script
+    :type script: str
+    :param scheduler_type: the scheduler, one of `DEPENDENCY_DIRECTIVES`
+    :type scheduler_type: str
+    :param job_ids: the ids of the jobs to wait for
+    :type job_ids: list
+    :return: the new submit script
+    :rtype: str
+    """
+    lines = [line for line in script.split('\n') if not line.startswith(DEPENDENCY_MARKER)]
+    directive = DEPENDENCY_DIRECTIVES[scheduler_type]
+    if directive is None or not job_ids:
+        return '\n'.join(lines)
+    index = next((i for i, line in enumerate(script.split('\n')) if line.startswith(DEPENDENCY_MARKER)), 1)
+    lines.insert(index, directive.format(':'.join(str(job_id) for job_id in job_ids)))
+    return '\n'.join(lines)
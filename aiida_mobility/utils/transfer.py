@@ -0,0 +1,131 @@
+import typing
+import numpy as np
+
+__all__ = ('TRANSFER_MODES', 'get_dvscf_manifest', 'format_manifest', 'get_transfer_script',
+           'estimate_dvscf_bytes', 'format_bytes')
+
+# `remote`: one `remote_copy_list`/`remote_symlink_list` entry per file, i.e. one transport operation each
+# `symlink`: a single `ln -s` pass over the manifest in the job script, same filesystem fast path
+# `copy`: a single `cp` pass over the manifest in the job script
+# `tar`: a single tar stream of all the files of the manifest in the job script
+TRANSFER_MODES = ('remote', 'symlink', 'copy', 'tar')
+
+Manifest = typing.List[typing.Tuple[str, str]]
+
+
+def get_dvscf_manifest(number_of_qpoints: int, prefix: str = 'aiida', dvscf_prefix: str = 'aiida.dvscf',
+                       output_subfolder: str = 'out', destination: str = 'save') -> Manifest:
+    """Get the (source, destination) pairs of the ph.x files required by qe2pert.x.
+
+    The dvscf of the first q point is in `_ph0/`, the others in `_ph0/{prefix}.q_{iq}/`;
+    they are renamed to `{dvscf_prefix}_q{iq}`, the `{prefix}.phsave` folder keeps its name.
+
+    :param number_of_qpoints: number of irreducible q points
+    :type number_of_qpoints: int
+    :param prefix: the QE prefix
+    :type prefix: str
+    :param dvscf_prefix: the prefix of the dvscf files
+    :type dvscf_prefix: str
+    :param output_subfolder: the QE outdir relative to the ph.x work directory
+    :type output_subfolder: str
+    :param destination: the folder relative to the qe2pert.x work directory
+    :type destination: str
+    :return: list of (source relative to the ph.x work directory, destination relative to the qe2pert.x work directory)
+    :rtype: list
+    """
+    ph0 = f'{output_subfolder.strip("./")}/_ph0'
+    destination = destination.strip('./')
+    manifest = [(f'{ph0}/{dvscf_prefix}1', f'{destination}/{dvscf_prefix}_q1')]
+    for iq in range(2, number_of_qpoints + 1):
+        manifest.append((f'{ph0}/{prefix}.q_{iq}/{dvscf_prefix}1', f'{destination}/{dvscf_prefix}_q{iq}'))
+    manifest.append((f'{ph0}/{prefix}.phsave', f'{destination}/{prefix}.phsave'))
+    return manifest
+
+
+def format_manifest(manifest: Manifest) -> str:
+    """Return the manifest as tab separated `source destination` lines."""
+    return ''.join(f'{source}\t{destination}\n' for source, destination in manifest)
+
+
+def get_transfer_script(source_path: str, manifest_filename: str, mode: str,
+                        folders: typing.Sequence[typing.Tuple[str, str]] = ()) -> str:
+    """Get a bash script doing the whole transfer of a manifest in one server-side pass.
+
+    The script runs in the work directory at the beginning of the job, so no file is moved
+    by the daemon through the transport.
+
+    :param source_path: absolute path of the source work directory on the remote computer
+    :type source_path: str
+    :param manifest_filename: name of the manifest file written by `format_manifest`
+    :type manifest_filename: str
+    :param mode: `symlink`, `copy` or `tar`
+    :type mode: str
+    :param folders: (source folder, destination folder) pairs whose whole content is transferred, e.g. `DYN_MAT`
+    :type folders: list
+    :raises ValueError: for an unknown or `remote` mode
+    :return: the bash script
+    :rtype: str
+    """
+    if mode not in TRANSFER_MODES or mode == 'remote':
+        raise ValueError(f'Invalid transfer mode `{mode}` for a script, valid modes are {TRANSFER_MODES[1:]}.')
+
+    lines = [
+        '#!/bin/bash',
+        f'# transfer the files listed in {manifest_filename} in a single `{mode}` pass',
+        'set -e',
+        f"SOURCE_DIR='{source_path}'",
+        f"MANIFEST='{manifest_filename}'",
+        'cut -f2 "$MANIFEST" | xargs -r -n 1 dirname | sort -u | xargs -r mkdir -p',
+    ]
+    for _, destination in folders:
+        lines.append(f'mkdir -p "{destination}"')
+
+    if mode == 'symlink':
+        lines.append('while IFS=$\'\\t\' read -r src dst; do ln -sfn "$SOURCE_DIR/$src" "$dst"; done < "$MANIFEST"')
+        for source, destination in folders:
+            lines.append(f'ln -sf "$SOURCE_DIR/{source}"/* "{destination}/"')
+    elif mode == 'copy':
+        lines.append('while IFS=$\'\\t\' read -r src dst; do cp -r "$SOURCE_DIR/$src" "$dst"; done < "$MANIFEST"')
+        for source, destination in folders:
+            lines.append(f'cp -r "$SOURCE_DIR/{source}"/* "{destination}/"')
+    else:
+        staging = '_transfer'
+        sources = ' '.join(f'"{source}"' for source, _ in folders)
+        lines.extend([
+            f'mkdir -p {staging}',
+            f'tar -C "$SOURCE_DIR" -cf - -T <(cut -f1 "$MANIFEST") {sources} | tar -xf - -C {staging}',
+            f'while IFS=$\'\\t\' read -r src dst; do mv "{staging}/$src" "$dst"; done < "$MANIFEST"',
+        ])
+        for source, destination in folders:
+            lines.append(f'mv "{staging}/{source}"/* "{destination}/"')
+        lines.append(f'rm -rf {staging}')
+    return '\n'.join(lines) + '\n'
+
+
+def estimate_dvscf_bytes(number_of_qpoints: int, number_of_atoms: int, fft_grid: typing.Sequence[int],
+                         number_of_spin_components: int = 1) -> int:
+    """Estimate the total size of the dvscf files.
+
+    Each dvscf file stores 3 * nat complex double precision perturbations on the dense FFT grid per spin.
+
+    :param number_of_qpoints: number of irreducible q points
+    :type number_of_qpoints: int
+    :param number_of_atoms: number of atoms in the cell
+    :type number_of_atoms: int
+    :param fft_grid: the dense FFT grid (nr1, nr2, nr3)
+    :type fft_grid: list
+    :param number_of_spin_components: number of spin components
+    :type number_of_spin_components: int
+    :return: estimated number of bytes
+    :rtype: int
+    """
+    per_qpoint = 16 * 3 * number_of_atoms * number_of_spin_components * int(np.prod(fft_grid))
+    return number_of_qpoints * per_qpoint
+
+
+def format_bytes(size: float) -> str:
+    """Return a human readable size, e.g. `1.5 GiB`."""
+    for unit in ('B', 'KiB', 'MiB', 'GiB', 'TiB'):
+        if abs(size) < 1024 or unit == 'TiB':
+            return f'{size:.1f} {unit}'
+        size /= 1024
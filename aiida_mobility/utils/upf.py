@@ -4,6 +4,7 @@ import json
 from aiida import orm
 import xml.etree.ElementTree as ET
 import hashlib
+import tempfile
 
 __all__ = (# for the content of UPF, i.e. these functions accept str as parameter
            'parse_zvalence',
@@ -20,47 +21,316 @@ __all__ = (# for the content of UPF, i.e. these functions accept str as paramete
            'get_wannier_number_of_bands',
            # helper functions
            'is_soc_pseudo',
+           'UpfIndex',
+           'PseudoMetadataCache',
+           'get_pseudo_metadata_cache',
+           'get_upf_metadata',
            '_load_pseudo_metadata')
 
 Dict_of_Upf = typing.Dict[str, orm.UpfData]
 
-def get_ppheader(upf_content: str) -> str:
-    upf_content = upf_content.split('\n')
-    # get PP_HEADER block
-    ppheader_block = ''
-    found_begin = False
-    found_end = False
-    for line in upf_content:
-        if '<PP_HEADER' in line:
-            ppheader_block += line + '\n'
-            if not found_begin:
-                found_begin = True
-                if '/>' in line or '</PP_HEADER>' in line:
-                    # in the same line
-                    break
+# the parsed `UpfIndex` of every pseudo seen so far, keyed by the md5 of the UPF file
+_UPF_INDEX_CACHE: typing.Dict[str, 'UpfIndex'] = {}
+
+
+class UpfIndex:
+    """Index of the blocks of a UPF file needed to set up a Wannier90 calculation.
+
+    The UPF file is read once, line by line, and the scan stops as soon as the `PP_HEADER` block
+    and the `PP_PSWFC` block (or the `PP_SPIN_ORB` block for a SOC pseudo) have been found,
+    i.e. the radial grids, projectors and PAW data at the end of the file are never read.
+    The byte offsets (begin, end) of the blocks are kept in `offsets`, the header, z_valence,
+    SOC flag and orbitals are parsed on first access.
+
+    Usage:
+        index = UpfIndex.from_upf(UpfData_Ga)
+        index.z_valence, index.has_so, index.number_of_pswfc
+    """
+
+    def __init__(self, lines: typing.Iterable[bytes], md5: str = None):
+        """Scan the lines of a UPF file.
+
+        :param lines: the lines of the UPF file, e.g. a file handle opened in binary mode
+        :type lines: iterable of bytes
+        :param md5: md5 of the UPF file, only used to identify the pseudo
+        :type md5: str
+        """
+        self.md5 = md5
+        self.offsets = {}
+        self._blocks = {}
+        self._ppheader = None
+        self._pswfc = None
+        self._scan(lines)
+
+    @classmethod
+    def from_string(cls, upf_content: str) -> 'UpfIndex':
+        """Get the index of the content of a UPF file, memoized by md5. No AiiDA dependencies.
+
+        :param upf_content: the content of the UPF file
+        :type upf_content: str
+        :return: the index of the UPF file
+        :rtype: UpfIndex
+        """
+        content = upf_content.encode('utf-8')
+        md5 = hashlib.md5(content).hexdigest()
+        if md5 not in _UPF_INDEX_CACHE:
+            _UPF_INDEX_CACHE[md5] = cls(content.splitlines(keepends=True), md5=md5)
+        return _UPF_INDEX_CACHE[md5]
+
+    @classmethod
+    def from_upf(cls, upf: orm.UpfData) -> 'UpfIndex':
+        """Get the index of a UpfData, memoized by its md5, so a pseudo is read at most once.
+
+        :param upf: pseudo
+        :type upf: aiida.orm.UpfData
+        :return: the index of the UPF file
+        :rtype: UpfIndex
+        """
+        if not isinstance(upf, orm.UpfData):
+            raise ValueError(f'The type of upf is {type(upf)}, only aiida.orm.UpfData is accepted')
+        md5 = upf.md5
+        if md5 is None or md5 not in _UPF_INDEX_CACHE:
+            upf_name = upf.list_object_names()[0]
+            with upf.open(upf_name, mode='rb') as handle:
+                index = cls(handle, md5=md5)
+            if md5 is None:
+                return index
+            _UPF_INDEX_CACHE[md5] = index
+        return _UPF_INDEX_CACHE[md5]
+
+    def _scan(self, lines: typing.Iterable[bytes]):
+        # the block currently being read and its lines
+        current = None
+        block = []
+        offset = 0
+        for line in lines:
+            begin = offset
+            offset += len(line)
+            text = line.decode('utf-8', errors='replace')
+            if current is None:
+                if 'PP_HEADER' not in self._blocks and '<PP_HEADER' in text:
+                    current = 'PP_HEADER'
+                elif 'PP_PSWFC' not in self._blocks and 'PP_PSWFC' in text:
+                    current = 'PP_PSWFC'
+                elif 'PP_SPIN_ORB' not in self._blocks and 'PP_SPIN_ORB' in text:
+                    current = 'PP_SPIN_ORB'
                 else:
                     continue
-        if found_begin and ('/>' in line or '</PP_HEADER>' in line):
-            ppheader_block += line + '\n'
-            if not found_end:
-                found_end = True
+                self.offsets[current] = [begin, None]
+                block = [text]
+                if not self._is_one_line_block(current, text):
+                    continue
+            else:
+                block.append(text)
+                if not self._is_block_end(current, text):
+                    continue
+            self.offsets[current][1] = offset
+            self.offsets[current] = tuple(self.offsets[current])
+            self._blocks[current] = ''.join(block)
+            current = None
+            if self._is_complete():
                 break
-        if found_begin:
-            ppheader_block += line + '\n'
-    # print(ppheader_block)
-    return ppheader_block
 
-def is_soc_pseudo(upf_content: str) -> bool:
-    """check if it is a SOC pseudo
+    @staticmethod
+    def _is_one_line_block(name: str, line: str) -> bool:
+        if name == 'PP_HEADER':
+            return '/>' in line or '</PP_HEADER>' in line
+        return line.rstrip().endswith('/>') or f'</{name}>' in line
+
+    @staticmethod
+    def _is_block_end(name: str, line: str) -> bool:
+        if name == 'PP_HEADER':
+            return '/>' in line or '</PP_HEADER>' in line
+        return name in line
+
+    def _is_complete(self) -> bool:
+        if 'PP_HEADER' not in self._blocks:
+            return False
+        if self.has_so:
+            return 'PP_SPIN_ORB' in self._blocks
+        return 'PP_PSWFC' in self._blocks
+
+    def get_block(self, name: str) -> str:
+        """Return the text of a block, e.g. `PP_HEADER`.
+
+        :raises ValueError: if the block was not found
+        """
+        try:
+            return self._blocks[name]
+        except KeyError:
+            raise ValueError(f'{name} block not found in the UPF file')
+
+    @property
+    def ppheader(self) -> ET.Element:
+        """The parsed PP_HEADER block."""
+        if self._ppheader is None:
+            self._ppheader = ET.XML(self.get_block('PP_HEADER'))
+        return self._ppheader
+
+    @property
+    def has_so(self) -> bool:
+        """Whether it is a SOC pseudo."""
+        return _parse_has_so(self.ppheader)
+
+    @property
+    def z_valence(self) -> float:
+        """z_valence of the pseudo."""
+        return _parse_zvalence(self.ppheader, self.get_block('PP_HEADER'))
+
+    @property
+    def pswfc(self) -> list:
+        """The orbitals of the pseudo, see `parse_pswfc_soc` and `parse_pswfc_nosoc`."""
+        if self._pswfc is None:
+            if self.has_so:
+                self._pswfc = _parse_pswfc_soc(self.get_block('PP_SPIN_ORB'))
+            else:
+                self._pswfc = _parse_pswfc_nosoc(self.get_block('PP_PSWFC'))
+        return self._pswfc
+
+    @property
+    def number_of_pswfc(self) -> int:
+        """Number of orbitals used for projections in projwfc.x, see `parse_number_of_pswfc`."""
+        return _count_pswfc(self.pswfc, self.has_so)
+
+    def get_projections(self, element: str) -> list:
+        """Return a list of strings for Wannier90 projection block, see `get_projections_from_upf`."""
+        return _get_wannier_projections(self.pswfc, self.has_so, element)
+
+    def get_metadata(self, element: str) -> dict:
+        """Return the metadata stored in the `PseudoMetadataCache`."""
+        return {
+            'element': element,
+            'z_valence': self.z_valence,
+            'has_so': self.has_so,
+            'number_of_pswfc': self.number_of_pswfc,
+            'projections': self.get_projections(element),
+        }
 
-    :param upf_content: the content of the UPF file
-    :type upf_content: str
-    :return: [description]
-    :rtype: bool
+
+class PseudoMetadataCache:
+    """Persistent cache of the pseudo metadata needed by Wannier90, keyed by the md5 of the UPF file.
+
+    The cache is a versioned json file, e.g.
+        {"version": 1, "pseudos": {"<md5>": {"element": "Ga", "z_valence": 13.0, "has_so": false,
+                                             "number_of_pswfc": 9, "projections": ["Ga: s", ...]}}}
+    A file with another version is ignored and overwritten on the next `save`.
     """
-    ppheader_block = get_ppheader(upf_content)
-    # parse XML
-    PP_HEADER = ET.XML(ppheader_block)
+
+    VERSION = 1
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._pseudos = self._read()
+        self._modified = False
+
+    def _read(self) -> dict:
+        try:
+            with open(self.filename) as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get('version') != self.VERSION:
+            return {}
+        return data.get('pseudos', {})
+
+    def __contains__(self, md5: str) -> bool:
+        return md5 in self._pseudos
+
+    def __len__(self) -> int:
+        return len(self._pseudos)
+
+    def get(self, md5: str) -> typing.Optional[dict]:
+        """Return the metadata of the pseudo with this md5, None if not cached."""
+        return self._pseudos.get(md5)
+
+    def add(self, md5: str, metadata: dict):
+        """Add the metadata of a pseudo, call `save` to write it to disk."""
+        self._pseudos[md5] = metadata
+        self._modified = True
+
+    def save(self):
+        """Merge with the file on disk and write it atomically, so concurrent processes do not lose entries."""
+        if not self._modified:
+            return
+        pseudos = self._read()
+        pseudos.update(self._pseudos)
+        self._pseudos = pseudos
+        dirname = os.path.dirname(os.path.abspath(self.filename))
+        os.makedirs(dirname, exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', dir=dirname, delete=False, suffix='.tmp') as handle:
+            json.dump({'version': self.VERSION, 'pseudos': pseudos}, handle, indent=2)
+        os.replace(handle.name, self.filename)
+        self._modified = False
+
+    def populate(self, filters: dict = None) -> int:
+        """Parse all the UpfData not cached yet, found with a single query, and save the cache.
+
+        :param filters: additional QueryBuilder filters on UpfData, e.g. {'attributes.element': 'Ga'}
+        :type filters: dict
+        :return: number of newly cached pseudos
+        :rtype: int
+        """
+        qb = orm.QueryBuilder()
+        qb.append(orm.UpfData, filters=filters or {}, project=['*', 'attributes.md5'])
+        count = 0
+        for upf, md5 in qb.iterall():
+            if md5 is None or md5 in self:
+                continue
+            self.add(md5, UpfIndex.from_upf(upf).get_metadata(upf.element))
+            count += 1
+        self.save()
+        return count
+
+
+# name of the environment variable overriding the path of the pseudo metadata cache
+PSEUDO_CACHE_ENVVAR = 'AIIDA_MOBILITY_PSEUDO_CACHE'
+
+_PSEUDO_METADATA_CACHE = None
+
+
+def get_pseudo_metadata_cache() -> PseudoMetadataCache:
+    """Return the pseudo metadata cache of this process, loaded on first call.
+
+    The file is `$AIIDA_MOBILITY_PSEUDO_CACHE` if set, otherwise `pseudo_metadata.json`
+    in the `aiida_mobility` subfolder of the AiiDA config folder.
+    """
+    global _PSEUDO_METADATA_CACHE
+    if _PSEUDO_METADATA_CACHE is None:
+        filename = os.environ.get(PSEUDO_CACHE_ENVVAR)
+        if filename is None:
+            from aiida.manage.configuration.settings import AIIDA_CONFIG_FOLDER
+            filename = os.path.join(AIIDA_CONFIG_FOLDER, 'aiida_mobility', 'pseudo_metadata.json')
+        _PSEUDO_METADATA_CACHE = PseudoMetadataCache(filename)
+    return _PSEUDO_METADATA_CACHE
+
+
+def get_upf_metadata(upf: orm.UpfData) -> dict:
+    """Return z_valence, SOC flag, number of orbitals and Wannier90 projections of a pseudo.
+
+    The persistent cache is consulted first, the UPF file is only parsed on a cache miss.
+
+    :param upf: pseudo
+    :type upf: aiida.orm.UpfData
+    :return: see `PseudoMetadataCache`
+    :rtype: dict
+    """
+    if not isinstance(upf, orm.UpfData):
+        raise ValueError(f'The type of upf is {type(upf)}, only aiida.orm.UpfData is accepted')
+    if upf.md5 is None:
+        return UpfIndex.from_upf(upf).get_metadata(upf.element)
+    cache = get_pseudo_metadata_cache()
+    metadata = cache.get(upf.md5)
+    if metadata is None:
+        metadata = UpfIndex.from_upf(upf).get_metadata(upf.element)
+        cache.add(upf.md5, metadata)
+        cache.save()
+    return metadata
+
+
+def get_ppheader(upf_content: str) -> str:
+    return UpfIndex.from_string(upf_content).get_block('PP_HEADER')
+
+def _parse_has_so(PP_HEADER: ET.Element) -> bool:
     if len(PP_HEADER.attrib) == 0:
         # old upf format, TODO check how to retrieve has_so of old upf format
         has_so = False
@@ -69,20 +339,17 @@ def is_soc_pseudo(upf_content: str) -> bool:
         has_so = PP_HEADER.get('has_so')[0].lower() == 't'
     return has_so
 
-def parse_zvalence(upf_content: str) -> float:
-    """get z_valcence from a UPF file. No AiiDA dependencies.
-    Works for both UPF v1 & v2 format, non-relativistic & relativistic.
-    Tested on all the SSSP pseudos.
+def is_soc_pseudo(upf_content: str) -> bool:
+    """check if it is a SOC pseudo
 
     :param upf_content: the content of the UPF file
     :type upf_content: str
-    :return: z_valence of the UPF file
-    :rtype: float
+    :return: [description]
+    :rtype: bool
     """
-    ppheader_block = get_ppheader(upf_content)
-    num_electrons = 0
-    # parse XML
-    PP_HEADER = ET.XML(ppheader_block)
+    return UpfIndex.from_string(upf_content).has_so
+
+def _parse_zvalence(PP_HEADER: ET.Element, ppheader_block: str) -> float:
     if len(PP_HEADER.attrib) == 0:
         # old upf format, at the 6th line, e.g.
         # <PP_HEADER>
@@ -134,6 +401,18 @@ def parse_zvalence(upf_content: str) -> float:
         num_electrons = float(PP_HEADER.get('z_valence'))
     return num_electrons
 
+def parse_zvalence(upf_content: str) -> float:
+    """get z_valcence from a UPF file. No AiiDA dependencies.
+    Works for both UPF v1 & v2 format, non-relativistic & relativistic.
+    Tested on all the SSSP pseudos.
+
+    :param upf_content: the content of the UPF file
+    :type upf_content: str
+    :return: z_valence of the UPF file
+    :rtype: float
+    """
+    return UpfIndex.from_string(upf_content).z_valence
+
 def get_upf_content(upf: orm.UpfData) -> str:
     """Retreive the content of the UpfData
 
@@ -156,8 +435,7 @@ def get_number_of_electrons_from_upf(upf: orm.UpfData) -> float:
     :return: number of electrons
     :rtype: float
     """
-    upf_content = get_upf_content(upf)
-    return parse_zvalence(upf_content)
+    return get_upf_metadata(upf)['z_valence']
 
 def get_number_of_electrons(structure: orm.StructureData, pseudos: Dict_of_Upf) -> float:
     """get number of electrons for the structure based on pseudopotentials
@@ -189,43 +467,13 @@ def get_number_of_electrons(structure: orm.StructureData, pseudos: Dict_of_Upf)
         tot_nelecs += nelecs * composition[kind]
     return tot_nelecs
 
-def parse_pswfc_soc(upf_content: str) -> list:
-    """parse the PP_SPIN_ORB block in SOC UPF.
-    This is also the orbitals used for projections in projwfc.x.
-    No AiiDA dependencies.
-    Works for both UPF v1 & v2 format.
-
-    :param upf_content: [description]
-    :type upf_content: str
-    :raises ValueError: [description]
-    :return: list of dict, each dict contains 3 keys for quantum number n, l, j
-    :rtype: list
-    """
-    if not is_soc_pseudo(upf_content):
-        raise ValueError('Only accept SOC pseudo')
-    upf_content = upf_content.split('\n')
-    # get PP_SPIN_ORB block
-    pswfc_block = ''
-    found_begin = False
-    found_end = False
-    for line in upf_content:
-        if 'PP_SPIN_ORB' in line:
-            pswfc_block += line + '\n'
-            if not found_begin:
-                found_begin = True
-                continue
-            else:
-                if not found_end:
-                    found_end = True
-                    break
-        if found_begin:
-            pswfc_block += line + '\n'
 
+def _parse_pswfc_soc(pswfc_block: str) -> list:
     # contains element: {'n', 'l', 'j'} for 3 quantum numbers
     projections = []
     # parse XML
     PP_PSWFC = ET.XML(pswfc_block)
-    if len(PP_PSWFC.getchildren()) == 0:
+    if len(PP_PSWFC) == 0:
         # old upf format, TODO check
         raise ValueError
     else:
@@ -250,38 +498,28 @@ def parse_pswfc_soc(upf_content: str) -> list:
             projections.append({'n': nn, 'l': lchi, 'j': jchi})
     return projections
 
-def parse_pswfc_nosoc(upf_content: str) -> list:
-    """for non-relativistic pseudo
+def parse_pswfc_soc(upf_content: str) -> list:
+    """parse the PP_SPIN_ORB block in SOC UPF.
+    This is also the orbitals used for projections in projwfc.x.
+    No AiiDA dependencies.
+    Works for both UPF v1 & v2 format.
 
     :param upf_content: [description]
     :type upf_content: str
-    :return: list of dict, each dict contains 1 key for quantum number l
+    :raises ValueError: [description]
+    :return: list of dict, each dict contains 3 keys for quantum number n, l, j
     :rtype: list
     """
-    if is_soc_pseudo(upf_content):
-        raise ValueError('Only accept non-SOC pseudo')
-    upf_content = upf_content.split('\n')
-    # get PP_PSWFC block
-    pswfc_block = ''
-    found_begin = False
-    found_end = False
-    for line in upf_content:
-        if 'PP_PSWFC' in line:
-            pswfc_block += line + '\n'
-            if not found_begin:
-                found_begin = True
-                continue
-            else:
-                if not found_end:
-                    found_end = True
-                    break
-        if found_begin:
-            pswfc_block += line + '\n'
+    index = UpfIndex.from_string(upf_content)
+    if not index.has_so:
+        raise ValueError('Only accept SOC pseudo')
+    return [dict(wfc) for wfc in index.pswfc]
 
+def _parse_pswfc_nosoc(pswfc_block: str) -> list:
     projections = []
     # parse XML
     PP_PSWFC = ET.XML(pswfc_block)
-    if len(PP_PSWFC.getchildren()) == 0:
+    if len(PP_PSWFC) == 0:
         # old upf format
         import re
         r = re.compile(r'[\d]([SPDF])')
@@ -304,14 +542,20 @@ def parse_pswfc_nosoc(upf_content: str) -> list:
             projections.append({'l': l})
     return projections
 
-def get_projections_from_upf(upf: orm.UpfData):
-    """Return a list of strings for Wannier90 projection block
+def parse_pswfc_nosoc(upf_content: str) -> list:
+    """for non-relativistic pseudo
 
-    :param upf: the pseduo to be parsed
-    :type upf: orm.UpfData
-    :return: list of projections
+    :param upf_content: [description]
+    :type upf_content: str
+    :return: list of dict, each dict contains 1 key for quantum number l
     :rtype: list
     """
+    index = UpfIndex.from_string(upf_content)
+    if index.has_so:
+        raise ValueError('Only accept non-SOC pseudo')
+    return [dict(wfc) for wfc in index.pswfc]
+
+def _get_wannier_projections(pswfc: list, has_so: bool, element: str) -> list:
     class Orbit:
         """A simple class to help sorting/removing the orbitals in a list
         """
@@ -337,17 +581,12 @@ def get_projections_from_upf(upf: orm.UpfData):
                 return False
 
     orbit_map = {0: 's', 1: 'p', 2: 'd', 3: 'f'}
-    upf_content = get_upf_content(upf)
     wannier_projections = []
-    has_so = is_soc_pseudo(upf_content)
     if not has_so:
-        pswfc = parse_pswfc_nosoc(upf_content)
         for wfc in pswfc:
-            wannier_projections.append(f'{upf.element}: {orbit_map[wfc["l"]]}')
+            wannier_projections.append(f'{element}: {orbit_map[wfc["l"]]}')
     else:
-        pswfc = []
-        for wfc in parse_pswfc_soc(upf_content):
-            pswfc.append(Orbit(wfc))
+        pswfc = [Orbit(wfc) for wfc in pswfc]
         # First sort by n, then l, then j, in ascending order
         sorted_pswfc = sorted(pswfc) # will use __lt__
         # Check that for a given l (>0), there are two j: j = l - 1/2 and j = l + 1/2,
@@ -373,9 +612,19 @@ def get_projections_from_upf(upf: orm.UpfData):
             i += 1
         # Now all the j = l + 1/2 orbitals have been removed
         for wfc in pswfc:
-            wannier_projections.append(f'{upf.element}: {orbit_map[wfc.l]}')
+            wannier_projections.append(f'{element}: {orbit_map[wfc.l]}')
     return wannier_projections
 
+def get_projections_from_upf(upf: orm.UpfData):
+    """Return a list of strings for Wannier90 projection block
+
+    :param upf: the pseduo to be parsed
+    :type upf: orm.UpfData
+    :return: list of projections
+    :rtype: list
+    """
+    return list(get_upf_metadata(upf)['projections'])
+
 def get_projections(structure: orm.StructureData, pseudos: Dict_of_Upf):
     """get wannier90 projection block for the crystal structure 
     based on pseudopotential files.
@@ -407,27 +656,14 @@ def get_projections(structure: orm.StructureData, pseudos: Dict_of_Upf):
         projections.extend(projs)
     return projections
 
-def parse_number_of_pswfc(upf_content: str) -> int:
-    """Get the number of orbitals in the UPF file.
-    This is also the number of orbitals used for projections in projwfc.x.
-    No AiiDA dependencies.
-    Works for both UPF v1 & v2 format, non-relativistic & relativistic.
-    Tested on all the SSSP pseudos.
 
-    :param upf_content: the content of the UPF file
-    :type upf_content: str
-    :return: number of PSWFC 
-    :rtype: int
-    """
+def _count_pswfc(pswfc: list, has_so: bool) -> int:
     num_projections = 0
-    has_so = is_soc_pseudo(upf_content)
     if not has_so:
-        pswfc = parse_pswfc_nosoc(upf_content)
         for wfc in pswfc:
             l = wfc['l']
             num_projections += 2 * l + 1
     else:
-        pswfc = parse_pswfc_soc(upf_content)
         # For a given quantum number l, there are 2 cases:
         # 1. j = l - 1/2 then there are 2*j + 1 = 2l states
         # 2. j = l + 1/2 then there are 2*j + 1 = 2l + 2 states so we have to add another 2
@@ -440,6 +676,20 @@ def parse_number_of_pswfc(upf_content: str) -> int:
                 num_projections += 2
     return num_projections
 
+def parse_number_of_pswfc(upf_content: str) -> int:
+    """Get the number of orbitals in the UPF file.
+    This is also the number of orbitals used for projections in projwfc.x.
+    No AiiDA dependencies.
+    Works for both UPF v1 & v2 format, non-relativistic & relativistic.
+    Tested on all the SSSP pseudos.
+
+    :param upf_content: the content of the UPF file
+    :type upf_content: str
+    :return: number of PSWFC 
+    :rtype: int
+    """
+    return UpfIndex.from_string(upf_content).number_of_pswfc
+
 def get_number_of_projections_from_upf(upf: orm.UpfData) -> int:
     """aiida wrapper for `parse_number_of_pswfc`.
 
@@ -448,8 +698,7 @@ def get_number_of_projections_from_upf(upf: orm.UpfData) -> int:
     :return: number of projections in the UPF file
     :rtype: int
     """
-    upf_content = get_upf_content(upf)
-    return parse_number_of_pswfc(upf_content)
+    return get_upf_metadata(upf)['number_of_pswfc']
 
 def get_number_of_projections(structure: orm.StructureData, pseudos: Dict_of_Upf) -> int:
     """get number of projections for the crystal structure 
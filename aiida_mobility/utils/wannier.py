@@ -0,0 +1,245 @@
+import concurrent.futures
+import typing
+import numpy as np
+
+__all__ = ('DEFAULT_CHUNK_SIZE', 'WannierHamiltonian', 'parse_hr', 'parse_tb', 'apply_wsvec', 'get_kpoint_grid',
+           'interpolate_bands', 'get_dos', 'get_fermi_energy')
+
+# maximum number of bytes of the k-dependent arrays of a chunk of kpoints, i.e. 64 MB
+DEFAULT_CHUNK_SIZE = 64 * 1024**2
+
+
+class WannierHamiltonian(typing.NamedTuple):
+    """Tight-binding Hamiltonian in the Wannier basis, H_mn(R) = <m0|H|nR> in eV."""
+
+    r_vectors: np.array  # (nrpts, 3) in units of the lattice vectors
+    degeneracies: np.array  # (nrpts,) of the Wigner-Seitz points
+    hamiltonian: np.array  # (nrpts, num_wann, num_wann)
+    lattice: typing.Optional[np.array] = None  # (3, 3) in angstrom, rows are the lattice vectors
+
+    @property
+    def num_wann(self) -> int:
+        return self.hamiltonian.shape[-1]
+
+
+def _read_values(text: str) -> np.array:
+    return np.array(text.split(), dtype=np.float64)
+
+
+def _build_hamiltonian(hoppings: np.array, num_wann: int, dtype) -> np.array:
+    """Fill H(R) from the rows `m n re im` of each R vector, of shape (nrpts, num_wann**2, 4)."""
+    nrpts = hoppings.shape[0]
+    hamiltonian = np.zeros((nrpts, num_wann, num_wann), dtype=dtype)
+    index = np.repeat(np.arange(nrpts), num_wann**2)
+    rows = hoppings.reshape(-1, 4)
+    hamiltonian[index, rows[:, 0].astype(int) - 1, rows[:, 1].astype(int) - 1] = rows[:, 2] + 1j * rows[:, 3]
+    return hamiltonian
+
+
+def parse_hr(content: str, dtype=np.complex128) -> WannierHamiltonian:
+    """Parse the `{seedname}_hr.dat` file of Wannier90 in a single pass.
+
+    :param content: the content of the file
+    :type content: str
+    :param dtype: the complex type of H(R), e.g. `np.complex64` to halve the memory
+    :raises ValueError: if the number of values does not match the header
+    :return: the Hamiltonian, without lattice
+    :rtype: WannierHamiltonian
+    """
+    _, num_wann, nrpts, body = content.split('\n', 3)
+    num_wann, nrpts = int(num_wann), int(nrpts)
+    values = _read_values(body)
+    if values.size != nrpts + nrpts * num_wann**2 * 7:
+        raise ValueError(f'expected {nrpts} R vectors of {num_wann} Wannier functions, got {values.size} values')
+    rows = values[nrpts:].reshape(nrpts, num_wann**2, 7)
+    return WannierHamiltonian(
+        r_vectors=rows[:, 0, :3].astype(int),
+        degeneracies=values[:nrpts].astype(int),
+        hamiltonian=_build_hamiltonian(rows[:, :, 3:], num_wann, dtype),
+    )
+
+
+def parse_tb(content: str, dtype=np.complex128) -> WannierHamiltonian:
+    """Parse the Hamiltonian and the lattice of the `{seedname}_tb.dat` file of Wannier90, the position matrix is skipped.
+
+    :param content: the content of the file
+    :type content: str
+    :param dtype: the complex type of H(R)
+    :raises ValueError: if the file is shorter than its header says
+    :return: the Hamiltonian, with the lattice
+    :rtype: WannierHamiltonian
+    """
+    lines = content.split('\n', 6)
+    lattice = np.array([line.split() for line in lines[1:4]], dtype=np.float64)
+    num_wann, nrpts = int(lines[4]), int(lines[5])
+    values = _read_values(lines[6])
+    block = 3 + num_wann**2 * 4
+    if values.size < nrpts + nrpts * block:
+        raise ValueError(f'expected {nrpts} R vectors of {num_wann} Wannier functions, got {values.size} values')
+    blocks = values[nrpts:nrpts + nrpts * block].reshape(nrpts, block)
+    return WannierHamiltonian(
+        r_vectors=blocks[:, :3].astype(int),
+        degeneracies=values[:nrpts].astype(int),
+        hamiltonian=_build_hamiltonian(blocks[:, 3:].reshape(nrpts, num_wann**2, 4), num_wann, dtype),
+        lattice=lattice,
+    )
+
+
+def apply_wsvec(model: WannierHamiltonian, content: str) -> WannierHamiltonian:
+    """Distribute each hopping over its equivalent R + T vectors of the `{seedname}_wsvec.dat` file.
+
+    The file is written with `use_ws_distance`, the returned Hamiltonian has the degeneracies folded in, i.e.
+    all equal to 1, as Wannier90 does for the interpolation.
+
+    :param model: the Hamiltonian of the `_hr.dat` or `_tb.dat` file
+    :type model: WannierHamiltonian
+    :param content: the content of the `_wsvec.dat` file
+    :type content: str
+    :raises ValueError: if an R vector of the file is not in the Hamiltonian
+    :return: the Hamiltonian on the new R vectors
+    :rtype: WannierHamiltonian
+    """
+    values = np.array(content.split('\n', 1)[1].split(), dtype=int)
+    r_index = {tuple(r): i for i, r in enumerate(model.r_vectors)}
+    weights = model.hamiltonian / model.degeneracies[:, None, None]
+
+    r_vectors, elements, hoppings = [], [], []
+    position = 0
+    while position < values.size:
+        r, (m, n), num_t = values[position:position + 3], values[position + 3:position + 5] - 1, values[position + 5]
+        shifts = values[position + 6:position + 6 + 3 * num_t].reshape(num_t, 3)
+        position += 6 + 3 * num_t
+        try:
+            hopping = weights[r_index[tuple(r)], m, n] / num_t
+        except KeyError as exception:
+            raise ValueError(f'R vector {r} of the wsvec file is not in the Hamiltonian') from exception
+        r_vectors.append(r + shifts)
+        elements.extend([(m, n)] * num_t)
+        hoppings.extend([hopping] * num_t)
+
+    new_r_vectors, inverse = np.unique(np.concatenate(r_vectors), axis=0, return_inverse=True)
+    elements = np.array(elements)
+    hamiltonian = np.zeros((len(new_r_vectors), model.num_wann, model.num_wann), dtype=model.hamiltonian.dtype)
+    np.add.at(hamiltonian, (inverse.ravel(), elements[:, 0], elements[:, 1]), hoppings)
+    return WannierHamiltonian(
+        r_vectors=new_r_vectors,
+        degeneracies=np.ones(len(new_r_vectors), dtype=int),
+        hamiltonian=hamiltonian,
+        lattice=model.lattice,
+    )
+
+
+def get_kpoint_grid(mesh: typing.Sequence[int], offset: typing.Sequence[float] = (0, 0, 0)) -> np.array:
+    """Get the kpoints of a Monkhorst-Pack mesh in crystal coordinates, of shape (nk, 3)."""
+    axes = [(np.arange(n) + shift) / n for n, shift in zip(mesh, offset)]
+    return np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, 3)
+
+
+def interpolate_bands(model: WannierHamiltonian, kpoints: np.array, velocities: bool = False,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE,
+                      num_threads: int = 1) -> typing.Tuple[np.array, typing.Optional[np.array]]:
+    """Interpolate the band energies, and the band velocities, on arbitrary kpoints.
+
+    H(k) is built with an `einsum` over the R vectors and diagonalized with a batched `eigh`, chunk by chunk of
+    kpoints so that the k-dependent arrays of a chunk hold at most `chunk_size` bytes. The chunks run in a pool of
+    `num_threads` threads, numpy releases the GIL in both. The velocities are the diagonal of dH/dk in the basis of
+    the eigenvectors, i.e. not resolved within degenerate bands.
+
+    :param model: the Hamiltonian
+    :type model: WannierHamiltonian
+    :param kpoints: the kpoints in crystal coordinates, of shape (nk, 3)
+    :type kpoints: np.array
+    :param velocities: whether to compute the velocities, the lattice of the Hamiltonian is required
+    :type velocities: bool
+    :param chunk_size: maximum number of bytes of the k-dependent arrays of a chunk
+    :type chunk_size: int
+    :param num_threads: the number of threads
+    :type num_threads: int
+    :raises ValueError: if the velocities are requested but the lattice is unknown
+    :return: the energies of shape (nk, num_wann) in eV, and the velocities dE/dk of shape (nk, num_wann, 3) in
+        eV * angstrom (cartesian) or None
+    :rtype: tuple
+    """
+    if velocities and model.lattice is None:
+        raise ValueError('the lattice is required for the velocities, e.g. from the `_tb.dat` file')
+    kpoints = np.asarray(kpoints, dtype=np.float64).reshape(-1, 3)
+    weights = model.hamiltonian / model.degeneracies[:, None, None]
+    r_vectors = model.r_vectors.astype(np.float64)
+    r_cartesian = r_vectors @ model.lattice if velocities else None
+
+    num_wann = model.num_wann
+    itemsize = np.dtype(model.hamiltonian.dtype).itemsize
+    bytes_per_kpoint = itemsize * (len(r_vectors) + num_wann**2 * (5 if velocities else 2))
+    num_kpoints = max(1, chunk_size // bytes_per_kpoint)
+
+    def evaluate(start):
+        phases = np.exp(2j * np.pi * kpoints[start:start + num_kpoints] @ r_vectors.T).astype(weights.dtype)
+        hamiltonian_k = np.einsum('kr,rmn->kmn', phases, weights, optimize=True)
+        energies, vectors = np.linalg.eigh(hamiltonian_k, UPLO='U')
+        if not velocities:
+            return energies, None
+        gradient = np.einsum('kr,ra,rmn->kamn', 1j * phases, r_cartesian, weights, optimize=True)
+        band_velocities = np.einsum('kmi,kamn,kni->kia', vectors.conj(), gradient, vectors, optimize=True).real
+        return energies, band_velocities
+
+    starts = range(0, len(kpoints), num_kpoints)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, num_threads)) as executor:
+        results = list(executor.map(evaluate, starts))
+    energies = np.concatenate([result[0] for result in results]) if results else np.zeros((0, num_wann))
+    if not velocities:
+        return energies, None
+    return energies, np.concatenate([result[1] for result in results])
+
+
+def get_dos(energies: np.array, num_points: int = 1000, smearing: float = 0.05,
+            energy_range: typing.Tuple[float, float] = None) -> typing.Tuple[np.array, np.array]:
+    """Get the Gaussian smeared density of states per cell, without the spin degeneracy.
+
+    The energies are binned on a uniform grid and the histogram is convolved with the Gaussian.
+
+    :param energies: the band energies on a uniform grid of kpoints, of shape (nk, nbnd)
+    :type energies: np.array
+    :param num_points: the number of points of the energy grid
+    :type num_points: int
+    :param smearing: the standard deviation of the Gaussian, in eV
+    :type smearing: float
+    :param energy_range: the range of the energy grid, default is the range of the bands plus 5 smearings
+    :type energy_range: tuple
+    :return: the energy grid and the density of states in states/eV
+    :rtype: tuple
+    """
+    energies = np.asarray(energies)
+    if energy_range is None:
+        energy_range = (energies.min() - 5 * smearing, energies.max() + 5 * smearing)
+    grid = np.linspace(*energy_range, num_points)
+    step = grid[1] - grid[0]
+    counts, _ = np.histogram(energies, bins=num_points, range=(grid[0] - step / 2, grid[-1] + step / 2))
+    half_width = int(np.ceil(5 * smearing / step))
+    offsets = np.arange(-half_width, half_width + 1) * step
+    kernel = np.exp(-0.5 * (offsets / smearing)**2) / (smearing * np.sqrt(2 * np.pi))
+    # the `same` mode is longer than the grid if the kernel is, slice the centred part of the full convolution
+    dos = np.convolve(counts, kernel, mode='full')[half_width:half_width + num_points]
+    dos /= energies.size / energies.shape[-1]
+    return grid, dos
+
+
+def get_fermi_energy(energies: np.array, num_electrons: float, spin_degeneracy: int = 2) -> float:
+    """Get the Fermi energy at zero temperature, in the middle of the gap for an insulator.
+
+    :param energies: the band energies on a uniform grid of kpoints, of shape (nk, nbnd)
+    :type energies: np.array
+    :param num_electrons: the number of electrons per cell in the bands, i.e. without the ones of the bands below
+    :type num_electrons: float
+    :param spin_degeneracy: 2 without spin-orbit coupling, 1 with spinors
+    :type spin_degeneracy: int
+    :raises ValueError: if the bands cannot hold the electrons
+    :return: the Fermi energy in eV
+    :rtype: float
+    """
+    energies = np.asarray(energies)
+    num_kpoints = energies.size // energies.shape[-1]
+    energies = np.sort(energies.ravel())
+    num_occupied = int(round(num_electrons / spin_degeneracy * num_kpoints))
+    if not 0 < num_occupied < energies.size:
+        raise ValueError(f'{num_electrons} electrons cannot fill {energies.size} states of the bands')
+    return float(energies[num_occupied - 1] + energies[num_occupied]) / 2
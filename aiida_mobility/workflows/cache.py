@@ -0,0 +1,192 @@
+"""Opt-in reuse of finished sub-processes across workchains.
+
+A sub-process (e.g. a relax or scf `PwBaseWorkChain`, or `seekpath_structure_analysis`) is
+identified by a content hash of its inputs: structures and parameters by their attributes,
+pseudopotentials by their md5, codes and remote folders by their UUID. The `metadata`,
+`clean_workdir` and cache flag inputs are ignored. The hash is stored in the extras of the
+submitted process, so a later workchain with `use_cache=True` finds the finished equivalent process and takes its
+outputs instead of submitting a new one. AiiDA's own caching works on `CalcJobNode`s only and
+does not skip whole sub-workchains or calcfunctions.
+"""
+from collections.abc import Mapping
+
+from aiida import orm
+from aiida.common import LinkType
+from aiida.common.hashing import make_hash
+
+CACHE_HASH_EXTRA = "mobility_cache_hash"
+# increase to invalidate all the previous cache entries, e.g. if the hashed inputs change
+CACHE_VERSION = 1
+IGNORED_INPUTS = ("metadata", "clean_workdir", "use_cache", "bypass_cache")
+
+
+def _normalize_inputs(value):
+    """Replace the nodes of a (nested) inputs dict with hashable objects of their content."""
+    if isinstance(value, Mapping):
+        return {
+            key: _normalize_inputs(val)
+            for key, val in value.items()
+            if key not in IGNORED_INPUTS
+        }
+    if isinstance(value, (list, tuple)):
+        return [_normalize_inputs(val) for val in value]
+    if isinstance(value, orm.UpfData):
+        return {"md5": value.md5}
+    if isinstance(value, (orm.Code, orm.RemoteData)):
+        return {"uuid": value.uuid}
+    if isinstance(value, orm.Data):
+        return {"type": value.node_type, "hash": value.get_hash()}
+    return value
+
+
+def get_cache_hash(process_class, inputs):
+    """Get the content hash of the inputs of a process.
+
+    :param process_class: the process class or the calcfunction
+    :param inputs: the inputs, nested dicts of nodes and python values
+    :return: the hash
+    :rtype: str
+    """
+    name = getattr(process_class, "__name__", str(process_class))
+    return make_hash([CACHE_VERSION, name, _normalize_inputs(inputs)])
+
+
+def find_cached_process(process_class, cache_hash):
+    """Find the latest process of `process_class` finished ok with the hash `cache_hash`.
+
+    :return: the process node or None
+    """
+    qb = orm.QueryBuilder()
+    qb.append(
+        orm.ProcessNode,
+        filters={
+            "attributes.process_label": process_class.__name__,
+            "attributes.process_state": "finished",
+            "attributes.exit_status": 0,
+            f"extras.{CACHE_HASH_EXTRA}": cache_hash,
+        },
+        tag="process",
+        project="*",
+    )
+    qb.order_by({"process": {"ctime": "desc"}})
+    qb.limit(1)
+    result = qb.first()
+    return None if result is None else result[0]
+
+
+def _get_cache_flags(workchain):
+    return workchain.inputs.use_cache.value, workchain.inputs.bypass_cache.value
+
+
+def _record_cache_result(workchain, hit):
+    key = "cache_hits" if hit else "cache_misses"
+    workchain.ctx[key] = workchain.ctx.get(key, 0) + 1
+
+
+def submit_cached(workchain, process_class, inputs, name):
+    """Submit a sub-process from a workchain step, or reuse the finished equivalent one.
+
+    The cache is only used if the `use_cache` input of the workchain is `True`, with `bypass_cache`
+    the process is always submitted but recorded for later runs. Processes that clean their remote
+    folders are never recorded.
+
+    :param workchain: the calling workchain
+    :param process_class: the process class to submit
+    :param inputs: the inputs of the process
+    :param name: name of the step used in the report, e.g. `scf`
+    :return: the process node and whether it is reused from the cache
+    :rtype: tuple
+    """
+    use_cache, bypass_cache = _get_cache_flags(workchain)
+    if not use_cache:
+        return workchain.submit(process_class, **inputs), False
+
+    cache_hash = get_cache_hash(process_class, inputs)
+    if not bypass_cache:
+        node = find_cached_process(process_class, cache_hash)
+        if node is not None:
+            _record_cache_result(workchain, hit=True)
+            workchain.report(
+                f"cache hit for {name}: reusing {node.process_label}<{node.pk}>"
+            )
+            return node, True
+
+    _record_cache_result(workchain, hit=False)
+    node = workchain.submit(process_class, **inputs)
+    clean_workdir = inputs.get("clean_workdir", False)
+    if not getattr(clean_workdir, "value", clean_workdir):
+        node.set_extra(CACHE_HASH_EXTRA, cache_hash)
+    workchain.report(
+        f"cache {'bypassed' if bypass_cache else 'miss'} for {name}"
+    )
+    return node, False
+
+
+def run_calcfunction_cached(workchain, function, **kwargs):
+    """Run a calcfunction from a workchain step, or reuse the outputs of the equivalent finished one.
+
+    :param workchain: the calling workchain
+    :param function: the calcfunction
+    :param kwargs: the inputs of the calcfunction
+    :return: the outputs of the calcfunction
+    :rtype: dict
+    """
+    use_cache, bypass_cache = _get_cache_flags(workchain)
+    if not use_cache:
+        return function(**kwargs)
+
+    cache_hash = get_cache_hash(function, kwargs)
+    if not bypass_cache:
+        node = find_cached_process(function, cache_hash)
+        if node is not None:
+            _record_cache_result(workchain, hit=True)
+            workchain.report(
+                f"cache hit for {function.__name__}: reusing outputs of <{node.pk}>"
+            )
+            return {
+                entry.link_label: entry.node
+                for entry in node.get_outgoing(link_type=LinkType.CREATE).all()
+            }
+
+    _record_cache_result(workchain, hit=False)
+    result, node = function.run_get_node(**kwargs)
+    node.set_extra(CACHE_HASH_EXTRA, cache_hash)
+    workchain.report(
+        f"cache {'bypassed' if bypass_cache else 'miss'} for {function.__name__}"
+    )
+    return result
+
+
+def report_cache_statistics(workchain):
+    """Report the number of cache hits and misses of the workchain, if the cache is used."""
+    use_cache, _ = _get_cache_flags(workchain)
+    if use_cache:
+        workchain.report(
+            "workflow cache: {} hits, {} misses".format(
+                workchain.ctx.get("cache_hits", 0),
+                workchain.ctx.get("cache_misses", 0),
+            )
+        )
+
+
+def invalidate_cache(node):
+    """Remove the cache hash of the processes called by `node`, e.g. after cleaning their remote folders."""
+    for called_descendant in node.called_descendants:
+        if CACHE_HASH_EXTRA in called_descendant.extras:
+            called_descendant.delete_extra(CACHE_HASH_EXTRA)
+
+
+def add_cache_inputs(spec):
+    """Add the `use_cache` and `bypass_cache` inputs to a workchain spec."""
+    spec.input(
+        "use_cache",
+        valid_type=orm.Bool,
+        default=lambda: orm.Bool(False),
+        help="If `True`, reuse the outputs of finished sub-processes with equivalent inputs instead of submitting them.",
+    )
+    spec.input(
+        "bypass_cache",
+        valid_type=orm.Bool,
+        default=lambda: orm.Bool(False),
+        help="If `True` together with `use_cache`, always submit the sub-processes, only record them for later runs.",
+    )
@@ -0,0 +1,116 @@
+"""Opt-in eager submission of the dependent calculations of a workchain.
+
+Normally a workchain submits a calculation only once its parent has finished, so each stage waits in the
+queue again. In eager mode the dependent calculation is submitted right after its parent:
+
+- the working directory of the parent is known before it is uploaded, from its UUID, so it is given to the
+  dependent calculation as a `RemoteData` without creator;
+- the `DEPENDS_ON` key of the `settings` of the dependent calculation lists the working directories of its
+  parents, and the dependency markers in its `custom_scheduler_commands` option make it wait in the queue with
+  an `afterok` dependency on the job of the parent, resolved by the `mobility.*` schedulers of
+  `aiida_mobility.schedulers` (the computer must use one of them, e.g. `mobility.slurm` or the local
+  stand-in `mobility.direct`).
+
+If the parent fails, the dependent calculation is killed by the workchain; if the eager calculation itself fails
+while its parent succeeded, the workchain submits it again normally.
+"""
+import getpass
+
+from aiida import orm
+
+from aiida_mobility.utils.scheduler import (
+    get_dependency_markers,
+    get_remote_workdir,
+)
+
+EAGER_SCHEDULER_PREFIX = "mobility."
+
+
+def supports_eager_submission(parent, code):
+    """Whether a calculation of `code` can be submitted before the calculation `parent` has run.
+
+    :param parent: the parent calculation node
+    :param code: the code of the dependent calculation
+    :rtype: bool
+    """
+    computer = parent.computer
+    return (
+        computer is not None
+        and computer.uuid == code.computer.uuid
+        and computer.scheduler_type.startswith(EAGER_SCHEDULER_PREFIX)
+    )
+
+
+def get_predicted_remote_folder(parent):
+    """Get the remote folder the calculation `parent` will have once it is uploaded.
+
+    :param parent: the parent calculation node, submitted but maybe not uploaded yet
+    :raises ValueError: if the working directory of the computer depends on an unknown username
+    :return: the unstored remote folder
+    :rtype: aiida.orm.RemoteData
+    """
+    computer = parent.computer
+    username = (
+        computer.get_authinfo(parent.user).get_auth_params().get("username")
+    )
+    if username is None and computer.transport_type == "local":
+        username = getpass.getuser()
+    remote_path = get_remote_workdir(
+        computer.get_workdir(), parent.uuid, username=username
+    )
+    return orm.RemoteData(computer=computer, remote_path=remote_path)
+
+
+def get_eager_settings(settings, remote_folder, **kwargs):
+    """Add the `DEPENDS_ON` key for the job of `remote_folder` to the `settings` of a calculation.
+
+    :param settings: the settings of the calculation
+    :type settings: dict
+    :param remote_folder: the predicted remote folder of the parent
+    :param kwargs: other keys of the settings, e.g. the data of the parent known ahead of time
+    :return: the settings
+    :rtype: aiida.orm.Dict
+    """
+    settings = dict(settings, **kwargs)
+    settings["DEPENDS_ON"] = list(settings.get("DEPENDS_ON", [])) + [
+        remote_folder.get_remote_path()
+    ]
+    return orm.Dict(dict=settings)
+
+
+def get_eager_options(options, settings):
+    """Add the dependency markers of the `DEPENDS_ON` key of the `settings` to the `metadata.options` of a calculation.
+
+    :param options: the `metadata.options` of the calculation
+    :type options: dict
+    :param settings: the settings of the calculation, see `get_eager_settings`
+    :type settings: aiida.orm.Dict
+    :return: the options with the markers appended to `custom_scheduler_commands`
+    :rtype: dict
+    """
+    directories = settings.get_dict().get("DEPENDS_ON", [])
+    if not directories:
+        return options
+    options = dict(options)
+    options["custom_scheduler_commands"] = "\n".join(
+        filter(
+            None,
+            [
+                options.get("custom_scheduler_commands", ""),
+                get_dependency_markers(directories),
+            ],
+        )
+    )
+    return options
+
+
+def cancel_eager(workchain, node, reason):
+    """Kill an eagerly submitted process whose parent failed, its job would never run."""
+    if node.is_terminated:
+        return
+    workchain.report(
+        f"killing the eagerly submitted {node.process_label}<{node.pk}>: {reason}"
+    )
+    workchain.runner.controller.kill_process(
+        node.pk, msg=f"Killed by parent<{workchain.node.pk}>: {reason}"
+    )
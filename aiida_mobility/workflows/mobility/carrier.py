@@ -0,0 +1,382 @@
+from aiida.common.extendeddicts import AttributeDict
+from aiida.engine.processes.workchains.context import ToContext
+from aiida.engine.processes.workchains.workchain import WorkChain
+from aiida.engine import if_
+from aiida_mobility.calculations.perturbo import (
+    CHAIN_MODES,
+    PerturboCalculation,
+)
+from aiida import orm
+from aiida_mobility.utils import get_calc_from_folder
+from aiida_mobility.workflows.eager import get_eager_options
+from aiida_mobility.workflows.mobility.resume import (
+    RESUMABLE_STAGES,
+    get_stage_parameters,
+)
+
+__all__ = ("PerturboCarrierWorkChain", "get_carrier_parameters")
+
+CARRIERS = ("electron", "hole")
+
+
+def get_carrier_parameters(bands_info, carrier):
+    """Get the perturbo parameters shared by `setup`, `imsigma` and `trans` of one carrier type.
+
+    :param bands_info: output of `get_bands_info`
+    :type bands_info: dict
+    :param carrier: `electron` or `hole`
+    :type carrier: str
+    :raises ValueError: if the carrier type is unknown or the bands info has no such carrier
+    :return: `band_min`, `band_max`, `boltz_emin`, `boltz_emax`, and `hole` for holes
+    :rtype: dict
+    """
+    if carrier not in CARRIERS:
+        raise ValueError(f"Unknown carrier type `{carrier}`, valid types are {CARRIERS}.")
+    prefix = "el" if carrier == "electron" else "hole"
+    if f"{prefix}_min_band" not in bands_info:
+        raise ValueError(f"No `{carrier}` bands in bands info.")
+
+    parameters = {
+        "band_min": int(bands_info[f"{prefix}_min_band"]),
+        "band_max": int(bands_info[f"{prefix}_max_band"]),
+        "boltz_emin": float(bands_info[f"{prefix}_e_min"]),
+        "boltz_emax": float(bands_info[f"{prefix}_e_max"]),
+    }
+    if carrier == "hole":
+        parameters["hole"] = True
+    return parameters
+
+
+class PerturboCarrierWorkChain(WorkChain):
+    """Workchain running the perturbo `setup` --> `imsigma` --> `trans` chain for a single carrier type.
+
+    The electron and hole chains only share the parent `QE2PertCalculation` folder, so they can run
+    as independent, concurrent sub-workchains. With the `chain` input, the three calc modes run back to back
+    in a single `PerturboCalculation`, i.e. a single scheduler job. With the `resume` inputs, the stages
+    completed by a previous run are skipped.
+    """
+
+    _DEFAULT_METADATA_OPTIONS = {
+        "resources": {
+            "num_machines": 1,
+            "num_mpiprocs_per_machine": 1,
+        },
+        "withmpi": False,
+    }
+
+    @classmethod
+    def define(cls, spec):
+        super().define(spec)
+        spec.input("code", valid_type=orm.Code, help="The `perturbo.x` code.")
+        spec.input(
+            "parent_folder",
+            valid_type=orm.RemoteData,
+            help="The remote folder of the parent `QE2PertCalculation`.",
+        )
+        spec.input(
+            "kpoints",
+            valid_type=orm.KpointsData,
+            help="The kpoints mesh to generate boltz_kdim.",
+        )
+        spec.input(
+            "parameters",
+            valid_type=orm.Dict,
+            help="Parameters shared by all the calc modes, e.g. band_min, band_max, boltz_emin, boltz_emax and hole.",
+        )
+        spec.input(
+            "setup_parameters",
+            valid_type=orm.Dict,
+            help="Parameters of the `setup` mode, must contain temperatures and carrier_concentrations or fermi_levels.",
+        )
+        spec.input(
+            "imsigma_parameters",
+            valid_type=orm.Dict,
+            default=lambda: orm.Dict(dict={}),
+            help="Parameters of the `imsigma` mode.",
+        )
+        spec.input(
+            "trans_parameters",
+            valid_type=orm.Dict,
+            default=lambda: orm.Dict(dict={}),
+            help="Parameters of the `trans` mode.",
+        )
+        spec.input(
+            "metadata_options",
+            valid_type=orm.Dict,
+            default=lambda: orm.Dict(dict=cls._DEFAULT_METADATA_OPTIONS),
+            help="options designated for calculation.",
+        )
+        spec.input(
+            "chain",
+            valid_type=orm.Bool,
+            default=lambda: orm.Bool(False),
+            help="If `True`, run `setup`, `imsigma` and `trans` in a single scheduler job instead of three.",
+        )
+        spec.input(
+            "setup_settings",
+            valid_type=orm.Dict,
+            required=False,
+            help="Settings of the first `PerturboCalculation`, `setup` or `chain`, e.g. `DEPENDS_ON` when the parent "
+            "`QE2PertCalculation` has not run yet, see `aiida_mobility.workflows.eager`.",
+        )
+        spec.input_namespace(
+            "resume",
+            required=False,
+            help="The remote folders of the stages completed by a previous run, the stages up to the latest one "
+            "are skipped. The files of the folders are checked by `PertuborWorkChain`.",
+        )
+        for stage in RESUMABLE_STAGES:
+            spec.input(
+                f"resume.{stage}_folder",
+                valid_type=orm.RemoteData,
+                required=False,
+                help=f"The remote folder of a completed `{stage}` stage.",
+            )
+        spec.outline(
+            cls.setup,
+            if_(cls.should_run_chain)(
+                cls.run_chain,
+                cls.inspect_chain,
+            ).else_(
+                if_(cls.should_run_setup)(cls.run_setup, cls.inspect_setup),
+                if_(cls.should_run_imsigma)(
+                    cls.run_imsigma, cls.inspect_imsigma
+                ),
+                cls.run_trans,
+                cls.inspect_trans,
+            ),
+            cls.results,
+        )
+        spec.output(
+            "setup_parameters",
+            valid_type=orm.Dict,
+            help="The output parameters of the `setup` calculation.",
+        )
+        spec.output(
+            "imsigma_parameters",
+            valid_type=orm.Dict,
+            help="The output parameters of the `imsigma` calculation.",
+        )
+        spec.output(
+            "trans_parameters",
+            valid_type=orm.Dict,
+            help="The output parameters of the `trans` calculation.",
+        )
+        spec.output(
+            "conductivity",
+            valid_type=orm.ArrayData,
+            required=False,
+            help="The conductivity and mobility tensors per temperature of the `trans` calculation.",
+        )
+        spec.output(
+            "remote_folder",
+            valid_type=orm.RemoteData,
+            help="The remote folder of the `trans` calculation.",
+        )
+        spec.exit_code(
+            401,
+            "ERROR_SUB_PROCESS_FAILED_SETUP",
+            message="The `setup` PerturboCalculation sub process failed",
+        )
+        spec.exit_code(
+            402,
+            "ERROR_SUB_PROCESS_FAILED_IMSIGMA",
+            message="The `imsigma` PerturboCalculation sub process failed",
+        )
+        spec.exit_code(
+            403,
+            "ERROR_SUB_PROCESS_FAILED_TRANS",
+            message="The `trans` PerturboCalculation sub process failed",
+        )
+        spec.exit_code(
+            404,
+            "ERROR_SUB_PROCESS_FAILED_CHAIN",
+            message="The `chain` PerturboCalculation sub process failed",
+        )
+        spec.exit_code(
+            405,
+            "ERROR_INVALID_RESUME_FOLDER",
+            message="The resumed folder of `{stage}` has no calculation with its output parameters",
+        )
+
+    def _prepare_inputs(
+        self, calc_mode, parent_folder, parameters, settings=None
+    ):
+        """Return the inputs of a `PerturboCalculation` in `calc_mode`.
+
+        The dependency markers of the `DEPENDS_ON` key of the `settings` are added to the `metadata.options`.
+        """
+        params = self.inputs.parameters.get_dict()
+        params.update(parameters.get_dict())
+        options = self.inputs.metadata_options.get_dict()
+        if settings is not None:
+            options = get_eager_options(options, settings)
+
+        inputs = AttributeDict(
+            {
+                "code": self.inputs.code,
+                "calc_mode": orm.Str(calc_mode),
+                "parent_folder": parent_folder,
+                "kpoints": self.inputs.kpoints,
+                "parameters": orm.Dict(dict=params),
+                "metadata": {
+                    "options": options,
+                    "call_link_label": calc_mode,
+                },
+            }
+        )
+        if settings is not None:
+            inputs.settings = settings
+        return inputs
+
+    def _submit(self, calc_mode, parent_folder, parameters, settings=None):
+        inputs = self._prepare_inputs(
+            calc_mode, parent_folder, parameters, settings=settings
+        )
+        running = self.submit(PerturboCalculation, **inputs)
+
+        self.report(
+            "launching PerturboCalculation in `{}` mode<{}>.".format(
+                calc_mode, running.pk
+            )
+        )
+        return running
+
+    def _inspect(self, calc, exit_code):
+        if not calc.is_finished_ok:
+            self.report(
+                "PerturboCalculation<{}> failed with exit status {}".format(
+                    calc.pk, calc.exit_status
+                )
+            )
+            return exit_code
+
+    def setup(self):
+        """Resume from the latest stage of the `resume` inputs, its parameters are taken from its calculation."""
+        self.ctx.parent_folder = self.inputs.parent_folder
+        self.ctx.stage_parameters = {}
+        self.ctx.resumed_stages = []
+        resume = self.inputs.get("resume", {})
+        for index, stage in reversed(list(enumerate(RESUMABLE_STAGES))):
+            folder = resume.get(f"{stage}_folder", None)
+            if folder is None:
+                continue
+            self.ctx.parent_folder = folder
+            self.ctx.resumed_stages = list(RESUMABLE_STAGES[: index + 1])
+            calc = get_calc_from_folder(folder)
+            for resumed_stage in self.ctx.resumed_stages:
+                parameters = get_stage_parameters(calc, resumed_stage)
+                if parameters is None:
+                    return self.exit_codes.ERROR_INVALID_RESUME_FOLDER.format(
+                        stage=stage
+                    )
+                self.ctx.stage_parameters[resumed_stage] = parameters
+            self.report(
+                "resuming after `{}` from remote_folder<{}>".format(
+                    stage, folder.pk
+                )
+            )
+            break
+
+    def should_run_chain(self):
+        return self.inputs.chain.value and not self.ctx.resumed_stages
+
+    def should_run_setup(self):
+        return "setup" not in self.ctx.resumed_stages
+
+    def should_run_imsigma(self):
+        return "imsigma" not in self.ctx.resumed_stages
+
+    def run_chain(self):
+        parameters = {
+            calc_mode: self.inputs[f"{calc_mode}_parameters"].get_dict()
+            for calc_mode in CHAIN_MODES
+        }
+        running = self._submit(
+            "chain",
+            self.inputs.parent_folder,
+            orm.Dict(dict=parameters),
+            settings=self.inputs.get("setup_settings"),
+        )
+        return ToContext(calc_chain=running)
+
+    def inspect_chain(self):
+        calc = self.ctx.calc_chain
+        if not calc.is_finished_ok and "output_parameters" in calc.outputs:
+            self.report(
+                "stages of PerturboCalculation<{}>: {}".format(
+                    calc.pk,
+                    calc.outputs.output_parameters.get_attribute("stages", {}),
+                )
+            )
+        return self._inspect(
+            calc, self.exit_codes.ERROR_SUB_PROCESS_FAILED_CHAIN
+        )
+
+    def run_setup(self):
+        running = self._submit(
+            "setup",
+            self.inputs.parent_folder,
+            self.inputs.setup_parameters,
+            settings=self.inputs.get("setup_settings"),
+        )
+        return ToContext(calc_setup=running)
+
+    def _inspect_stage(self, stage, exit_code):
+        """Inspect the calculation of `stage`, the next stage runs in its remote folder."""
+        calc = self.ctx[f"calc_{stage}"]
+        exit_code = self._inspect(calc, exit_code)
+        if exit_code is not None:
+            return exit_code
+        self.ctx.parent_folder = calc.outputs.remote_folder
+        self.ctx.stage_parameters[stage] = calc.outputs.output_parameters
+
+    def inspect_setup(self):
+        return self._inspect_stage(
+            "setup", self.exit_codes.ERROR_SUB_PROCESS_FAILED_SETUP
+        )
+
+    def run_imsigma(self):
+        running = self._submit(
+            "imsigma",
+            self.ctx.parent_folder,
+            self.inputs.imsigma_parameters,
+        )
+        return ToContext(calc_imsigma=running)
+
+    def inspect_imsigma(self):
+        return self._inspect_stage(
+            "imsigma", self.exit_codes.ERROR_SUB_PROCESS_FAILED_IMSIGMA
+        )
+
+    def run_trans(self):
+        running = self._submit(
+            "trans",
+            self.ctx.parent_folder,
+            self.inputs.trans_parameters,
+        )
+        return ToContext(calc_trans=running)
+
+    def inspect_trans(self):
+        return self._inspect_stage(
+            "trans", self.exit_codes.ERROR_SUB_PROCESS_FAILED_TRANS
+        )
+
+    def results(self):
+        if self.should_run_chain():
+            calc_trans = self.ctx.calc_chain
+            for calc_mode in CHAIN_MODES:
+                self.out(
+                    f"{calc_mode}_parameters",
+                    calc_trans.outputs[f"stage_parameters__{calc_mode}"],
+                )
+        else:
+            calc_trans = self.ctx.calc_trans
+            for calc_mode in CHAIN_MODES:
+                self.out(
+                    f"{calc_mode}_parameters",
+                    self.ctx.stage_parameters[calc_mode],
+                )
+        self.out("remote_folder", calc_trans.outputs.remote_folder)
+        if "conductivity" in calc_trans.outputs:
+            self.out("conductivity", calc_trans.outputs.conductivity)
@@ -1,5 +1,8 @@
 from aiida.common.extendeddicts import AttributeDict
 from aiida.engine.processes.workchains.context import ToContext
+from aiida.engine import if_
+from aiida_quantumespresso.utils.mapping import prepare_process_inputs
+from aiida_mobility.workflows.pw.base import PwBaseWorkChain
 from aiida_mobility.workflows.wannier.bands import Wannier90BandsWorkChain
 from aiida_mobility.workflows.ph.bands import (
     PhBandsWorkChain,
@@ -9,10 +12,27 @@ from aiida import orm
 
 
 def validate_inputs(inputs, ctx=None):  # pylint: disable=unused-argument
-    pass
+    """Validate the inputs of the entire input namespace."""
+    if inputs["share_scf"].value:
+        if "scf_node" in inputs["ph"] or "scf_node" in inputs["wannier"]:
+            return "`share_scf` can not be used together with an explicit `scf_node`."
+        if "relax" in inputs["ph"] or "relax" in inputs["wannier"]:
+            return "`share_scf` can not be used together with `ph.relax` or `wannier.relax`, the shared scf runs on the input structure."
+        if inputs["wannier"]["use_opengrid"].value:
+            return "`share_scf` is not supported with `wannier.use_opengrid`."
+        if inputs["wannier"]["use_primitive_structure"].value:
+            return "`share_scf` requires `wannier.use_primitive_structure` to be False."
 
 
 class PertuborWorkChain(WorkChain):
+    """Workchain running the phonon and the Wannier90 branches of a mobility calculation concurrently.
+
+    Scheme: setup --> scf(optional, shared) --> [PhBandsWorkChain | Wannier90BandsWorkChain] --> results
+
+    The `PhBandsWorkChain` and the `Wannier90BandsWorkChain` only share the input structure, so both
+    are submitted in the same step and the workchain waits on both of them.
+    """
+
     @classmethod
     def define(cls, spec):
         super().define(spec)
@@ -24,12 +44,12 @@ class PertuborWorkChain(WorkChain):
         spec.expose_inputs(
             PhBandsWorkChain,
             namespace="ph",
-            exclude=("structure", "clean_workdir", "dry_run"),
+            exclude=("structure", "clean_workdir", "dry_run", "system_2d"),
         )
         spec.expose_inputs(
             Wannier90BandsWorkChain,
             namespace="wannier",
-            exclude=("structure", "clean_workdir", "dry_run"),
+            exclude=("structure", "clean_workdir", "dry_run", "system_2d"),
         )
         spec.input(
             "system_2d",
@@ -37,6 +57,15 @@ class PertuborWorkChain(WorkChain):
             default=lambda: orm.Bool(False),
             help="Set the mesh to [x,x,1]",
         )
+        spec.input(
+            "share_scf",
+            valid_type=orm.Bool,
+            default=lambda: orm.Bool(False),
+            help="If `True`, run the scf once with the `ph.scf` inputs on the input structure and reuse it in both "
+            "the phonon and the Wannier90 branches, the cutoffs and pseudos of `ph.scf` must be consistent with "
+            "`wannier`. If `False`, each branch runs its own scf, identical scf calculations can still be "
+            "deduplicated by enabling AiiDA caching for `quantumespresso.pw`.",
+        )
         spec.input(
             "clean_workdir",
             valid_type=orm.Bool,
@@ -46,40 +75,154 @@ class PertuborWorkChain(WorkChain):
         spec.inputs.validator = validate_inputs
         spec.outline(
             cls.setup,
-            cls.run_ph_bands,
-            cls.run_automated_wannier,
-            cls.run_qe2pert,
-            cls.run_pert,
+            if_(cls.should_share_scf)(
+                cls.run_scf,
+                cls.inspect_scf,
+            ),
+            cls.run_ph_and_wannier,
+            cls.inspect_ph_and_wannier,
             cls.results,
         )
+        spec.expose_outputs(PhBandsWorkChain, namespace="ph")
+        spec.expose_outputs(Wannier90BandsWorkChain, namespace="wannier")
+        spec.output(
+            "scf_parameters",
+            valid_type=orm.Dict,
+            required=False,
+            help="The output parameters of the shared scf `PwBaseWorkChain`.",
+        )
         spec.exit_code(
             300,
             "ERROR_INVALID_SCF_NODE",
             message="The scf node is invalid or does not have remote folder",
         )
+        spec.exit_code(
+            401,
+            "ERROR_SUB_PROCESS_FAILED_SCF",
+            message="The shared scf PwBaseWorkChain sub process failed",
+        )
+        spec.exit_code(
+            402,
+            "ERROR_SUB_PROCESS_FAILED_PH",
+            message="The PhBandsWorkChain sub process failed",
+        )
+        spec.exit_code(
+            403,
+            "ERROR_SUB_PROCESS_FAILED_WANNIER",
+            message="The Wannier90BandsWorkChain sub process failed",
+        )
+
+    def setup(self):
+        """Define the current structure in the context to be the input structure."""
+        self.ctx.current_structure = self.inputs.structure
+
+    def should_share_scf(self):
+        """If `share_scf` is True, a single scf is run and reused by both branches."""
+        return self.inputs.share_scf.value
 
-    def run_ph_bands(self):
+    def run_scf(self):
+        """Run the shared PwBaseWorkChain in scf mode with the `ph.scf` inputs."""
         inputs = AttributeDict(
+            self.exposed_inputs(PhBandsWorkChain, namespace="ph")["scf"]
+        )
+        inputs.metadata = {"call_link_label": "scf"}
+        inputs.system_2d = self.inputs.system_2d
+        inputs.pw.structure = self.ctx.current_structure
+        inputs.pw.parameters = inputs.pw.parameters.get_dict()
+        inputs.pw.parameters.setdefault("CONTROL", {})["calculation"] = "scf"
+
+        inputs = prepare_process_inputs(PwBaseWorkChain, inputs)
+        running = self.submit(PwBaseWorkChain, **inputs)
+
+        self.report(
+            "launching PwBaseWorkChain<{}> in {} mode".format(running.pk, "scf")
+        )
+
+        return ToContext(workchain_scf=running)
+
+    def inspect_scf(self):
+        """Verify that the shared PwBaseWorkChain for the scf run finished successfully."""
+        workchain = self.ctx.workchain_scf
+
+        if not workchain.is_finished_ok:
+            self.report(
+                "scf PwBaseWorkChain failed with exit status {}".format(
+                    workchain.exit_status
+                )
+            )
+            return self.exit_codes.ERROR_SUB_PROCESS_FAILED_SCF
+
+    def run_ph_and_wannier(self):
+        """Submit the PhBandsWorkChain and the Wannier90BandsWorkChain in the same step and wait on both."""
+        inputs_ph = AttributeDict(
             self.exposed_inputs(PhBandsWorkChain, namespace="ph")
         )
-        inputs.metadata.call_link_label = "ph"
-        inputs.structure = self.ctx.current_structure
+        inputs_ph.metadata.call_link_label = "ph"
+        inputs_ph.structure = self.ctx.current_structure
+        inputs_ph.system_2d = self.inputs.system_2d
 
-        running = self.submit(PhBandsWorkChain, **inputs)
+        inputs_wannier = AttributeDict(
+            self.exposed_inputs(Wannier90BandsWorkChain, namespace="wannier")
+        )
+        inputs_wannier.metadata.call_link_label = "wannier"
+        inputs_wannier.structure = self.ctx.current_structure
+        inputs_wannier.system_2d = self.inputs.system_2d
 
-        self.report("launching PhBandsWorkChain<{}>".format(running.pk))
+        if "workchain_scf" in self.ctx:
+            scf_node = orm.Int(self.ctx.workchain_scf.pk)
+            inputs_ph.scf_node = scf_node
+            inputs_wannier.scf_node = scf_node
 
-        return ToContext(workchain_ph=running)
+        running_ph = self.submit(PhBandsWorkChain, **inputs_ph)
+        self.report("launching PhBandsWorkChain<{}>".format(running_ph.pk))
 
-    def run_automated_wannier(self):
-        inputs = AttributeDict(
-            self.exposed_inputs(Wannier90BandsWorkChain, namespace="ph")
+        running_wannier = self.submit(Wannier90BandsWorkChain, **inputs_wannier)
+        self.report(
+            "launching Wannier90BandsWorkChain<{}>".format(running_wannier.pk)
+        )
+
+        return ToContext(
+            workchain_ph=running_ph, workchain_wannier=running_wannier
         )
-        inputs.metadata.call_link_label = "wannier"
-        inputs.structure = self.ctx.current_structure
 
-        running = self.submit(Wannier90BandsWorkChain, **inputs)
+    def inspect_ph_and_wannier(self):
+        """Verify that both the PhBandsWorkChain and the Wannier90BandsWorkChain finished successfully."""
+        workchain_ph = self.ctx.workchain_ph
+        workchain_wannier = self.ctx.workchain_wannier
 
-        self.report("launching Wannier90BandsWorkChain<{}>".format(running.pk))
+        if not workchain_ph.is_finished_ok:
+            self.report(
+                "PhBandsWorkChain failed with exit status {}".format(
+                    workchain_ph.exit_status
+                )
+            )
+            return self.exit_codes.ERROR_SUB_PROCESS_FAILED_PH
 
-        return ToContext(workchain_wannier=running)
\ No newline at end of file
+        if not workchain_wannier.is_finished_ok:
+            self.report(
+                "Wannier90BandsWorkChain failed with exit status {}".format(
+                    workchain_wannier.exit_status
+                )
+            )
+            return self.exit_codes.ERROR_SUB_PROCESS_FAILED_WANNIER
+
+    def results(self):
+        """Attach the outputs of both branches to the workchain outputs."""
+        if "workchain_scf" in self.ctx:
+            self.out(
+                "scf_parameters",
+                self.ctx.workchain_scf.outputs.output_parameters,
+            )
+        self.out_many(
+            self.exposed_outputs(
+                self.ctx.workchain_ph, PhBandsWorkChain, namespace="ph"
+            )
+        )
+        self.out_many(
+            self.exposed_outputs(
+                self.ctx.workchain_wannier,
+                Wannier90BandsWorkChain,
+                namespace="wannier",
+            )
+        )
+        self.report("workchain succesfully completed")
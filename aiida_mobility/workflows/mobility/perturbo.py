@@ -1,14 +1,54 @@
 import aiida.orm
 from ase.atoms import default
-from sqlalchemy.sql.expression import true
-from aiida_mobility.calculations.perturbo import PerturboCalculation
+from aiida_mobility.workflows.mobility.carrier import (
+    CARRIERS,
+    PerturboCarrierWorkChain,
+    get_carrier_parameters,
+)
+from aiida_mobility.workflows.mobility.resume import (
+    RESUMABLE_STAGES,
+    find_ephmat_folder,
+    get_missing_files,
+    get_resume_folders,
+)
 from aiida_mobility.utils import get_calc_from_folder
+from aiida_mobility.utils.bands import classify_bands
+from aiida_mobility.utils.wannier import (
+    apply_wsvec,
+    get_kpoint_grid,
+    interpolate_bands,
+    parse_hr,
+)
+from aiida_mobility.workflows.eager import (
+    cancel_eager,
+    get_eager_options,
+    get_eager_settings,
+    get_predicted_remote_folder,
+    supports_eager_submission,
+)
+from aiida_mobility.utils.resources import (
+    estimate_epwan_memory,
+    estimate_resources,
+    get_memory_per_machine,
+    get_number_of_kpoints,
+    get_resource_model,
+    plan_options,
+    record_resource_features,
+)
 from aiida.common import exceptions
 from aiida.common.extendeddicts import AttributeDict
 from aiida.engine.processes.workchains.context import ToContext
 from aiida_quantumespresso.utils.mapping import prepare_process_inputs
-from plumpy.workchains import if_
-from aiida_mobility.calculations.qe2pert import QE2PertCalculation
+from plumpy.workchains import if_, while_
+from aiida_mobility.calculations.qe2pert import (
+    EPHMAT_KEY_EXTRA,
+    QE2PertCalculation,
+    get_ephmat_key,
+)
+from aiida_mobility.calculations.perturbo import (
+    CHAIN_MODES,
+    PerturboCalculation,
+)
 from aiida_mobility.calculations.ph_recover import PhRecoverCalculation
 from aiida.engine.processes.workchains.workchain import WorkChain
 from aiida import orm
@@ -21,6 +61,7 @@ def validate_inputs(inputs, ctx=None):  # pylint: disable=unused-argument
 
 class PertuborWorkChain(WorkChain):
     _QE_DVSCF_PREFIX = QE2PertCalculation._QE_DVSCF_PREFIX
+    _SEEDNAME = "aiida"
     _DEFAULT_SETTINGS = {}
     _DEFAULT_METADATA_OPTIONS = {
         "resources": {
@@ -122,6 +163,55 @@ class PertuborWorkChain(WorkChain):
             default=lambda: orm.Int(0),
             help="Contains the maximum number of iterations in the iterative scheme for solving Boltzmann equation. Default is `0`, which uses RTA.",
         )
+        spec.input(
+            "chain",
+            valid_type=orm.Bool,
+            default=lambda: orm.Bool(False),
+            help="If `True`, run `setup`, `imsigma` and `trans` of each carrier in a single scheduler job.",
+        )
+        spec.input(
+            "eager_submit",
+            valid_type=orm.Bool,
+            default=lambda: orm.Bool(False),
+            help="If `True`, submit the qe2pert and perturbo calculations right after their parent, waiting in the queue "
+            "with a scheduler dependency. The computer must use a `mobility.*` scheduler, see `aiida_mobility.workflows.eager`.",
+        )
+        spec.input(
+            "reuse_ephmat",
+            valid_type=orm.Bool,
+            default=lambda: orm.Bool(False),
+            help="If `True`, compute the e-ph matrix elements of qe2pert in the Bloch basis (`lwannier=False`) and reuse "
+            "the ones of an earlier run on the same ph and nscf calculations, band window and kpoints, e.g. when only the "
+            "Wannier functions change. The earlier run must not have cleaned its work directory.",
+        )
+        spec.input_namespace(
+            "resume",
+            required=False,
+            help="Resume from the stages completed by a previous run. The stages whose remote folder still has the "
+            "files needed by the next stage are skipped, `trans` is always run.",
+        )
+        spec.input(
+            "resume.workchain",
+            valid_type=orm.Int,
+            required=False,
+            help="The pk of a failed or finished `PertuborWorkChain`, its completed stages are resumed.",
+        )
+        spec.input(
+            "resume.qe2pert_folder",
+            valid_type=orm.RemoteData,
+            required=False,
+            help="The remote folder of a finished `QE2PertCalculation`, takes precedence over `resume.workchain`.",
+        )
+        for carrier in CARRIERS:
+            spec.input_namespace(f"resume.{carrier}", required=False)
+            for stage in RESUMABLE_STAGES:
+                spec.input(
+                    f"resume.{carrier}.{stage}_folder",
+                    valid_type=orm.RemoteData,
+                    required=False,
+                    help=f"The remote folder of a completed `{stage}` of the {carrier}s, takes precedence over "
+                    "`resume.workchain`.",
+                )
         spec.input(
             "clean_workdir",
             valid_type=orm.Bool,
@@ -141,15 +231,20 @@ class PertuborWorkChain(WorkChain):
             if_(cls.should_run_ph_recover)(
                 cls.run_ph_recover, cls.inspect_ph_recover
             ),
-            cls.run_qe2pert,
-            cls.run_pert_setup,
-            cls.run_pert_imsigma,
-            cls.run_pert_trans,
-            if_(cls.should_calculate_hole)(
-                cls.run_pert_setup, cls.run_pert_imsigma, cls.run_pert_trans
+            while_(cls.should_run_qe2pert)(
+                cls.run_qe2pert, cls.inspect_qe2pert
+            ),
+            while_(cls.should_run_carriers)(
+                cls.run_carriers, cls.inspect_carriers
             ),
             cls.results,
         )
+        spec.expose_outputs(PerturboCarrierWorkChain, namespace="electron")
+        spec.expose_outputs(
+            PerturboCarrierWorkChain,
+            namespace="hole",
+            namespace_options={"required": False},
+        )
         spec.exit_code(
             300,
             "ERROR_INVALID_SCF_NODE",
@@ -158,13 +253,110 @@ class PertuborWorkChain(WorkChain):
         spec.exit_code(
             400, "ERROR_SUB_PROCESS_FAILED", message="The sub process failed"
         )
+        spec.exit_code(
+            401,
+            "ERROR_SUB_PROCESS_FAILED_QE2PERT",
+            message="The QE2PertCalculation sub process failed",
+        )
+        spec.exit_code(
+            402,
+            "ERROR_SUB_PROCESS_FAILED_CARRIER",
+            message="The PerturboCarrierWorkChain sub process failed",
+        )
 
     def get_common_metadata_options(self):
         return self.inputs.metadata_options.get_dict()
 
+    def get_metadata_options(self, code_type, num_stages=1, options=None):
+        """The `metadata_options` input, with the walltime estimated by the resource model if it is not set.
+
+        :param num_stages: number of runs of the code in the same job, e.g. 3 for the perturbo chain
+        :param options: the options to complete instead of the `metadata_options` input
+        """
+        if options is None:
+            options = self.get_common_metadata_options()
+        options = dict(options)
+        if options.get("max_wallclock_seconds", None):
+            return options
+        resources = options.get("resources", {})
+        estimate = estimate_resources(
+            get_resource_model(code_type),
+            self.ctx.resource_features[code_type],
+            num_mpiprocs_per_machine=resources.get("num_mpiprocs_per_machine", 1),
+            num_machines=resources.get("num_machines", 1),
+        )
+        self.report(
+            f"{code_type}: walltime {estimate.max_wallclock_seconds} s estimated for {estimate.cpu_time:.0f} core seconds"
+        )
+        options["max_wallclock_seconds"] = (
+            estimate.max_wallclock_seconds * num_stages
+        )
+        return options
+
+    def get_planned_options(self, options, code, num_kpoints, memory_per_rank):
+        """Plan the MPI ranks, OpenMP threads and pools of a calculation of `code` before it is submitted.
+
+        See `aiida_mobility.utils.resources.plan_options`, the calculation reads the plan from its `resources`.
+        """
+        computer = code.computer
+        planned, plan = plan_options(
+            options,
+            num_kpoints,
+            memory_per_rank=memory_per_rank,
+            memory_per_machine=get_memory_per_machine(computer),
+            default_mpiprocs_per_machine=computer.get_default_mpiprocs_per_machine(),
+        )
+        if planned.get("resources") != options.get("resources"):
+            self.report(
+                f"{memory_per_rank:.0f} MB per rank: using {plan.num_mpiprocs_per_machine} MPI ranks "
+                f"with {plan.num_threads} OpenMP threads per machine"
+            )
+        return planned
+
+    def get_epwan_memory(self, qe2pert_folder=None):
+        """Size of the `epwan.h5` file of the qe2pert calculation of `qe2pert_folder` in MB, estimated if it has not run."""
+        qe2pert = None if qe2pert_folder is None else qe2pert_folder.creator
+        if qe2pert is not None and "output_parameters" in qe2pert.outputs:
+            epwan_size = qe2pert.outputs.output_parameters.get_attribute(
+                "epwan_size", None
+            )
+            if epwan_size is not None:
+                return epwan_size / 1024 ** 2
+        features = self.ctx.resource_features["qe2pert"]
+        return estimate_epwan_memory(
+            features["nat"],
+            features["num_wann"],
+            features["nkpts"],
+            features["nqpts"],
+        )
+
+    def setup_resource_features(self):
+        """Features of the qe2pert and perturbo resource models, see `aiida_mobility.utils.resources`."""
+        nkpts = get_number_of_kpoints(self.ctx.kpoints)
+        # boltz_kdim is 10 times denser than the scf mesh, see `get_kpoints`
+        boltz_nkpts = nkpts * 1000
+        if "sampling" in self.inputs:
+            nqpts = self.inputs.nsamples.value
+        else:
+            # `fqlist` is the same as `fklist`
+            nqpts = boltz_nkpts
+        self.ctx.resource_features = {
+            "qe2pert": {
+                "nat": self.ctx.number_of_atoms,
+                "nkpts": nkpts,
+                "nqpts": self.ctx.number_of_qpoints,
+                "num_wann": self.ctx.number_wfs,
+            },
+            "perturbo": {
+                "nat": self.ctx.number_of_atoms,
+                "nkpts": boltz_nkpts,
+                "nqpts": nqpts,
+                "num_wann": self.ctx.number_wfs,
+            },
+        }
+
     def setup(self):
         self.ctx.should_run_ph_recover = True
-        self.ctx.should_calculate_hole = False
         self.ctx.ph_inputs = AttributeDict(
             {"metadata": {"options": self.get_common_metadata_options()}}
         )
@@ -177,6 +369,7 @@ class PertuborWorkChain(WorkChain):
         self.ctx.pert_code = self.inputs.pert_code
         self.validate_ph_folder()
         self.validate_wannier_folder()
+        self.setup_resource_features()
         if (
             "max_T" in self.inputs
             and "min_T" in self.inputs
@@ -190,6 +383,18 @@ class PertuborWorkChain(WorkChain):
         else:
             self.ctx.temperatures = [300]
 
+        # the eagerly submitted processes not awaited yet, by name
+        self.ctx.eager = {}
+        self.ctx.should_run_qe2pert = True
+        self.ctx.qe2pert_eager = False
+        self.ctx.carriers_to_run = self.get_carriers()
+        self.ctx.eager_carriers = []
+        self.ctx.resume_carriers = {}
+        if self.inputs.get("resume"):
+            self.setup_resume()
+        if self.inputs.reuse_ephmat.value:
+            self.setup_ephmat()
+
         if "carrier_concentration" in self.inputs:
             self.ctx.carrier_concentrations = [
                 self.inputs.carrier_concentration.value
@@ -203,6 +408,114 @@ class PertuborWorkChain(WorkChain):
                 "You have to explict `carrier_concentration` or the structure must be matel."
             )
 
+    def get_resume_folders(self):
+        """The folders of the `resume` inputs, the explicit ones over the ones of `resume.workchain`."""
+        resume = self.inputs.resume
+        folders = {}
+        if "workchain" in resume:
+            workchain = orm.load_node(resume.workchain.value)
+            if workchain.process_class is not type(self):
+                raise exceptions.InputValidationError(
+                    f"Process<{workchain.pk}> to resume is not a {type(self).__name__}."
+                )
+            folders = get_resume_folders(workchain)
+        if "qe2pert_folder" in resume:
+            folders["qe2pert"] = resume.qe2pert_folder
+        for carrier in CARRIERS:
+            for stage in RESUMABLE_STAGES:
+                folder = resume.get(carrier, {}).get(f"{stage}_folder", None)
+                if folder is not None:
+                    folders.setdefault(carrier, {})[stage] = folder
+        return folders
+
+    def check_resume_folder(self, folder, stage):
+        """Whether the remote folder of a completed stage still has the files needed by the next stage."""
+        try:
+            missing = get_missing_files(folder, stage)
+        except OSError as exception:
+            missing = [str(exception)]
+        if missing:
+            self.report(
+                "cannot resume after `{}` from remote_folder<{}>, missing: {}".format(
+                    stage, folder.pk, ", ".join(missing)
+                )
+            )
+            return False
+        return True
+
+    def setup_resume(self):
+        """Skip the stages whose products are present, the carrier stages need the qe2pert folder too."""
+        folders = self.get_resume_folders()
+        qe2pert_folder = folders.get("qe2pert", None)
+        if qe2pert_folder is None or not self.check_resume_folder(
+            qe2pert_folder, "qe2pert"
+        ):
+            self.report("nothing to resume, running all the stages")
+            return
+
+        self.report(
+            "resuming after `qe2pert` from remote_folder<{}>".format(
+                qe2pert_folder.pk
+            )
+        )
+        self.ctx.should_run_ph_recover = False
+        self.ctx.should_run_qe2pert = False
+        self.ctx.qe2pert_folder = qe2pert_folder
+        for carrier in self.get_carriers():
+            stages = folders.get(carrier, {})
+            # the latest stage whose folder is complete
+            for stage in reversed(RESUMABLE_STAGES):
+                if stage in stages and self.check_resume_folder(
+                    stages[stage], stage
+                ):
+                    self.ctx.resume_carriers[carrier] = {
+                        f"{stage}_folder": stages[stage]
+                    }
+                    break
+
+    def setup_ephmat(self):
+        """Compute the e-ph matrix elements in the Bloch basis, reusing the ones of a compatible earlier run."""
+        inputs = self.ctx.qe2pert_inputs
+        inputs.lwannier = orm.Bool(False)
+        if "ephmat_folder" in inputs:
+            return
+        ephmat_folder = find_ephmat_folder(self.get_ephmat_key(inputs))
+        if ephmat_folder is None:
+            self.report(
+                "no earlier qe2pert run to reuse the e-ph matrix elements of"
+            )
+            return
+        self.report(
+            "reusing the e-ph matrix elements of remote_folder<{}>".format(
+                ephmat_folder.pk
+            )
+        )
+        inputs.ephmat_folder = ephmat_folder
+
+    def get_ephmat_key(self, inputs):
+        """The `ephmat_key` of the qe2pert calculation of `inputs`, see `get_ephmat_key`."""
+        nscf_folder = inputs.nscf_folder
+        if "dft_band_max" in inputs:
+            dft_band_max = inputs.dft_band_max.value
+        else:
+            dft_band_max = get_calc_from_folder(
+                nscf_folder
+            ).outputs.output_parameters.get_attribute("number_of_bands")
+        return get_ephmat_key(
+            self.ctx.ph_calc,
+            nscf_folder,
+            inputs.dft_band_min.value if "dft_band_min" in inputs else 1,
+            dft_band_max,
+            inputs.get("kpoints", self.ctx.kpoints),
+        )
+
+    def submit_qe2pert(self, inputs):
+        """Submit a `QE2PertCalculation`, with `lwannier=False` its `ephmat_key` is set for `find_ephmat_folder`."""
+        running = self.submit(QE2PertCalculation, **inputs)
+        if "lwannier" in inputs and not inputs.lwannier.value:
+            running.set_extra(EPHMAT_KEY_EXTRA, self.get_ephmat_key(inputs))
+        return running
+
     def validate_wannier_folder(self):
         parent_folder = self.ctx.qe2pert_inputs.wannier_folder
         parent_calc = get_calc_from_folder(parent_folder)
@@ -213,6 +526,7 @@ class PertuborWorkChain(WorkChain):
 
         wannier90 = parent_calc.caller
         self.ctx.kpoints = wannier90.inputs.scf__kpoints
+        self.ctx.number_of_atoms = len(wannier90.inputs.structure.sites)
 
         wannier_parameters = parent_calc.outputs.output_parameters.get_dict()
         number_wfs = wannier_parameters.get("number_wfs", None)
@@ -220,6 +534,7 @@ class PertuborWorkChain(WorkChain):
             raise exceptions.InputValidationError(
                 "Wannier90 calculation has no `number_wfs` data."
             )
+        self.ctx.number_wfs = number_wfs
         omega_avg = (
             wannier_parameters.get("Omega_D", 0)
             + wannier_parameters.get("Omega_I", 0)
@@ -234,12 +549,46 @@ class PertuborWorkChain(WorkChain):
             )
 
         bands_info = get_bands_info(
-            parent_calc.outputs.interpolated_bands.get_array("bands"),
+            self.get_wannier_bands(parent_calc, settings),
             parent_calc.inputs.parameters.get_attribute("fermi_energy"),
             distance=self.inputs.bands_energy_threshold.value,
         )
         self.ctx.bands_info = bands_info
 
+    def get_wannier_bands(self, wannier_calc, settings):
+        """The bands on a dense kpoints mesh, interpolated locally from the retrieved Wannier Hamiltonian.
+
+        The mesh is the scf mesh times the `interpolation_mesh_factor` of the `settings` (default 2), the
+        `interpolated_bands` path is used if the `_hr.dat` file was not retrieved.
+        """
+        retrieved = wannier_calc.outputs.retrieved
+        filenames = retrieved.list_object_names()
+        hr_filename = f"{self._SEEDNAME}_hr.dat"
+        if hr_filename not in filenames:
+            return wannier_calc.outputs.interpolated_bands.get_array("bands")
+
+        model = parse_hr(retrieved.get_object_content(hr_filename))
+        wsvec_filename = f"{self._SEEDNAME}_wsvec.dat"
+        if wsvec_filename in filenames:
+            model = apply_wsvec(
+                model, retrieved.get_object_content(wsvec_filename)
+            )
+        mesh = np.dot(
+            self.ctx.kpoints.get_kpoints_mesh()[0],
+            settings.get("interpolation_mesh_factor", 2),
+        )
+        bands, _ = interpolate_bands(
+            model,
+            get_kpoint_grid(mesh),
+            num_threads=settings.get("interpolation_num_threads", 1),
+        )
+        self.report(
+            "bands interpolated from {} of Wannier90Calculation<{}> on a {} mesh".format(
+                hr_filename, wannier_calc.pk, "x".join(str(n) for n in mesh)
+            )
+        )
+        return bands
+
     def validate_ph_folder(self):
         parent_folder = self.ctx.qe2pert_inputs.ph_folder
         parent_calc = get_calc_from_folder(parent_folder)
@@ -259,6 +608,23 @@ class PertuborWorkChain(WorkChain):
         self.ctx.ph_folder = parent_folder
         self.ctx.ph_code = parent_calc.inputs.code
 
+        ph_calc = parent_calc
+        self.ctx.ph_calc = ph_calc
+        # the number of irreducible q points, known before the recover for the eager qe2pert
+        self.ctx.ph_number_of_qpoints = None
+        if "output_parameters" in ph_calc.outputs:
+            self.ctx.ph_number_of_qpoints = (
+                ph_calc.outputs.output_parameters.get_attribute(
+                    "number_of_qpoints", None
+                )
+            )
+        if "qpoints" not in ph_calc.inputs:
+            # the `PhRecoverCalculation` runs on the folder of the ph calculation
+            ph_calc = get_calc_from_folder(ph_calc.inputs.parent_folder)
+        self.ctx.number_of_qpoints = get_number_of_kpoints(
+            ph_calc.inputs.qpoints
+        )
+
     def should_run_ph_recover(self):
         return self.ctx.should_run_ph_recover
 
@@ -276,6 +642,7 @@ class PertuborWorkChain(WorkChain):
                 running.pk, "ph"
             )
         )
+        self.submit_eager_qe2pert(running)
 
         return ToContext(workchain_ph=running)
 
@@ -286,120 +653,183 @@ class PertuborWorkChain(WorkChain):
                     self.ctx.workchain_ph.exit_status
                 )
             )
+            self.cancel_eager(
+                "the parent PhRecoverCalculation<{}> failed".format(
+                    self.ctx.workchain_ph.pk
+                )
+            )
             return self.exit_codes.ERROR_SUB_PROCESS_FAILED
 
         self.ctx.ph_folder = self.ctx.workchain_ph.outputs.remote_folder
 
-    def run_qe2pert(self):
-        inputs = self.ctx.qe2pert_inputs
-        inputs.ph_folder = self.ctx.ph_folder
-        inputs.setdefault(
-            "metadata", {"options": self.get_common_metadata_options()}
-        )
-        running = self.submit(QE2PertCalculation, **inputs)
-
-        self.report("launching QE2PertCalculation<{}>.".format(running.pk))
-
-        return ToContext(workchain_qe2pert=running)
-
-    def should_calculate_hole(self):
-        if self.ctx.bands_info.get("type", None) != "metal":
-            self.ctx.should_calculate_hole = True
-        return self.ctx.should_calculate_hole
-
-    def run_pert_setup(self):
-        inputs = AttributeDict(
-            {"metadata": {"options": self.get_common_metadata_options()}}
-        )
-        inputs.parent_folder = self.ctx.workchain_qe2pert.outputs.remote_folder
-        inputs.calc_mode = "setup"
-        inputs.code = self.ctx.pert_code
-        params = {}
-        common_pert_params = {}
-        if self.ctx.should_calculate_hole:
-            common_pert_params["hole"] = true
-            common_pert_params["band_min"] = self.ctx.bands_info.get(
-                "hole_min_band"
-            )
-            common_pert_params["band_max"] = self.ctx.bands_info.get(
-                "hole_max_band"
-            )
-            common_pert_params["boltz_emin"] = self.ctx.bands_info.get(
-                "hole_e_min"
-            )
-            common_pert_params["boltz_emax"] = self.ctx.bands_info.get(
-                "hole_e_max"
-            )
-        else:
-            common_pert_params["band_min"] = self.ctx.bands_info.get(
-                "el_min_band"
-            )
-            common_pert_params["band_max"] = self.ctx.bands_info.get(
-                "el_max_band"
-            )
-            common_pert_params["boltz_emin"] = self.ctx.bands_info.get(
-                "el_e_min"
+    def should_eager_submit(self, parent, code):
+        """Whether the calculations of `code` depending on `parent` are submitted before it has run."""
+        if not self.inputs.eager_submit.value:
+            return False
+        if not supports_eager_submission(parent, code):
+            self.report(
+                "eager submission after {}<{}> needs the same computer with a `mobility.*` scheduler".format(
+                    parent.process_label, parent.pk
+                )
             )
-            common_pert_params["boltz_emax"] = self.ctx.bands_info.get(
-                "el_e_max"
+            return False
+        return True
+
+    def get_predicted_remote_folder(self, parent):
+        """The remote folder of `parent` before it has run, None if it cannot be predicted."""
+        try:
+            return get_predicted_remote_folder(parent)
+        except ValueError as exception:
+            self.report(
+                "eager submission after {}<{}> disabled: {}".format(
+                    parent.process_label, parent.pk, exception
+                )
             )
-        self.ctx.common_pert_params = common_pert_params
-        params.update(common_pert_params)
-        params.update({"temperatures": self.ctx.temperatures})
-        if "carrier_concentration" in self.inputs:
-            params.update(
-                {"carrier_concentrations": self.ctx.carrier_concentrations}
+            return None
+
+    def cancel_eager(self, reason):
+        """Kill the eagerly submitted processes, their parent failed."""
+        for node in self.ctx.eager.values():
+            cancel_eager(self, node, reason)
+        self.ctx.eager = {}
+
+    def get_qe2pert_options(self, options):
+        """The `metadata.options` of the qe2pert calculation, completed by the `metadata_options` input.
+
+        The exposed options always hold the defaults of `QE2PertCalculation`, only the options which differ
+        from them are kept over the `metadata_options` input. The walltime is estimated if it is not set.
+
+        :param options: the `metadata.options` of the `qe2pert` namespace
+        """
+        ports = QE2PertCalculation.spec().inputs["metadata"]["options"]
+        explicit = {}
+        for key, value in options.items():
+            port = ports.get(key, None)
+            default = (
+                port.default if port is not None and port.has_default() else None
             )
-        elif self.ctx.bands_info.get("type") == "metal":
-            params.update({"fermi_levels": self.ctx.fermi_levels})
-
-        inputs.parameters = orm.Dict(dict=params)
-
-        if "kpoints" not in inputs:
-            scf_kpoints = self.ctx.kpoints
-            mesh = scf_kpoints.get_kpoints_mesh()
-            mesh = np.dot(mesh, 10)
-            kpoints = orm.KpointsData()
-            kpoints.set_kpoints_mesh(mesh)
-            inputs.kpoints = kpoints
-
-        running = self.submit(PerturboCalculation, **inputs)
-
+            if callable(default):
+                default = default()
+            if value != default:
+                explicit[key] = value
+        return self.get_metadata_options(
+            "qe2pert", options=dict(self.get_common_metadata_options(), **explicit)
+        )
+
+    def get_qe2pert_inputs(self, ph_folder):
+        inputs = AttributeDict(self.ctx.qe2pert_inputs)
+        inputs.ph_folder = ph_folder
+        metadata = dict(inputs.get("metadata", {}))
+        metadata["options"] = self.get_planned_options(
+            self.get_qe2pert_options(metadata.get("options", {})),
+            inputs.code,
+            get_number_of_kpoints(inputs.get("kpoints", self.ctx.kpoints)),
+            self.get_epwan_memory(),
+        )
+        inputs.metadata = metadata
+        return inputs
+
+    def submit_eager_qe2pert(self, ph_recover):
+        """Submit the `QE2PertCalculation` waiting in the queue for `ph_recover`, and the carriers after it."""
+        if self.ctx.ph_number_of_qpoints is None or not self.should_eager_submit(
+            ph_recover, self.ctx.qe2pert_inputs.code
+        ):
+            return
+        remote_folder = self.get_predicted_remote_folder(ph_recover)
+        if remote_folder is None:
+            return
+
+        inputs = self.get_qe2pert_inputs(remote_folder)
+        settings = (
+            inputs.settings.get_dict()
+            if "settings" in inputs
+            else QE2PertCalculation._DEFAULT_SETTINGS
+        )
+        inputs.settings = get_eager_settings(
+            settings,
+            remote_folder,
+            NUMBER_OF_QPOINTS=self.ctx.ph_number_of_qpoints,
+        )
+        inputs.metadata = dict(
+            inputs.metadata,
+            options=get_eager_options(
+                inputs.metadata.get("options", {}), inputs.settings
+            ),
+        )
+        running = self.submit_qe2pert(inputs)
         self.report(
-            "launching PerturboCalculation in `setup` mode<{}>.".format(
-                running.pk
+            "eagerly launching QE2PertCalculation<{}> after PhRecoverCalculation<{}>.".format(
+                running.pk, ph_recover.pk
             )
         )
+        self.ctx.eager["qe2pert"] = running
+        self.submit_eager_carriers(running)
 
-        if self.ctx.should_calculate_hole:
-            return ToContext(workchain_pert_setup_hole=running)
-        else:
-            return ToContext(workchain_pert_setup=running)
+    def should_run_qe2pert(self):
+        return self.ctx.should_run_qe2pert
 
-    def run_pert_imsigma(self):
-        inputs = AttributeDict(
-            {"metadata": {"options": self.get_common_metadata_options()}}
-        )
-        inputs.code = self.ctx.pert_code
-        if self.ctx.should_calculate_hole:
-            inputs.parent_folder = (
-                self.ctx.workchain_pert_setup_hole.outputs.remote_folder
-            )
-        else:
-            inputs.parent_folder = (
-                self.ctx.workchain_pert_setup.outputs.remote_folder
+    def run_qe2pert(self):
+        self.ctx.should_run_qe2pert = False
+        running = self.ctx.eager.pop("qe2pert", None)
+        self.ctx.qe2pert_eager = running is not None
+        if running is None:
+            running = self.submit_qe2pert(
+                self.get_qe2pert_inputs(self.ctx.ph_folder)
             )
+            self.report("launching QE2PertCalculation<{}>.".format(running.pk))
+            self.submit_eager_carriers(running)
 
-        inputs.calc_mode = "imsigma"
-        params = {}
-        params.update(self.ctx.common_pert_params)
-        params.update(
-            {
-                "phfreq_cutoff": self.inputs.phfreq_cutoff.value,
-                "delta_smear": self.inputs.delta_smear.value,
-            }
-        )
+        return ToContext(workchain_qe2pert=running)
 
+    def inspect_qe2pert(self):
+        if not self.ctx.workchain_qe2pert.is_finished_ok:
+            self.report(
+                "QE2PertCalculation failed with exit status {}".format(
+                    self.ctx.workchain_qe2pert.exit_status
+                )
+            )
+            self.cancel_eager(
+                "the parent QE2PertCalculation<{}> failed".format(
+                    self.ctx.workchain_qe2pert.pk
+                )
+            )
+            if self.ctx.qe2pert_eager:
+                # its parent succeeded, submit it again as usual
+                self.report("submitting QE2PertCalculation again")
+                self.ctx.should_run_qe2pert = True
+                return
+            return self.exit_codes.ERROR_SUB_PROCESS_FAILED_QE2PERT
+
+        self.ctx.qe2pert_folder = (
+            self.ctx.workchain_qe2pert.outputs.remote_folder
+        )
+
+    def get_carriers(self):
+        """Electrons only for metals, both electrons and holes for semiconductors."""
+        if self.ctx.bands_info.get("type", None) == "metal":
+            return ["electron"]
+        return ["electron", "hole"]
+
+    def get_kpoints(self):
+        """The kpoints mesh for boltz_kdim, 10 times denser than the scf mesh."""
+        mesh = self.ctx.kpoints.get_kpoints_mesh()[0]
+        kpoints = orm.KpointsData()
+        kpoints.set_kpoints_mesh(np.dot(mesh, 10).tolist())
+        return kpoints
+
+    def get_setup_parameters(self):
+        params = {"temperatures": list(self.ctx.temperatures)}
+        if "carrier_concentration" in self.inputs:
+            params["carrier_concentrations"] = self.ctx.carrier_concentrations
+        elif self.ctx.bands_info.get("type") == "metal":
+            params["fermi_levels"] = self.ctx.fermi_levels
+        return params
+
+    def get_imsigma_parameters(self):
+        params = {
+            "phfreq_cutoff": self.inputs.phfreq_cutoff.value,
+            "delta_smear": self.inputs.delta_smear.value,
+        }
         if "sampling" in self.inputs:
             params.update(
                 {
@@ -408,41 +838,13 @@ class PertuborWorkChain(WorkChain):
                 }
             )
 
-            if self.inputs.sampling.value == "cauchy_scale":
+            if self.inputs.sampling.value == "cauchy":
                 params.update({"cauchy_scale": self.inputs.cauchy_scale.value})
+        return params
 
-        running = self.submit(PerturboCalculation, **inputs)
-
-        self.report(
-            "launching PerturboCalculation in `imsigma` mode<{}>.".format(
-                running.pk
-            )
-        )
-
-        if self.ctx.should_calculate_hole:
-            return ToContext(workchain_pert_imsigma_hole=running)
-        else:
-            return ToContext(workchain_pert_imsigma=running)
-
-    def run_pert_trans(self):
-        inputs = AttributeDict(
-            {"metadata": {"options": self.get_common_metadata_options()}}
-        )
-        inputs.code = self.ctx.pert_code
-        if self.ctx.should_calculate_hole:
-            inputs.parent_folder = (
-                self.ctx.workchain_pert_imsigma_hole.outputs.remote_folder
-            )
-        else:
-            inputs.parent_folder = (
-                self.ctx.workchain_pert_imsigma.outputs.remote_folder
-            )
-        inputs.calc_mode = "trans"
-        params = {}
-        params.update(self.ctx.common_pert_params)
-
+    def get_trans_parameters(self):
         boltz_nstep = self.inputs.boltz_nstep.value
-        params["boltz_nstep"] = boltz_nstep
+        params = {"boltz_nstep": boltz_nstep}
         if boltz_nstep != 0:
             params.update(
                 {
@@ -450,83 +852,133 @@ class PertuborWorkChain(WorkChain):
                     "delta_smear": self.inputs.delta_smear.value,
                 }
             )
+        return params
 
-        running = self.submit(PerturboCalculation, **inputs)
-
+    def submit_carrier(self, carrier, parent_folder, setup_settings=None):
+        """Submit the `PerturboCarrierWorkChain` of a carrier type."""
+        kpoints = self.get_kpoints()
+        inputs = AttributeDict(
+            {
+                "code": self.ctx.pert_code,
+                "parent_folder": parent_folder,
+                "kpoints": kpoints,
+                "setup_parameters": orm.Dict(dict=self.get_setup_parameters()),
+                "imsigma_parameters": orm.Dict(
+                    dict=self.get_imsigma_parameters()
+                ),
+                "trans_parameters": orm.Dict(dict=self.get_trans_parameters()),
+                "metadata_options": orm.Dict(
+                    dict=self.get_planned_options(
+                        self.get_metadata_options(
+                            "perturbo",
+                            num_stages=len(CHAIN_MODES)
+                            if self.inputs.chain.value
+                            else 1,
+                        ),
+                        self.ctx.pert_code,
+                        get_number_of_kpoints(kpoints),
+                        self.get_epwan_memory(parent_folder),
+                    )
+                ),
+                "chain": self.inputs.chain,
+                "parameters": orm.Dict(
+                    dict=get_carrier_parameters(self.ctx.bands_info, carrier)
+                ),
+                "metadata": {"call_link_label": carrier},
+            }
+        )
+        if setup_settings is not None:
+            inputs.setup_settings = setup_settings
+        if carrier in self.ctx.resume_carriers:
+            inputs.resume = self.ctx.resume_carriers[carrier]
+        node = self.submit(PerturboCarrierWorkChain, **inputs)
         self.report(
-            "launching PerturboCalculation in `trans` mode<{}>.".format(
-                running.pk
+            "{}launching PerturboCarrierWorkChain<{}> for {}.".format(
+                "eagerly " if setup_settings is not None else "",
+                node.pk,
+                carrier,
             )
         )
+        return node
+
+    def submit_eager_carriers(self, qe2pert):
+        """Submit the carriers, their first calculation waiting in the queue for `qe2pert`."""
+        if not self.should_eager_submit(qe2pert, self.ctx.pert_code):
+            return
+        remote_folder = self.get_predicted_remote_folder(qe2pert)
+        if remote_folder is None:
+            return
+        settings = get_eager_settings(
+            PerturboCalculation._DEFAULT_SETTINGS, remote_folder
+        )
+        for carrier in self.ctx.carriers_to_run:
+            self.ctx.eager[carrier] = self.submit_carrier(
+                carrier, remote_folder, setup_settings=settings
+            )
 
-        if self.ctx.should_calculate_hole:
-            return ToContext(workchain_pert_trans_hole=running)
-        else:
-            return ToContext(workchain_pert_trans=running)
+    def should_run_carriers(self):
+        return bool(self.ctx.carriers_to_run)
+
+    def run_carriers(self):
+        """Submit one independent `PerturboCarrierWorkChain` per carrier type concurrently."""
+        running = {}
+        for carrier in self.ctx.carriers_to_run:
+            node = self.ctx.eager.pop(carrier, None)
+            if node is None:
+                node = self.submit_carrier(carrier, self.ctx.qe2pert_folder)
+            else:
+                self.ctx.eager_carriers.append(carrier)
+            running[f"workchain_{carrier}"] = node
+        self.ctx.carriers_to_run = []
+
+        return ToContext(**running)
+
+    def inspect_carriers(self):
+        eager_carriers, self.ctx.eager_carriers = self.ctx.eager_carriers, []
+        for carrier in self.get_carriers():
+            workchain = self.ctx[f"workchain_{carrier}"]
+            if not workchain.is_finished_ok:
+                self.report(
+                    "PerturboCarrierWorkChain for {} failed with exit status {}".format(
+                        carrier, workchain.exit_status
+                    )
+                )
+                if carrier in eager_carriers:
+                    # its parent succeeded, submit it again as usual
+                    self.report(
+                        "submitting PerturboCarrierWorkChain for {} again".format(
+                            carrier
+                        )
+                    )
+                    self.ctx.carriers_to_run.append(carrier)
+                    continue
+                return self.exit_codes.ERROR_SUB_PROCESS_FAILED_CARRIER
 
     def results(self):
-        self.report(self.ctx.workchain_ph.outputs.out_parameters)
+        for carrier in self.get_carriers():
+            self.out_many(
+                self.exposed_outputs(
+                    self.ctx[f"workchain_{carrier}"],
+                    PerturboCarrierWorkChain,
+                    namespace=carrier,
+                )
+            )
+
+    def on_terminated(self):
+        """Record the features of the calculations for the fits of the resource models."""
+        super().on_terminated()
+        if "resource_features" in self.ctx:
+            features = dict(self.ctx.resource_features)
+            if self.inputs.chain.value:
+                # a chained calculation runs the three calc modes, it is not a sample of a single one
+                features.pop("perturbo")
+            record_resource_features(self.node, features)
 
 
 def get_bands_info(bands, fermi_energy, distance=0.3):
-    bands_info = {"fermi_energy": fermi_energy}
-    # if np.isclose(np.min(np.abs(bands - fermi_energy)), 0):
-    bound = bands[bands < fermi_energy].shape[0] / bands.shape[0]
-    if bound % 1 != 0:  # metal
-        # raise ValueError("The fermi level is over some bands.")
-        calc_bands = []
-        for i in range(0, bands.shape[1]):
-            band = bands[:, i]
-            if np.min(np.abs(band - fermi_energy)) < distance:
-                calc_bands.append(i)
-        if len(calc_bands) == 0:
-            raise ValueError(
-                "No bands between fermi energy {} +- {}.".format(
-                    fermi_energy, distance
-                )
-            )
-        bands_info.update(
-            {
-                "type": "metal",
-                "el_max_band": np.max(calc_bands) + 1,
-                "el_min_band": np.min(calc_bands) + 1,
-                "el_e_max": fermi_energy + distance,
-                "el_e_min": fermi_energy - distance,
-            }
-        )
-    else:
-        # semi-conductor
-        bound = int(bound)
-        el_min = np.min(bands[:, bound:])
-        hole_max = np.max(bands[:, :bound])
-        calc_el_bands = []
-        calc_hole_bands = []
-        for i in range(bound, bands.shape[1]):
-            band = bands[:, i]
-            if np.min(np.abs(band - el_min)) < distance:
-                calc_el_bands.append(i)
-
-        if len(calc_el_bands) == 0:
-            raise ValueError("Cannot get el bands from bands data.")
-
-        for i in range(0, bound):
-            band = bands[:, i]
-            if np.min(np.abs(band - hole_max)) < distance:
-                calc_hole_bands.append(i)
-
-        if len(calc_el_bands) == 0:
-            raise ValueError("Cannot get hole bands from bands data.")
-
-        bands_info.update(
-            {
-                "el_max_band": np.max(calc_el_bands) + 1,
-                "el_min_band": np.min(calc_el_bands) + 1,
-                "el_e_max": np.max(bands[np.max(calc_el_bands)]),
-                "el_e_min": el_min,
-                "hole_max_band": np.max(calc_hole_bands) + 1,
-                "hole_min_band": np.min(calc_hole_bands) + 1,
-                "hole_e_max": hole_max,
-                "hole_e_min": np.min(bands[np.min(calc_hole_bands)]),
-            }
-        )
-    return bands_info
+    """Get the electron and hole band windows, see `aiida_mobility.utils.bands.classify_bands`.
+
+    :return: the `BandsInfo` as a dict, without hole keys for a metal
+    :rtype: dict
+    """
+    return classify_bands(bands, fermi_energy, distance=distance).as_dict()
@@ -0,0 +1,177 @@
+"""Resume a `PertuborWorkChain` from the completed stages of a previous run.
+
+The remote folder of a stage can be reused if its calculation completed it and the files needed by the next stage
+are still in the folder, which is checked with a single `listdir` per folder. The folders are found from a failed
+or finished `PertuborWorkChain`, or given explicitly. The e-ph matrix elements in the Bloch basis of an earlier
+`QE2PertCalculation` are found the same way, see `find_ephmat_folder`.
+"""
+import fnmatch
+
+from aiida import orm
+from aiida.common import LinkType, exceptions
+
+from aiida_mobility.calculations.perturbo import PerturboCalculation
+from aiida_mobility.calculations.qe2pert import (
+    EPHMAT_KEY_EXTRA,
+    QE2PertCalculation,
+)
+from aiida_mobility.utils import get_calc_from_folder
+
+QE2PERT_PROCESS_TYPE = "aiida.calculations:mobility.qe2pert"
+PERTURBO_PROCESS_TYPE = "aiida.calculations:mobility.perturbo"
+# the stages of a carrier which can be skipped, `trans` is always run
+RESUMABLE_STAGES = ("setup", "imsigma")
+# the files needed by the next stage in the remote folder of a stage
+_PREFIX = PerturboCalculation._PREFIX
+STAGE_FILES = {
+    "qe2pert": [PerturboCalculation._DEFAULT_EPWAN_FILE],
+    "setup": [
+        PerturboCalculation._DEFAULT_EPWAN_FILE,
+        PerturboCalculation._DEFAULT_TEMPER_FILE,
+        f"{_PREFIX}_tet.h5",
+        f"{_PREFIX}_tet.kpt",
+    ],
+    "imsigma": [
+        PerturboCalculation._DEFAULT_EPWAN_FILE,
+        PerturboCalculation._DEFAULT_TEMPER_FILE,
+        f"{_PREFIX}_tet.h5",
+        f"{_PREFIX}.imsigma",
+    ],
+}
+
+
+def get_ancestors(calc):
+    """The calculation and its parents up the chain of `parent_folder` inputs, the latest first."""
+    calcs = []
+    while calc is not None:
+        calcs.append(calc)
+        if "parent_folder" not in calc.inputs:
+            break
+        try:
+            calc = get_calc_from_folder(calc.inputs.parent_folder)
+        except (exceptions.NotExistent, exceptions.UniquenessError):
+            break
+    return calcs
+
+
+def is_stage_completed(calc, stage):
+    """Whether the calculation `calc` completed `stage`, also for a `chain` calculation which failed later."""
+    if "remote_folder" not in calc.outputs:
+        return False
+    if stage == "qe2pert":
+        return calc.process_type == QE2PERT_PROCESS_TYPE and calc.is_finished_ok
+    if calc.process_type != PERTURBO_PROCESS_TYPE:
+        return False
+    calc_mode = calc.inputs.calc_mode.value
+    if calc_mode == "chain":
+        return f"stage_parameters__{stage}" in calc.outputs
+    return calc_mode == stage and calc.is_finished_ok
+
+
+def get_stage_parameters(calc, stage):
+    """The output parameters of `stage` of the calculation `calc` or of its parents, None if not found."""
+    for ancestor in get_ancestors(calc):
+        if is_stage_completed(ancestor, stage):
+            if ancestor.inputs.calc_mode.value == "chain":
+                return ancestor.outputs[f"stage_parameters__{stage}"]
+            return ancestor.outputs.output_parameters
+    return None
+
+
+def _get_called(node, link_type):
+    """The processes called by `node`, by link label, the earliest first."""
+    called = {}
+    for link in sorted(
+        node.get_outgoing(link_type=link_type).all(),
+        key=lambda link: link.node.ctime,
+    ):
+        called.setdefault(link.link_label, []).append(link.node)
+    return called
+
+
+def _sort_unique(calcs):
+    """The calculations without duplicates, the earliest first."""
+    unique = {calc.pk: calc for calc in calcs}
+    return sorted(unique.values(), key=lambda calc: calc.ctime)
+
+
+def get_resume_folders(workchain):
+    """Find the remote folders of the stages completed by a `PertuborWorkChain`.
+
+    The stages skipped by the workchain because it was itself resumed are found through the parents of its
+    calculations.
+
+    :param workchain: the workchain node
+    :return: the remote folders, `{"qe2pert": folder, "electron": {"setup": folder, "imsigma": folder}, ...}`
+    :rtype: dict
+    """
+    folders = {}
+    calcs = []
+    for nodes in _get_called(workchain, LinkType.CALL_CALC).values():
+        calcs.extend(nodes)
+    for carrier, nodes in _get_called(workchain, LinkType.CALL_WORK).items():
+        carrier_calcs = []
+        for node in nodes:
+            for calc_nodes in _get_called(node, LinkType.CALL_CALC).values():
+                for calc in calc_nodes:
+                    carrier_calcs.extend(get_ancestors(calc))
+        calcs.extend(carrier_calcs)
+        stages = {}
+        # the latest completed calculation of each stage wins
+        for calc in _sort_unique(carrier_calcs):
+            for stage in RESUMABLE_STAGES:
+                if is_stage_completed(calc, stage):
+                    stages[stage] = calc.outputs.remote_folder
+        if stages:
+            folders[carrier] = stages
+    for calc in _sort_unique(calcs):
+        if is_stage_completed(calc, "qe2pert"):
+            folders["qe2pert"] = calc.outputs.remote_folder
+    return folders
+
+
+def get_missing_files(remote_folder, stage):
+    """The files needed after `stage` which are not in `remote_folder`, with a single remote `listdir`.
+
+    :raises OSError: if the folder cannot be listed, e.g. it was cleaned
+    """
+    filenames = set(remote_folder.listdir())
+    return [
+        filename for filename in STAGE_FILES[stage] if filename not in filenames
+    ]
+
+
+def find_ephmat_folder(ephmat_key):
+    """Find the latest finished `QE2PertCalculation` with the same `ephmat_key` whose e-ph matrix files are present.
+
+    The key is the extra set by `PertuborWorkChain` when it submits a calculation with `lwannier=False`.
+
+    :param ephmat_key: see `aiida_mobility.calculations.qe2pert.get_ephmat_key`
+    :return: its remote folder, None if not found
+    """
+    qb = orm.QueryBuilder()
+    qb.append(
+        orm.CalcJobNode,
+        filters={
+            "attributes.process_label": QE2PertCalculation.__name__,
+            "attributes.exit_status": 0,
+            f"extras.{EPHMAT_KEY_EXTRA}.nscf_folder": ephmat_key["nscf_folder"],
+        },
+        project="*",
+    )
+    qb.order_by({orm.CalcJobNode: {"ctime": "desc"}})
+    for calc, in qb.iterall():
+        if calc.get_extra(EPHMAT_KEY_EXTRA, None) != ephmat_key:
+            continue
+        if "remote_folder" not in calc.outputs:
+            continue
+        remote_folder = calc.outputs.remote_folder
+        try:
+            filenames = remote_folder.listdir(
+                QE2PertCalculation._QE_OUTPUT_SUBFOLDER
+            )
+        except OSError:
+            continue
+        if fnmatch.filter(filenames, QE2PertCalculation._QE_EPHMAT_FILES):
+            return remote_folder
+    return None
@@ -0,0 +1,290 @@
+from aiida.common.extendeddicts import AttributeDict
+from aiida.engine.processes.workchains.context import ToContext
+from aiida.engine.processes.workchains.workchain import WorkChain
+from aiida_mobility.calculations.perturbo import PerturboCalculation
+from aiida_mobility.calculations.functions.perturbo import merge_trans_sweep
+from aiida_mobility.utils.perturbo import read_temper, split_temper_rows
+from aiida import orm
+
+__all__ = ("PerturboSweepWorkChain",)
+
+
+def validate_inputs(inputs, ctx=None):  # pylint: disable=unused-argument
+    """Validate the inputs of the entire input namespace."""
+    if "carrier_concentrations" not in inputs and "fermi_levels" not in inputs:
+        return "You have to explicit `carrier_concentrations` or `fermi_levels`."
+    if "carrier_concentrations" in inputs and "fermi_levels" in inputs:
+        return "Only one of `carrier_concentrations` and `fermi_levels` can be specified."
+
+
+class PerturboSweepWorkChain(WorkChain):
+    """Workchain sweeping perturbo transport over a (T, n) or (T, Ef) grid for a single carrier type.
+
+    A single `setup` is run for the whole grid and its `aiida_tet.h5` is reused afterwards, then either
+    1. `concurrent` is False: a single `imsigma` and a single `trans` with a multi-row temper file, or
+    2. `concurrent` is True: the rows are split into blocks of `rows_per_job`, and one `imsigma` -> `trans`
+       pair is run concurrently for each block. The `trans` of perturbo reads the `.imsigma` rows
+       in the order of its temper file, so each block needs its own `imsigma`.
+
+    The parsed `prefix.cond` of all the `trans` calculations are merged into a single `ArrayData`
+    with the `mobility` and `conductivity` arrays indexed by [T, n].
+    """
+
+    _DEFAULT_METADATA_OPTIONS = {
+        "resources": {
+            "num_machines": 1,
+            "num_mpiprocs_per_machine": 1,
+        },
+        "withmpi": False,
+    }
+
+    @classmethod
+    def define(cls, spec):
+        super().define(spec)
+        spec.input("code", valid_type=orm.Code, help="The `perturbo.x` code.")
+        spec.input(
+            "parent_folder",
+            valid_type=orm.RemoteData,
+            help="The remote folder of the parent `QE2PertCalculation`.",
+        )
+        spec.input(
+            "kpoints",
+            valid_type=orm.KpointsData,
+            help="The kpoints mesh to generate boltz_kdim.",
+        )
+        spec.input(
+            "parameters",
+            valid_type=orm.Dict,
+            help="Parameters shared by all the calc modes, e.g. band_min, band_max, boltz_emin, boltz_emax and hole.",
+        )
+        spec.input(
+            "temperatures",
+            valid_type=orm.List,
+            help="Temperatures of the sweep in K.",
+        )
+        spec.input(
+            "carrier_concentrations",
+            valid_type=orm.List,
+            required=False,
+            help="Carrier concentrations of the sweep in cm^-3.",
+        )
+        spec.input(
+            "fermi_levels",
+            valid_type=orm.List,
+            required=False,
+            help="Fermi levels of the sweep in eV, used for metals instead of `carrier_concentrations`.",
+        )
+        spec.input(
+            "imsigma_parameters",
+            valid_type=orm.Dict,
+            default=lambda: orm.Dict(dict={}),
+            help="Parameters of the `imsigma` mode.",
+        )
+        spec.input(
+            "trans_parameters",
+            valid_type=orm.Dict,
+            default=lambda: orm.Dict(dict={}),
+            help="Parameters of the `trans` mode.",
+        )
+        spec.input(
+            "concurrent",
+            valid_type=orm.Bool,
+            default=lambda: orm.Bool(False),
+            help="If `True`, split the grid into blocks of `rows_per_job` rows and run them concurrently, "
+            "otherwise run a single `imsigma` and `trans` with a multi-row temper file.",
+        )
+        spec.input(
+            "rows_per_job",
+            valid_type=orm.Int,
+            default=lambda: orm.Int(1),
+            help="Number of (T, n) rows of each concurrent block.",
+        )
+        spec.input(
+            "metadata_options",
+            valid_type=orm.Dict,
+            default=lambda: orm.Dict(dict=cls._DEFAULT_METADATA_OPTIONS),
+            help="options designated for calculation.",
+        )
+        spec.inputs.validator = validate_inputs
+        spec.outline(
+            cls.run_setup,
+            cls.inspect_setup,
+            cls.run_imsigma,
+            cls.inspect_imsigma,
+            cls.run_trans,
+            cls.inspect_trans,
+            cls.results,
+        )
+        spec.output(
+            "setup_parameters",
+            valid_type=orm.Dict,
+            help="The output parameters of the `setup` calculation.",
+        )
+        spec.output(
+            "transport",
+            valid_type=orm.ArrayData,
+            help="The merged `conductivity` and `mobility` arrays indexed by [T, n].",
+        )
+        spec.exit_code(
+            401,
+            "ERROR_SUB_PROCESS_FAILED_SETUP",
+            message="The `setup` PerturboCalculation sub process failed",
+        )
+        spec.exit_code(
+            402,
+            "ERROR_SUB_PROCESS_FAILED_IMSIGMA",
+            message="The `imsigma` PerturboCalculation sub process failed",
+        )
+        spec.exit_code(
+            403,
+            "ERROR_SUB_PROCESS_FAILED_TRANS",
+            message="The `trans` PerturboCalculation sub process failed",
+        )
+
+    def _get_sweep_values(self):
+        if "carrier_concentrations" in self.inputs:
+            return self.inputs.carrier_concentrations
+        return self.inputs.fermi_levels
+
+    def _submit(self, calc_mode, parent_folder, parameters, label=None):
+        """Submit a `PerturboCalculation` in `calc_mode`."""
+        params = self.inputs.parameters.get_dict()
+        params.update(parameters)
+
+        inputs = AttributeDict(
+            {
+                "code": self.inputs.code,
+                "calc_mode": orm.Str(calc_mode),
+                "parent_folder": parent_folder,
+                "kpoints": self.inputs.kpoints,
+                "parameters": orm.Dict(dict=params),
+                "metadata": {
+                    "options": self.inputs.metadata_options.get_dict(),
+                    "call_link_label": label or calc_mode,
+                },
+            }
+        )
+        running = self.submit(PerturboCalculation, **inputs)
+
+        self.report(
+            "launching PerturboCalculation in `{}` mode<{}>.".format(
+                calc_mode, running.pk
+            )
+        )
+        return running
+
+    def _inspect(self, calcs, exit_code):
+        for calc in calcs:
+            if not calc.is_finished_ok:
+                self.report(
+                    "PerturboCalculation<{}> failed with exit status {}".format(
+                        calc.pk, calc.exit_status
+                    )
+                )
+                return exit_code
+
+    def run_setup(self):
+        """Run a single `setup` for the whole (T, n) grid."""
+        params = {
+            "temperatures": self.inputs.temperatures.get_list(),
+            "temper_grid": True,
+        }
+        if "carrier_concentrations" in self.inputs:
+            params[
+                "carrier_concentrations"
+            ] = self.inputs.carrier_concentrations.get_list()
+        else:
+            params["fermi_levels"] = self.inputs.fermi_levels.get_list()
+
+        running = self._submit("setup", self.inputs.parent_folder, params)
+        return ToContext(calc_setup=running)
+
+    def inspect_setup(self):
+        return self._inspect(
+            [self.ctx.calc_setup],
+            self.exit_codes.ERROR_SUB_PROCESS_FAILED_SETUP,
+        )
+
+    def get_blocks(self):
+        """Return the temper parameters of each block, a single block linking the temper file of
+        `setup` if `concurrent` is False, otherwise the blocks of rows of the temper file updated by `setup`."""
+        if not self.inputs.concurrent.value:
+            return [{}]
+
+        with self.ctx.calc_setup.outputs.retrieved.open(
+            PerturboCalculation._DEFAULT_TEMPER_FILE
+        ) as handle:
+            rows, find_efermi = read_temper(handle.read())
+
+        blocks = []
+        for block in split_temper_rows(rows, self.inputs.rows_per_job.value):
+            params = {"temperatures": block[:, 0].tolist()}
+            if find_efermi:
+                params["carrier_concentrations"] = block[:, 2].tolist()
+            else:
+                params["fermi_levels"] = block[:, 1].tolist()
+            blocks.append(params)
+        return blocks
+
+    def run_imsigma(self):
+        """Run one `imsigma` per block, all of them reuse the `aiida_tet.h5` of `setup`."""
+        self.ctx.blocks = self.get_blocks()
+        running = {}
+        for index, block in enumerate(self.ctx.blocks):
+            params = dict(block, **self.inputs.imsigma_parameters.get_dict())
+            running[f"calc_imsigma_{index:03d}"] = self._submit(
+                "imsigma",
+                self.ctx.calc_setup.outputs.remote_folder,
+                params,
+                label=f"imsigma_{index:03d}",
+            )
+        return ToContext(**running)
+
+    def inspect_imsigma(self):
+        return self._inspect(
+            [
+                self.ctx[f"calc_imsigma_{index:03d}"]
+                for index in range(len(self.ctx.blocks))
+            ],
+            self.exit_codes.ERROR_SUB_PROCESS_FAILED_IMSIGMA,
+        )
+
+    def run_trans(self):
+        """Run one `trans` per block on top of the `imsigma` of the same block."""
+        running = {}
+        for index, block in enumerate(self.ctx.blocks):
+            params = dict(block, **self.inputs.trans_parameters.get_dict())
+            imsigma = self.ctx[f"calc_imsigma_{index:03d}"]
+            running[f"calc_trans_{index:03d}"] = self._submit(
+                "trans",
+                imsigma.outputs.remote_folder,
+                params,
+                label=f"trans_{index:03d}",
+            )
+        return ToContext(**running)
+
+    def inspect_trans(self):
+        return self._inspect(
+            [
+                self.ctx[f"calc_trans_{index:03d}"]
+                for index in range(len(self.ctx.blocks))
+            ],
+            self.exit_codes.ERROR_SUB_PROCESS_FAILED_TRANS,
+        )
+
+    def results(self):
+        self.out("setup_parameters", self.ctx.calc_setup.outputs.output_parameters)
+
+        conductivities = {
+            f"trans_{index:03d}": self.ctx[
+                f"calc_trans_{index:03d}"
+            ].outputs.conductivity
+            for index in range(len(self.ctx.blocks))
+        }
+        transport = merge_trans_sweep(
+            temperatures=self.inputs.temperatures,
+            values=self._get_sweep_values(),
+            metadata={"call_link_label": "merge_trans_sweep"},
+            **conductivities,
+        )
+        self.out("transport", transport)
@@ -21,6 +21,13 @@ from aiida_quantumespresso.utils.mapping import prepare_process_inputs
 from aiida_mobility.workflows.pw.base import PwBaseWorkChain
 from aiida_mobility.workflows.pw.relax import PwRelaxWorkChain
 from aiida_mobility.workflows.ph.base import PhBaseWorkChain
+from aiida_mobility.workflows.cache import (
+    add_cache_inputs,
+    invalidate_cache,
+    report_cache_statistics,
+    run_calcfunction_cached,
+    submit_cached,
+)
 from aiida_quantumespresso.workflows.q2r.base import Q2rBaseWorkChain
 from aiida_quantumespresso.workflows.matdyn.base import MatdynBaseWorkChain
 
@@ -56,7 +63,7 @@ class PhBandsWorkChain(WorkChain):
         spec.expose_inputs(
             PwRelaxWorkChain,
             namespace="relax",
-            exclude=("clean_workdir", "structure"),
+            exclude=("clean_workdir", "structure", "use_cache", "bypass_cache"),
             namespace_options={
                 "required": False,
                 "populate_defaults": False,
@@ -141,6 +148,7 @@ class PhBandsWorkChain(WorkChain):
             default=lambda: Bool(False),
             help="If `True`, work directories of all called calculation will be cleaned at the end of execution.",
         )
+        add_cache_inputs(spec)
         spec.inputs.validator = validate_inputs
         spec.outline(
             cls.setup,
@@ -319,8 +327,13 @@ class PhBandsWorkChain(WorkChain):
 
         inputs.metadata.call_link_label = "relax"
         inputs.structure = self.ctx.current_structure
+        inputs.use_cache = self.inputs.use_cache
+        inputs.bypass_cache = self.inputs.bypass_cache
 
-        running = self.submit(PwRelaxWorkChain, **self.ctx.relax_inputs)
+        running, cached = submit_cached(self, PwRelaxWorkChain, inputs, "relax")
+        if cached:
+            self.ctx.workchain_relax = running
+            return
 
         self.report("launching PwRelaxWorkChain<{}>".format(running.pk))
 
@@ -364,7 +377,9 @@ class PhBandsWorkChain(WorkChain):
             "reference_distance": kpoints_distance_for_bands,
             "metadata": {"call_link_label": "seekpath_structure_analysis"},
         }
-        result = seekpath_structure_analysis(**args)
+        result = run_calcfunction_cached(
+            self, seekpath_structure_analysis, **args
+        )
 
         self.ctx.current_structure = result["primitive_structure"]
         # ADD BY PY
@@ -402,7 +417,11 @@ class PhBandsWorkChain(WorkChain):
         """If the 'scf_node' or 'ph_node' input was specified, we skip scf calc."""
         if "scf_node" in self.inputs:
             scf = load_node(self.inputs.scf_node.value)
-            self.ctx.current_structure = scf.outputs.output_structure
+            if "output_structure" in scf.outputs:
+                self.ctx.current_structure = scf.outputs.output_structure
+            elif "pw__structure" in scf.inputs:
+                # a scf `PwBaseWorkChain` does not output the structure
+                self.ctx.current_structure = scf.inputs.pw__structure
             self.ctx.current_folder = scf.outputs.remote_folder
             self.ctx.workchain_scf = scf
             self.report(
@@ -456,7 +475,10 @@ class PhBandsWorkChain(WorkChain):
 
         inputs = prepare_process_inputs(PwBaseWorkChain, inputs)
         self.ctx.scf_inputs = inputs
-        running = self.submit(PwBaseWorkChain, **inputs)
+        running, cached = submit_cached(self, PwBaseWorkChain, inputs, "scf")
+        if cached:
+            self.ctx.workchain_scf = running
+            return
 
         self.report(
             "launching PwBaseWorkChain<{}> in {} mode".format(running.pk, "scf")
@@ -516,7 +538,10 @@ class PhBandsWorkChain(WorkChain):
 
         inputs = prepare_process_inputs(PhBaseWorkChain, inputs)
         self.ctx.ph_inputs = inputs
-        running = self.submit(PhBaseWorkChain, **inputs)
+        running, cached = submit_cached(self, PhBaseWorkChain, inputs, "ph")
+        if cached:
+            self.ctx.workchain_ph = running
+            return
 
         self.report(
             "launching PhBaseWorkChain<{}> in {} mode".format(running.pk, "ph")
@@ -588,7 +613,10 @@ class PhBandsWorkChain(WorkChain):
         inputs.q2r.parent_folder = self.ctx.current_folder
 
         inputs = prepare_process_inputs(Q2rBaseWorkChain, inputs)
-        running = self.submit(Q2rBaseWorkChain, **inputs)
+        running, cached = submit_cached(self, Q2rBaseWorkChain, inputs, "q2r")
+        if cached:
+            self.ctx.workchain_q2r = running
+            return
 
         self.report(
             "launching Q2rBaseWorkChain<{}> in {} mode".format(
@@ -621,7 +649,12 @@ class PhBandsWorkChain(WorkChain):
         inputs.matdyn.kpoints = self.ctx.explicit_kpoints
 
         inputs = prepare_process_inputs(MatdynBaseWorkChain, inputs)
-        running = self.submit(MatdynBaseWorkChain, **inputs)
+        running, cached = submit_cached(
+            self, MatdynBaseWorkChain, inputs, "matdyn"
+        )
+        if cached:
+            self.ctx.workchain_matdyn = running
+            return
 
         self.report(
             "launching MatdynBaseWorkChain<{}> in {} mode".format(
@@ -651,6 +684,7 @@ class PhBandsWorkChain(WorkChain):
             return self.exit_codes.ERROR_SUB_PROCESS_FAILED_PH
 
         self.report("workchain succesfully completed")
+        report_cache_statistics(self)
         try:
             self.ctx.workchain_scf
         except Exception:
@@ -710,3 +744,4 @@ class PhBandsWorkChain(WorkChain):
                     " ".join(map(str, cleaned_calcs))
                 )
             )
+            invalidate_cache(self.node)
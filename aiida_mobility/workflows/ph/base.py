@@ -1,8 +1,15 @@
 # -*- coding: utf-8 -*-
 """Workchain to run a Quantum ESPRESSO ph.x calculation with automated error handling and restarts."""
+import os
+from copy import deepcopy
+
 from aiida import orm
 from aiida.common import AttributeDict
 from aiida.engine import (
+    ToContext,
+    append_,
+    calcfunction,
+    if_,
     while_,
     process_handler,
     ProcessHandlerReport,
@@ -39,15 +46,28 @@ class PhBaseWorkChain(BaseRestartWorkChain):
         spec.input('parent_scf_node_mode', valid_type=orm.Bool, default=lambda: orm.Bool(False), help='The calculation mode of parent node: scf or ph.')
         spec.input('only_initialization', valid_type=orm.Bool,
                    default=lambda: orm.Bool(False))
+        spec.input('parallelize_qpoints', valid_type=orm.Bool, default=lambda: orm.Bool(False),
+                   help='Run the irreducible q-points as concurrent `PhCalculation`s after an initialization run. '
+                        'The `ph.parent_folder` must be the folder of the scf calculation, which is shared through symlinks.')
+        spec.input('qpoints_per_job', valid_type=orm.Int, default=lambda: orm.Int(1),
+                   help='Number of irreducible q-points computed by each `PhCalculation` if `parallelize_qpoints` is True.')
 
         spec.outline(
             cls.setup,
             cls.validate_parameters,
             cls.validate_resources,
-            while_(cls.should_run_process)(
-                cls.prepare_process,
-                cls.run_process,
-                cls.inspect_process,
+            if_(cls.should_parallelize_qpoints)(
+                cls.run_init,
+                cls.inspect_init,
+                cls.run_qpoints,
+                cls.inspect_qpoints,
+                cls.gather_qpoints,
+            ).else_(
+                while_(cls.should_run_process)(
+                    cls.prepare_process,
+                    cls.run_process,
+                    cls.inspect_process,
+                ),
             ),
             cls.results,
         )
@@ -59,6 +79,8 @@ class PhBaseWorkChain(BaseRestartWorkChain):
                        message='The calculation failed with an unrecoverable error.')
         spec.exit_code(301, 'ERROR_IMAGINARY_FREQUENCIES',
                        message='The calculation failed with an imaginary frequencies error.')
+        spec.exit_code(403, 'ERROR_SUB_PROCESS_FAILED_QPOINTS',
+                       message='The initialization or one of the concurrent q-points `PhCalculation`s failed.')
 
         # yapf: enable
 
@@ -151,6 +173,160 @@ class PhBaseWorkChain(BaseRestartWorkChain):
                 self.ctx.restart_calc.outputs.remote_folder
             )
 
+    def should_parallelize_qpoints(self):
+        """Return whether the irreducible q-points are computed by concurrent `PhCalculation`s."""
+        return self.inputs.parallelize_qpoints.value
+
+    def _prepare_qpoints_inputs(self, start_q=None, last_q=None):
+        """Return the inputs of a `PhCalculation` computing the q-points from `start_q` to `last_q`.
+
+        All the calculations start from the scf folder, so `recover` is switched off.
+        If `start_q` is None, the inputs of the initialization run are returned.
+        """
+        inputs = AttributeDict(self.ctx.inputs)
+        inputs.parameters = deepcopy(self.ctx.inputs.parameters)
+        inputs.settings = deepcopy(self.ctx.inputs.settings)
+        inputs.metadata = AttributeDict(self.ctx.inputs.get("metadata", {}))
+
+        inputph = inputs.parameters["INPUTPH"]
+        inputph["recover"] = False
+        inputph.pop("start_q", None)
+        inputph.pop("last_q", None)
+        inputs.settings["PARENT_FOLDER_SYMLINK"] = True
+        if start_q is None:
+            inputs.settings["ONLY_INITIALIZATION"] = True
+            inputs.metadata["call_link_label"] = "init"
+        else:
+            inputs.settings.pop("ONLY_INITIALIZATION", None)
+            inputph["start_q"] = start_q
+            inputph["last_q"] = last_q
+            inputs.metadata["call_link_label"] = f"qpoints_{start_q:03d}_{last_q:03d}"
+
+        return self._wrap_bare_dict_inputs(PhCalculation.spec().inputs, inputs)
+
+    def run_init(self):
+        """Run the initialization of ph.x to get the irreducible q-points and the patterns of all of them."""
+        running = self.submit(PhCalculation, **self._prepare_qpoints_inputs())
+        self.report(f"launching initialization PhCalculation<{running.pk}>")
+        return ToContext(init_calc=running)
+
+    def inspect_init(self):
+        """Get the number of irreducible q-points from the initialization run.
+
+        ph.x stops as if the walltime was reached when the `.EXIT` file is found, so that exit code is accepted.
+        """
+        node = self.ctx.init_calc
+        exit_status_ok = (0, PhCalculation.exit_codes.ERROR_OUT_OF_WALLTIME.status)
+        number_of_qpoints = None
+        if node.is_finished and node.exit_status in exit_status_ok:
+            number_of_qpoints = node.outputs.output_parameters.get_dict().get("number_of_qpoints", None)
+
+        if number_of_qpoints is None:
+            self.report(f"initialization PhCalculation<{node.pk}> failed with exit status {node.exit_status}")
+            return self.exit_codes.ERROR_SUB_PROCESS_FAILED_QPOINTS
+
+        self.ctx.max_qpoint = number_of_qpoints
+
+    def run_qpoints(self):
+        """Submit all the irreducible q-points at once, binned in groups of `qpoints_per_job`."""
+        qpoints_per_job = max(1, self.inputs.qpoints_per_job.value)
+        for start_q in range(1, self.ctx.max_qpoint + 1, qpoints_per_job):
+            last_q = min(start_q + qpoints_per_job - 1, self.ctx.max_qpoint)
+            running = self.submit(PhCalculation, **self._prepare_qpoints_inputs(start_q, last_q))
+            self.report(f"launching PhCalculation<{running.pk}> for q-points {start_q} to {last_q}")
+            self.to_context(qpoints_calcs=append_(running))
+
+    def inspect_qpoints(self):
+        """Verify that all the q-points calculations finished successfully and check imaginary frequencies."""
+        failed = [node for node in self.ctx.qpoints_calcs if not node.is_finished_ok]
+        if failed:
+            for node in failed:
+                self.report_error_handled(node, "q-points calculation failed")
+            return self.exit_codes.ERROR_SUB_PROCESS_FAILED_QPOINTS
+
+        if not self.ctx.check_imaginary_frequencies:
+            return
+
+        for node in self.ctx.qpoints_calcs:
+            output_parameters = node.outputs.output_parameters.get_dict()
+            inputph = node.inputs.parameters.get_dict()["INPUTPH"]
+            for qpoint in range(inputph["start_q"], inputph["last_q"] + 1):
+                dynamical_matrix = output_parameters.get(f"dynamical_matrix_{qpoint}", None) or {}
+                frequencies = dynamical_matrix.get("frequencies", None)
+                if frequencies is not None and frequencies[0] <= self.ctx.frequency_threshold:
+                    self.report_error_handled(
+                        node,
+                        f"imaginary frequencies found at point {qpoint}, aborting...",
+                    )
+                    self.ctx.current_qpoint = qpoint
+                    self.out("current_qpoint", orm.Int(qpoint).store())
+                    return self.exit_codes.ERROR_IMAGINARY_FREQUENCIES
+
+    def gather_qpoints(self):
+        """Gather the outputs of all q-points calculations into the remote folder of the initialization run.
+
+        The `_ph0/{prefix}.q_*` folders and the dvscf files are symlinked, the xml files of `{prefix}.phsave` and the
+        dynamical matrices are copied, unless they already exist. The resulting folder can be used as the parent of a
+        `PhRecoverCalculation` or as the `ph_folder` of a `QE2PertCalculation`.
+        """
+        prefix = PhCalculation._PREFIX
+        remote_folder = self.ctx.init_calc.outputs.remote_folder
+        target = remote_folder.get_remote_path()
+        target_ph0 = os.path.join(target, PhCalculation._OUTPUT_SUBFOLDER, "_ph0")
+        target_phsave = os.path.join(target_ph0, f"{prefix}.phsave")
+        target_dyn = os.path.join(target, PhCalculation._FOLDER_DYNAMICAL_MATRIX)
+
+        with remote_folder.get_authinfo().get_transport() as transport:
+            transport.makedirs(target_phsave, ignore_existing=True)
+            transport.makedirs(target_dyn, ignore_existing=True)
+            existing_phsave = set(transport.listdir(target_phsave))
+            existing_dyn = set(transport.listdir(target_dyn))
+            existing_ph0 = set(transport.listdir(target_ph0))
+
+            for node in self.ctx.qpoints_calcs:
+                source = node.outputs.remote_folder.get_remote_path()
+                source_ph0 = os.path.join(source, PhCalculation._OUTPUT_SUBFOLDER, "_ph0")
+                source_phsave = os.path.join(source_ph0, f"{prefix}.phsave")
+                source_dyn = os.path.join(source, PhCalculation._FOLDER_DYNAMICAL_MATRIX)
+
+                for name in transport.listdir(source_ph0):
+                    if name in existing_ph0:
+                        continue
+                    if name.startswith(f"{prefix}.q_") or name.startswith(f"{prefix}.dvscf"):
+                        transport.symlink(os.path.join(source_ph0, name), os.path.join(target_ph0, name))
+                        existing_ph0.add(name)
+                for name in transport.listdir(source_phsave):
+                    if name not in existing_phsave:
+                        transport.copyfile(os.path.join(source_phsave, name), os.path.join(target_phsave, name))
+                        existing_phsave.add(name)
+                for name in transport.listdir(source_dyn):
+                    if name not in existing_dyn:
+                        transport.copyfile(os.path.join(source_dyn, name), os.path.join(target_dyn, name))
+                        existing_dyn.add(name)
+
+        self.report(
+            f"gathered {self.ctx.max_qpoint} q-points of {len(self.ctx.qpoints_calcs)} PhCalculations "
+            f"into the remote folder of PhCalculation<{self.ctx.init_calc.pk}>"
+        )
+
+    def results(self):
+        """Attach the outputs of the last calculation, or the gathered outputs if the q-points are parallelized."""
+        if not self.should_parallelize_qpoints():
+            return super().results()
+
+        output_parameters = merge_output_parameters(
+            init=self.ctx.init_calc.outputs.output_parameters,
+            **{
+                f"qpoints_{index:03d}": node.outputs.output_parameters
+                for index, node in enumerate(self.ctx.qpoints_calcs)
+            },
+            metadata={"call_link_label": "merge_output_parameters"},
+        )
+        self.out("output_parameters", output_parameters)
+        self.out("remote_folder", self.ctx.init_calc.outputs.remote_folder)
+        self.out("retrieved", self.ctx.init_calc.outputs.retrieved)
+        self.report(f"work chain completed after {len(self.ctx.qpoints_calcs)} concurrent q-points calculations")
+
     def report_error_handled(self, calculation, action):
         """Report an action taken for a calculation that has failed.
 
@@ -326,3 +502,17 @@ class PhBaseWorkChain(BaseRestartWorkChain):
         action = f"reduced alpha_mix from {alpha_mix} to {alpha_mix_new} and restarting"
         self.report_error_handled(node, action)
         return ProcessHandlerReport(True)
+
+
+@calcfunction
+def merge_output_parameters(**kwargs):
+    """Merge the `output_parameters` of the concurrent q-points calculations into the ones of the initialization run.
+
+    The keys of the initialization run, e.g. `number_of_qpoints`, take precedence.
+    """
+    init = kwargs.pop("init").get_dict()
+    merged = {}
+    for label in sorted(kwargs):
+        merged.update(kwargs[label].get_dict())
+    merged.update(init)
+    return orm.Dict(dict=merged)
@@ -35,6 +35,13 @@ from aiida_quantumespresso.utils.resources import (
 from aiida_quantumespresso.workflows.protocols.utils import ProtocolMixin
 
 from aiida_mobility.utils import create_kpoints
+from aiida_mobility.utils.resources import (
+    estimate_resources,
+    get_number_of_kpoints,
+    get_resource_model,
+    record_resource_features,
+)
+from aiida_mobility.utils.upf import get_number_of_electrons
 
 PwCalculation = CalculationFactory("quantumespresso.pw")
 SsspFamily = GroupFactory("pseudo.family.sssp")
@@ -375,6 +382,43 @@ class PwBaseWorkChain(ProtocolMixin, BaseRestartWorkChain):
                 )
 
             self.set_max_seconds(max_wallclock_seconds)
+            self.check_resources(
+                num_machines
+                * self.ctx.inputs.metadata.options["resources"].get(
+                    "num_mpiprocs_per_machine", 1
+                ),
+                max_wallclock_seconds,
+            )
+
+    def check_resources(self, num_procs, max_wallclock_seconds):
+        """Report if the requested cpu time is below the one predicted by the resource model.
+
+        Only a warning, the model may be off for unusual systems.
+        """
+        try:
+            parameters = self.ctx.inputs.parameters
+            structure = self.ctx.inputs.structure
+            features = {
+                "nat": len(structure.sites),
+                "nelec": get_number_of_electrons(
+                    structure, self.ctx.inputs.pseudos
+                ),
+                "ecutwfc": parameters["SYSTEM"]["ecutwfc"],
+                "nkpts": get_number_of_kpoints(self.ctx.inputs.kpoints),
+            }
+            estimate = estimate_resources(
+                get_resource_model("pw"), features, num_machines=1
+            )
+        except Exception as exception:  # pylint: disable=broad-except
+            self.report(f"could not estimate the resources: {exception}")
+            return
+
+        self.ctx.resource_features = {"pw": features}
+        if num_procs * max_wallclock_seconds < estimate.cpu_time:
+            self.report(
+                f"the requested {num_procs} processes for {max_wallclock_seconds} s are likely too few, "
+                f"the estimated cpu time is {estimate.cpu_time:.0f} s"
+            )
 
     def set_max_seconds(self, max_wallclock_seconds):
         """Set the `max_seconds` to a fraction of `max_wallclock_seconds` option to prevent out-of-walltime problems.
@@ -538,6 +582,12 @@ class PwBaseWorkChain(ProtocolMixin, BaseRestartWorkChain):
             ] = "from_scratch"
             self.ctx.inputs.pop("parent_folder", None)
 
+    def on_terminated(self):
+        """Record the features of the calculations for the fits of the resource models."""
+        super().on_terminated()
+        if "resource_features" in self.ctx:
+            record_resource_features(self.node, self.ctx.resource_features)
+
     def report_error_handled(self, calculation, action):
         """Report an action taken for a calculation that has failed.
 
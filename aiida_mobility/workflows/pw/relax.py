@@ -11,6 +11,12 @@ from aiida_quantumespresso.utils.mapping import prepare_process_inputs
 
 from aiida_quantumespresso.workflows.protocols.utils import ProtocolMixin
 from aiida_mobility.workflows.pw.base import PwBaseWorkChain
+from aiida_mobility.workflows.cache import (
+    add_cache_inputs,
+    invalidate_cache,
+    report_cache_statistics,
+    submit_cached,
+)
 
 PwCalculation = CalculationFactory("quantumespresso.pw")
 
@@ -86,6 +92,7 @@ class PwRelaxWorkChain(ProtocolMixin, WorkChain):
         # MODIFIED
         spec.input('system_2d', valid_type=orm.Bool,
                    default=lambda: orm.Bool(False), help='Set the mesh to [x,x,1]')
+        add_cache_inputs(spec)
         spec.inputs.validator = validate_inputs
         spec.outline(
             cls.setup,
@@ -331,7 +338,12 @@ class PwRelaxWorkChain(ProtocolMixin, WorkChain):
 
         inputs = prepare_process_inputs(PwBaseWorkChain, inputs)
         inputs["system_2d"] = self.inputs.system_2d
-        running = self.submit(PwBaseWorkChain, **inputs)
+        running, cached = submit_cached(
+            self, PwBaseWorkChain, inputs, f"relax iteration {self.ctx.iteration}"
+        )
+        if cached:
+            self.ctx.setdefault("workchains", []).append(running)
+            return
 
         self.report(f"launching PwBaseWorkChain<{running.pk}>")
 
@@ -435,7 +447,12 @@ class PwRelaxWorkChain(ProtocolMixin, WorkChain):
             ] = self.ctx.current_number_of_bands
 
         inputs = prepare_process_inputs(PwBaseWorkChain, inputs)
-        running = self.submit(PwBaseWorkChain, **inputs)
+        running, cached = submit_cached(
+            self, PwBaseWorkChain, inputs, "final scf"
+        )
+        if cached:
+            self.ctx.workchain_scf = running
+            return
 
         self.report(f"launching PwBaseWorkChain<{running.pk}> for final scf")
 
@@ -453,6 +470,7 @@ class PwRelaxWorkChain(ProtocolMixin, WorkChain):
 
     def results(self):
         """Attach the output parameters and structure of the last workchain to the outputs."""
+        report_cache_statistics(self)
         if (
             self.ctx.is_converged
             and self.ctx.iteration
@@ -509,6 +527,7 @@ class PwRelaxWorkChain(ProtocolMixin, WorkChain):
             self.report(
                 f"cleaned remote folders of calculations: {' '.join(map(str, cleaned_calcs))}"
             )
+            invalidate_cache(self.node)
 
     @staticmethod
     def _fix_atomic_positions(structure, settings):
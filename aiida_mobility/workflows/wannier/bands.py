@@ -1,10 +1,17 @@
 from copy import deepcopy
+import numpy as np
 from aiida import orm
 from aiida.common import AttributeDict, LinkType
 from aiida.engine import WorkChain, ToContext, if_
 from aiida.orm.nodes.data.upf import get_pseudos_from_structure
 from aiida_quantumespresso.utils.mapping import prepare_process_inputs
 from aiida_mobility.workflows.pw.base import PwBaseWorkChain
+from aiida_mobility.workflows.cache import (
+    add_cache_inputs,
+    report_cache_statistics,
+    run_calcfunction_cached,
+    submit_cached,
+)
 
 from aiida_quantumespresso.calculations.functions.seekpath_structure_analysis import (
     seekpath_structure_analysis,
@@ -19,8 +26,12 @@ from aiida_mobility.utils.upf import (
     get_wannier_number_of_bands,
     _load_pseudo_metadata,
 )
-from aiida_mobility.calculations.functions.kmesh import (
-    convert_kpoints_mesh_to_list,
+from aiida_mobility.calculations.functions.kmesh import get_explicit_kpoints
+from aiida_mobility.utils.resources import (
+    get_kpoints_mesh_size,
+    get_number_of_kpoints,
+    get_resource_options,
+    record_resource_features,
 )
 
 
@@ -206,6 +217,13 @@ class Wannier90BandsWorkChain(WorkChain):
             required=False,
             help="Other parameters of scf.",
         )
+        spec.input(
+            "scf_node",
+            valid_type=orm.Int,
+            required=False,
+            help="The pk of a finished scf `PwBaseWorkChain` to reuse instead of running the scf step, not supported with `use_opengrid`.",
+        )
+        add_cache_inputs(spec)
         ########################################################################
 
         spec.output(
@@ -378,6 +396,9 @@ class Wannier90BandsWorkChain(WorkChain):
                 self.inputs.codes.opengrid
             except AttributeError:
                 return self.exit_codes.ERROR_INVALID_INPUT_OPENGRID
+            if "scf_node" in self.inputs:
+                self.report("`scf_node` is not supported with open_grid.x")
+                return self.exit_codes.ERROR_INVALID_INPUT_OPENGRID
             self.report("open_grid.x will be used to unfold kmesh")
 
         self.ctx.current_structure = self.inputs.structure
@@ -397,7 +418,9 @@ class Wannier90BandsWorkChain(WorkChain):
             "reference_distance": kpoints_distance_for_bands,
             "metadata": {"call_link_label": "seekpath_structure_analysis"},
         }
-        result = seekpath_structure_analysis(**args)
+        result = run_calcfunction_cached(
+            self, seekpath_structure_analysis, **args
+        )
 
         # ADD BY PY
         ########################################################################
@@ -429,20 +452,6 @@ class Wannier90BandsWorkChain(WorkChain):
         """setup input parameters of each calculations,
         since there are some dependencies between input parameters,
         we store them in context variables."""
-        if "options" in self.inputs:
-            self.ctx.options = self.inputs.options.get_dict()
-        else:
-            self.ctx.options = get_default_options(
-                self.ctx.current_structure, with_mpi=True
-            )
-            # or manually assign parallelizations here
-            # self.ctx.options = get_manual_options()
-        self.report(
-            "number of machines {} auto-set according to number of atoms".format(
-                self.ctx.options["resources"]["num_machines"]
-            )
-        )
-
         # save variables to ctx because they maybe used in several difference methods
         args = {
             "structure": self.ctx.current_structure,
@@ -470,6 +479,7 @@ class Wannier90BandsWorkChain(WorkChain):
         self.setup_projwfc_parameters()
         self.setup_pw2wannier90_parameters()
         self.setup_wannier90_parameters()
+        self.setup_options()
 
     def setup_scf_parameters(self):
         """Set up the default input parameters required for the `PwBandsWorkChain`, and store it in self.ctx"""
@@ -669,6 +679,73 @@ class Wannier90BandsWorkChain(WorkChain):
         wannier90_parameters = orm.Dict(dict=parameters)
         self.ctx.wannier90_parameters = wannier90_parameters
 
+    def get_nscf_number_of_kpoints(self):
+        """Number of kpoints of the nscf mesh, without creating the `KpointsData`."""
+        if "kpoints" in self.inputs:
+            return get_number_of_kpoints(self.inputs.kpoints)
+        mesh = get_kpoints_mesh_size(
+            self.ctx.current_structure.cell,
+            self.ctx.protocol["kpoints_mesh_density"],
+        )
+        if self.inputs.system_2d:
+            # same as `create_kpoints`, the longest axis is the vacuum direction
+            mesh[int(np.argmax(self.ctx.current_structure.cell_lengths))] = 1
+        return int(np.prod(mesh))
+
+    def setup_options(self):
+        """Set the `metadata.options` of pw.x (also used for projwfc.x), pw2wannier90.x and wannier90.x.
+
+        If no `options` input, the resources are estimated by the resource models fitted
+        on the timings of earlier calculations, see `aiida_mobility.utils.resources`.
+        """
+        if "options" in self.inputs:
+            self.ctx.options = self.inputs.options.get_dict()
+            self.ctx.pw2wannier90_options = self.ctx.options
+            self.ctx.wannier90_options = self.ctx.options
+            self.ctx.nscf_npool = None
+            return
+
+        nkpts = self.get_nscf_number_of_kpoints()
+        self.ctx.resource_features = {
+            "pw": {
+                "nat": len(self.ctx.current_structure.sites),
+                "nelec": self.ctx.number_of_electrons,
+                "ecutwfc": self.ctx.scf_parameters["SYSTEM"]["ecutwfc"],
+                "nkpts": nkpts,
+            },
+            "pw2wannier90": {
+                "nat": len(self.ctx.current_structure.sites),
+                "ecutwfc": self.ctx.scf_parameters["SYSTEM"]["ecutwfc"],
+                "nkpts": nkpts,
+                "nbnd": self.ctx.nscf_nbnd,
+                "num_wann": self.ctx.wannier90_parameters["num_wann"],
+            },
+            "wannier90": {
+                "nkpts": nkpts,
+                "nbnd": self.ctx.nscf_nbnd,
+                "num_wann": self.ctx.wannier90_parameters["num_wann"],
+            },
+        }
+        codes = {
+            "pw": self.inputs.codes.pw,
+            "pw2wannier90": self.inputs.codes.pw2wannier90,
+            "wannier90": self.inputs.codes.wannier90,
+        }
+        options = {}
+        for code_type, features in self.ctx.resource_features.items():
+            options[code_type], estimate = get_resource_options(
+                code_type, features, code=codes[code_type]
+            )
+            if code_type == "pw":
+                self.ctx.nscf_npool = estimate.npool
+            self.report(
+                f"{code_type}: {estimate.num_machines} machines and walltime {estimate.max_wallclock_seconds} s "
+                f"estimated for {estimate.cpu_time:.0f} core seconds and {estimate.memory:.0f} MB"
+            )
+        self.ctx.options = options["pw"]
+        self.ctx.pw2wannier90_options = options["pw2wannier90"]
+        self.ctx.wannier90_options = options["wannier90"]
+
     def prepare_scf_inputs(self):
         """Return the dictionary of inputs to be used as the basis for each `PwBaseWorkChain`."""
         inputs = AttributeDict(
@@ -742,19 +819,23 @@ class Wannier90BandsWorkChain(WorkChain):
             # maybe different between QE & Wannier90. Here we explicitly
             # generate a list of kpoint to avoid discrepencies between
             # QE's & Wannier90's automatically generated kpoints.
-            args = {
-                "kmesh": self.ctx.nscf_kpoints,
-                "metadata": {"call_link_label": "convert_kpoints_mesh_to_list"},
-            }
-            inputs.kpoints = convert_kpoints_mesh_to_list(**args)
+            # An identical mesh converted before is reused instead of adding a new node.
+            inputs.kpoints = get_explicit_kpoints(
+                self.ctx.nscf_kpoints,
+                metadata={"call_link_label": "convert_kpoints_mesh_to_list"},
+            )
             # store it for setting wannier90 mp_grid
             self.ctx.nscf_explicit_kpoints = inputs.kpoints
 
         # ADD BY PY
         ########################################################################
         inputs["system_2d"] = self.inputs.system_2d
-        inputs.pw.settings = orm.Dict(dict={"PARENT_FOLDER_SYMLINK": True})
+        settings = {"PARENT_FOLDER_SYMLINK": True}
         ########################################################################
+        # the nscf kpoints are the full mesh only without open_grid.x
+        if self.ctx.nscf_npool is not None and not self.inputs.use_opengrid:
+            settings["CMDLINE"] = ["-npool", str(self.ctx.nscf_npool)]
+        inputs.pw.settings = orm.Dict(dict=settings)
         inputs.pw.metadata.options = self.ctx.options
         return inputs
 
@@ -785,7 +866,7 @@ class Wannier90BandsWorkChain(WorkChain):
         ########################################################################
         inputs.settings = orm.Dict(dict={"PARENT_FOLDER_SYMLINK": True})
         ########################################################################
-        inputs.metadata.options = self.ctx.options
+        inputs.metadata.options = self.ctx.pw2wannier90_options
         return inputs
 
     def prepare_wannier90_inputs(self):
@@ -828,7 +909,7 @@ class Wannier90BandsWorkChain(WorkChain):
             # ]
 
         inputs["settings"] = orm.Dict(dict=settings)
-        inputs.metadata.options = self.ctx.options
+        inputs.metadata.options = self.ctx.wannier90_options
         return inputs
 
     def prepare_opengrid_inputs(self):
@@ -854,6 +935,8 @@ class Wannier90BandsWorkChain(WorkChain):
             }
         )
         inputs.metadata = {"call_link_label": "wannier"}
+        if "scf_node" in self.inputs:
+            inputs.scf_node = self.inputs.scf_node
 
         if self.inputs.use_opengrid:
             from aiida_mobility.workflows.opengrid import (
@@ -862,9 +945,13 @@ class Wannier90BandsWorkChain(WorkChain):
 
             inputs["opengrid"] = {"code": self.inputs.codes.opengrid}
             inputs["opengrid_only_scf"] = self.inputs.opengrid_only_scf
-            running = self.submit(Wannier90OpengridWorkChain, **inputs)
+            process_class = Wannier90OpengridWorkChain
         else:
-            running = self.submit(Wannier90WorkChain, **inputs)
+            process_class = Wannier90WorkChain
+        running, cached = submit_cached(self, process_class, inputs, "wannier")
+        if cached:
+            self.ctx.workchain_wannier = running
+            return
         self.report(f"launching {running.process_label}<{running.pk}>")
 
         return ToContext(workchain_wannier=running)
@@ -943,7 +1030,10 @@ class Wannier90BandsWorkChain(WorkChain):
         """run a DFT bands calculation for comparison."""
         inputs = self.prepare_bands_inputs()
         inputs = prepare_process_inputs(PwBaseWorkChain, inputs)
-        running = self.submit(PwBaseWorkChain, **inputs)
+        running, cached = submit_cached(self, PwBaseWorkChain, inputs, "bands")
+        if cached:
+            self.ctx.workchain_bands = running
+            return
         self.report(
             f'launching {running.process_label}<{running.pk}> in {"bands"} mode'
         )
@@ -1008,46 +1098,14 @@ class Wannier90BandsWorkChain(WorkChain):
             self.out("dft_bands", dft_bands)
             self.report(f"DFT bands pk: {dft_bands.pk}")
 
+        report_cache_statistics(self)
         self.report(f"{self.get_name()} successfully completed")
 
-
-def get_default_options(structure, with_mpi=False):
-    """Increase wallclock to 5 hour, use mpi, set number of machines according to
-    number of atoms.
-
-    :param with_mpi: [description], defaults to False
-    :type with_mpi: bool, optional
-    :return: [description]
-    :rtype: [type]
-    """
-
-    def estimate_num_machines(structure):
-        """
-        1 <= num_atoms <= 10 -> 1 machine
-        11 <= num_atoms <= 20 -> 2 machine
-        ...
-
-        :param structure: crystal structure
-        :type structure: aiida.orm.StructureData
-        :return: estimated number of machines based on number of atoms
-        :rtype: int
-        """
-        from math import ceil
-
-        num_atoms = len(structure.sites)
-        return ceil(num_atoms / 10)
-
-    from aiida_quantumespresso.utils.resources import (
-        get_default_options as get_opt,
-    )
-
-    num_machines = estimate_num_machines(structure)
-    opt = get_opt(
-        max_num_machines=num_machines,
-        max_wallclock_seconds=3600 * 5,  # 5 hours
-        with_mpi=with_mpi,
-    )
-    return opt
+    def on_terminated(self):
+        """Record the features of the calculations for the fits of the resource models."""
+        super().on_terminated()
+        if "resource_features" in self.ctx:
+            record_resource_features(self.node, self.ctx.resource_features)
 
 
 def validate_protocol(protocol_dict, ctx):
@@ -54,6 +54,12 @@ class Wannier90WorkChain(WorkChain):
             default=lambda: orm.Dict(dict={"sigma_factor": 3}),
             help="Used only if `auto_projections` is in the wannier input parameters. Contains one keyword: sigma_factor",
         )
+        spec.input(
+            "scf_node",
+            valid_type=orm.Int,
+            required=False,
+            help="The pk of a finished scf `PwBaseWorkChain`, if specified the scf step is skipped and its remote folder is used.",
+        )
         spec.expose_inputs(
             PwRelaxWorkChain,
             namespace="relax",
@@ -109,8 +115,7 @@ class Wannier90WorkChain(WorkChain):
         spec.outline(
             cls.setup,
             if_(cls.should_run_relax)(cls.run_relax, cls.inspect_relax),
-            cls.run_scf,
-            cls.inspect_scf,
+            if_(cls.should_run_scf)(cls.run_scf, cls.inspect_scf),
             cls.run_nscf,
             cls.inspect_nscf,
             if_(cls.should_run_projwfc)(cls.run_projwfc, cls.inspect_projwfc),
@@ -235,6 +240,19 @@ class Wannier90WorkChain(WorkChain):
 
         self.ctx.current_structure = workchain.outputs.output_structure
 
+    def should_run_scf(self):
+        """If the 'scf_node' input was specified, we reuse the finished scf and skip the scf step."""
+        if "scf_node" not in self.inputs:
+            return True
+
+        workchain = orm.load_node(self.inputs.scf_node.value)
+        self.ctx.workchain_scf = workchain
+        self.ctx.current_folder = workchain.outputs.remote_folder
+        self.report(
+            f"skip scf step, reuse {workchain.process_label}<{workchain.pk}>"
+        )
+        return False
+
     def run_scf(self):
         """Run the PwBaseWorkChain in scf mode on the primitive cell of (optionally relaxed) input structure."""
         inputs = AttributeDict(
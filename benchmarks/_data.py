@@ -0,0 +1,174 @@
+"""Synthetic inputs of the benchmarks, generated on the fly so that no AiiDA profile or network is needed."""
+import numpy as np
+
+# number of points of the radial mesh of the generated UPF files, a typical PAW file has ~1200
+UPF_MESH_SIZE = 1200
+
+
+def _format_array(values, per_line=4):
+    lines = []
+    for start in range(0, len(values), per_line):
+        lines.append(' '.join(f'{value:.14E}' for value in values[start:start + per_line]))
+    return '\n'.join(lines)
+
+
+def _numeric_block(tag, size, rng, attributes=''):
+    return f'<{tag} type="real" size="{size}" columns="4"{attributes}>\n{_format_array(rng.random(size))}\n</{tag}>\n'
+
+
+def make_upf(element='Ga', soc=False, num_beta=6, mesh_size=UPF_MESH_SIZE, seed=0):
+    """Generate the content of a UPF v2 file shaped like a SSSP PAW (`soc=False`)
+    or a pseudo-dojo fully relativistic (`soc=True`) pseudo, a few MB in size.
+
+    The header and the orbital blocks are realistic, the numerical data is random.
+    """
+    rng = np.random.default_rng(seed)
+    # (label, n, l, occupation) of the pseudo wavefunctions
+    chis = [('4S', 1, 0, 2.0), ('4P', 2, 1, 1.0), ('3D', 3, 2, 10.0)]
+    parts = [
+        '<UPF version="2.0.1">\n',
+        '<PP_INFO>\n Generated by a benchmark of aiida-mobility\n',
+        'PAW dataset\n' * 200,
+        '</PP_INFO>\n',
+        '<!-- END OF HUMAN READABLE SECTION -->\n',
+        '<PP_HEADER\n'
+        '   generated="Generated by a benchmark"\n'
+        '   author="anonymous"\n'
+        f'   element="{element}"\n'
+        '   pseudo_type="PAW"\n'
+        f'   relativistic="{"full" if soc else "scalar"}"\n'
+        '   is_ultrasoft="T"\n'
+        '   is_paw="T"\n'
+        f'   has_so="{"T" if soc else "F"}"\n'
+        '   core_correction="T"\n'
+        '   functional="PBE"\n'
+        '   z_valence="1.300000000000000E+001"\n'
+        f'   mesh_size="{mesh_size}"\n'
+        f'   number_of_wfc="{len(chis)}"\n'
+        f'   number_of_proj="{num_beta}"/>\n',
+        '<PP_MESH dx="1.25E-002" mesh="{0}" xmin="-7.0E+000" rmax="1.0E+002" zmesh="3.1E+001">\n'.format(mesh_size),
+        _numeric_block('PP_R', mesh_size, rng),
+        _numeric_block('PP_RAB', mesh_size, rng),
+        '</PP_MESH>\n',
+        _numeric_block('PP_NLCC', mesh_size, rng),
+        _numeric_block('PP_LOCAL', mesh_size, rng),
+        '<PP_NONLOCAL>\n',
+    ]
+    for ibeta in range(1, num_beta + 1):
+        parts.append(_numeric_block(f'PP_BETA.{ibeta}', mesh_size, rng, f' index="{ibeta}" angular_momentum="{ibeta // 3}"'))
+    parts.append(_numeric_block('PP_DIJ', num_beta**2, rng))
+    parts.append('<PP_AUGMENTATION q_with_l="T" nqf="0" nqlc="5">\n')
+    for ibeta in range(1, num_beta + 1):
+        for jbeta in range(ibeta, num_beta + 1):
+            parts.append(_numeric_block(f'PP_QIJL.{ibeta}.{jbeta}.0', mesh_size, rng))
+    parts.append('</PP_AUGMENTATION>\n</PP_NONLOCAL>\n<PP_PSWFC>\n')
+    for ichi, (label, _, l, occupation) in enumerate(chis, start=1):
+        parts.append(_numeric_block(f'PP_CHI.{ichi}', mesh_size, rng, f' index="{ichi}" label="{label}" l="{l}" occupation="{occupation}"'))
+    parts.append('</PP_PSWFC>\n')
+    parts.append(_numeric_block('PP_RHOATOM', mesh_size, rng))
+    if soc:
+        parts.append('<PP_SPIN_ORB>\n')
+        index = 1
+        for label, n, l, occupation in chis:
+            for j in ((l - 0.5, l + 0.5) if l > 0 else (0.5,)):
+                parts.append(f'<PP_RELWFC.{index} index="{index}" els="{label}" nn="{n}" lchi="{l}" jchi="{j}" oc="{occupation / 2}"/>\n')
+                index += 1
+        for ibeta in range(1, num_beta + 1):
+            parts.append(f'<PP_RELBETA.{ibeta} index="{ibeta}" lll="{ibeta // 3}" jjj="{ibeta // 3 + 0.5}"/>\n')
+        parts.append('</PP_SPIN_ORB>\n')
+    parts.append('<PP_PAW paw_data_format="2" core_energy="-1.0E+003">\n')
+    parts.append(_numeric_block('PP_OCCUPATIONS', num_beta, rng))
+    parts.append(_numeric_block('PP_AE_NLCC', mesh_size, rng))
+    parts.append(_numeric_block('PP_AE_VLOC', mesh_size, rng))
+    for ibeta in range(1, num_beta + 1):
+        parts.append(_numeric_block(f'PP_AEWFC.{ibeta}', mesh_size, rng))
+        parts.append(_numeric_block(f'PP_PSWFC.{ibeta}', mesh_size, rng))
+    parts.append('</PP_PAW>\n</UPF>\n')
+    return ''.join(parts)
+
+
+def make_bands(num_kpoints, num_bands, gap=1.0, seed=0, num_occupied=None):
+    """Generate a (num_kpoints, num_bands) array of sorted band energies with a gap above `num_occupied` bands.
+
+    The gap is at the middle band by default.
+    """
+    rng = np.random.default_rng(seed)
+    kpath = np.linspace(0, 1, num_kpoints)[:, None]
+    centres = np.arange(num_bands) * 0.3
+    bands = centres + 0.4 * np.cos(2 * np.pi * kpath * rng.integers(1, 4, num_bands)) + 0.05 * rng.random((num_kpoints, num_bands))
+    bands.sort(axis=1)
+    bands[:, num_bands // 2 if num_occupied is None else num_occupied:] += gap
+    return bands
+
+
+def make_spin_bands(num_kpoints, num_bands, gap=1.0, seed=0):
+    """Generate the (2, num_kpoints, num_bands) bands of a spin-polarized semiconductor and its mid-gap Fermi energy.
+
+    The spin down channel has one occupied band less, so the highest valence band of the spin up channel
+    is a conduction band of the spin down channel.
+    """
+    num_occupied = num_bands // 2
+    bands = np.stack([
+        make_bands(num_kpoints, num_bands, gap=gap, seed=seed, num_occupied=num_occupied),
+        make_bands(num_kpoints, num_bands, gap=gap, seed=seed + 1, num_occupied=num_occupied - 1),
+    ])
+    vbm = max(bands[0, :, num_occupied - 1].max(), bands[1, :, num_occupied - 2].max())
+    cbm = min(bands[0, :, num_occupied].min(), bands[1, :, num_occupied - 1].min())
+    return bands, float(vbm + cbm) / 2
+
+
+def make_projectability(bands, mu=5.0, sigma=2.0, noise=0.05, seed=0):
+    """Generate projectabilities following erfc around `mu`, with noise, clipped to [0, 1]."""
+    from scipy.special import erfc
+    rng = np.random.default_rng(seed)
+    projectability = 0.5 * erfc((bands - mu) / sigma) + noise * rng.standard_normal(bands.shape)
+    return np.clip(projectability, 0, 1)
+
+
+def write_epwan(filename, num_atoms=2, num_wann=8, num_rvec_el=200, num_rvec_ph=100, seed=0):
+    """Write an HDF5 file with the `eph_matrix_wannier` layout of qe2pert.x."""
+    import h5py
+    rng = np.random.default_rng(seed)
+    shape = (num_rvec_el, num_rvec_ph, 3)
+    with h5py.File(filename, 'w') as h5:
+        basic_data = h5.create_group('basic_data')
+        basic_data['alat'] = 10.0
+        basic_data['at'] = np.eye(3).ravel()
+        group = h5.create_group('eph_matrix_wannier')
+        group['rvec_set_el'] = rng.integers(-5, 6, (num_rvec_el, 3))
+        group['rvec_set_ph'] = rng.integers(-5, 6, (num_rvec_ph, 3))
+        for ia in range(1, num_atoms + 1):
+            for jw in range(1, num_wann + 1):
+                for iw in range(1, num_wann + 1):
+                    group[f'ep_hop_r_{ia}_{jw}_{iw}'] = rng.standard_normal(shape)
+                    group[f'ep_hop_i_{ia}_{jw}_{iw}'] = rng.standard_normal(shape)
+
+
+def make_wannier_model(num_wann, num_cells=3, seed=0):
+    """Generate a Hermitian `WannierHamiltonian` on a (2 * num_cells + 1)^3 grid of R vectors, with decaying hoppings."""
+    from aiida_mobility.utils.wannier import WannierHamiltonian
+    rng = np.random.default_rng(seed)
+    axis = np.arange(-num_cells, num_cells + 1)
+    r_vectors = np.stack(np.meshgrid(axis, axis, axis, indexing='ij'), axis=-1).reshape(-1, 3)
+    hoppings = rng.standard_normal((len(r_vectors), num_wann, num_wann)) + 1j * rng.standard_normal(
+        (len(r_vectors), num_wann, num_wann))
+    hoppings *= np.exp(-np.linalg.norm(r_vectors, axis=1))[:, None, None]
+    # H(-R) = H(R)^dagger, the R vectors are symmetric around the origin
+    hamiltonian = 0.5 * (hoppings + hoppings[::-1].conj().transpose(0, 2, 1))
+    return WannierHamiltonian(
+        r_vectors=r_vectors,
+        degeneracies=np.ones(len(r_vectors), dtype=int),
+        hamiltonian=hamiltonian,
+        lattice=5.43 * np.eye(3),
+    )
+
+
+class MeshKpoints:
+    """Stand-in of a KpointsData with a mesh, since creating nodes requires an AiiDA profile."""
+
+    def __init__(self, mesh, offset=(0, 0, 0)):
+        self.mesh = list(mesh)
+        self.offset = list(offset)
+
+    def get_kpoints_mesh(self):
+        return self.mesh, self.offset
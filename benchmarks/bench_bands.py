@@ -0,0 +1,36 @@
+"""Benchmarks of the band window selection of the Perturbo workchain."""
+from aiida_mobility.workflows.mobility.perturbo import get_bands_info
+
+from ._data import make_bands, make_spin_bands
+
+
+class BandsInfoSuite:
+
+    params = [(10**4, 10**5), (100, 400)]
+    param_names = ['num_kpoints', 'num_bands']
+
+    def setup(self, num_kpoints, num_bands):
+        self.bands = make_bands(num_kpoints, num_bands)
+        self.fermi_energy = float(self.bands[:, num_bands // 2 - 1].max()) + 0.1
+
+    def time_get_bands_info(self, num_kpoints, num_bands):
+        get_bands_info(self.bands, self.fermi_energy)
+
+    def peakmem_get_bands_info(self, num_kpoints, num_bands):
+        get_bands_info(self.bands, self.fermi_energy)
+
+
+class SpinBandsInfoSuite:
+    """Spin-polarized semiconductor whose band ranges merged over the spins would cross the Fermi energy."""
+
+    params = [(10**4, 10**5), (100, 400)]
+    param_names = ['num_kpoints', 'num_bands']
+
+    def setup(self, num_kpoints, num_bands):
+        self.bands, self.fermi_energy = make_spin_bands(num_kpoints, num_bands)
+
+    def time_get_bands_info(self, num_kpoints, num_bands):
+        get_bands_info(self.bands, self.fermi_energy)
+
+    def peakmem_get_bands_info(self, num_kpoints, num_bands):
+        get_bands_info(self.bands, self.fermi_energy)
@@ -0,0 +1,70 @@
+"""Startup cost of the `aiida-mobility` entry point, which is run thousands of times by batch launch scripts."""
+import subprocess
+import sys
+
+# modules that must not be imported just to build the CLI, they belong inside the command bodies
+HEAVY_MODULES = (
+    'aiida_quantumespresso',
+    'aiida_wannier90',
+    'ase',
+    'scipy',
+    'click_completion',
+    'aiida_mobility.workflows',
+    'aiida_mobility.calculations',
+)
+
+
+def get_imported_modules(statement):
+    """Return the names of the modules imported by `statement` in a fresh interpreter, from `-X importtime`."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, universal_newlines=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            name = line.rsplit('|', 1)[1].strip()
+            if name != 'imported package':
+                modules.append(name)
+    return modules
+
+
+def get_heavy_modules(statement):
+    """Return the `HEAVY_MODULES` (and their submodules) imported by `statement`."""
+    return sorted(
+        name for name in get_imported_modules(statement)
+        if any(name == heavy or name.startswith(heavy + '.') for heavy in HEAVY_MODULES))
+
+
+class CliSuite:
+
+    def timeraw_import_cli(self):
+        return 'import aiida_mobility.cli'
+
+    def timeraw_launch_help(self):
+        return """
+        from click.testing import CliRunner
+        from aiida_mobility.cli import cmd_root
+        CliRunner().invoke(cmd_root, ['launch', '--help'])
+        """
+
+    def track_heavy_modules_import_cli(self):
+        """Must stay 0, otherwise a heavy import slipped to the top of a CLI module."""
+        return len(get_heavy_modules('import aiida_mobility.cli'))
+
+    track_heavy_modules_import_cli.unit = 'modules'
+
+    def track_heavy_modules_launch_help(self):
+        """Must stay 0, `launch --help` imports the command modules but not the workflows."""
+        return len(get_heavy_modules(
+            'from click.testing import CliRunner; from aiida_mobility.cli import cmd_root; '
+            'CliRunner().invoke(cmd_root, ["launch", "--help"])'))
+
+    track_heavy_modules_launch_help.unit = 'modules'
+
+
+if __name__ == '__main__':
+    # standalone check, e.g. `python benchmarks/bench_cli.py`, exits with 1 on a regression
+    heavy = get_heavy_modules('import aiida_mobility.cli')
+    for name in heavy:
+        print(f'heavy module imported by `aiida_mobility.cli`: {name}')
+    sys.exit(1 if heavy else 0)
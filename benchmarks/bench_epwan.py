@@ -0,0 +1,26 @@
+"""Benchmarks of the epwan decay analysis of `QE2PertParser.read_epwan`."""
+import os
+import tempfile
+
+from aiida_mobility.utils.epwan import analyze_epwan
+
+from ._data import write_epwan
+
+
+class EpwanSuite:
+
+    params = [1024**2, 64 * 1024**2]
+    param_names = ['chunk_size']
+    timeout = 300
+
+    def setup_cache(self):
+        tmpdir = tempfile.mkdtemp()
+        filename = os.path.join(tmpdir, 'aiida_epwan.h5')
+        write_epwan(filename)
+        return filename
+
+    def time_analyze_epwan(self, filename, chunk_size):
+        analyze_epwan(filename, chunk_size=chunk_size)
+
+    def peakmem_analyze_epwan(self, filename, chunk_size):
+        analyze_epwan(filename, chunk_size=chunk_size)
@@ -0,0 +1,32 @@
+"""Benchmarks of the kpoints mesh to list conversion behind `convert_kpoints_mesh_to_list`."""
+import numpy as np
+
+from aiida_mobility.utils import kmesh
+
+
+class KmeshSuite:
+
+    params = [8, 50, 200]
+    param_names = ['n']
+
+    def setup(self, n):
+        self.mesh = [n, n, n]
+        # silicon, used for the symmetry reduction
+        self.cell = np.array([[0, 2.7, 2.7], [2.7, 0, 2.7], [2.7, 2.7, 0]])
+        self.positions = [[0, 0, 0], [0.25, 0.25, 0.25]]
+        self.numbers = [14, 14]
+
+    def time_kpoints_mesh_list(self, n):
+        # the list is cached, measure the construction
+        kmesh._get_kpoints_mesh_list.cache_clear()
+        kmesh.get_kpoints_mesh_list(self.mesh, [0.5, 0.5, 0.5])
+
+    def peakmem_kpoints_mesh_list(self, n):
+        kmesh._get_kpoints_mesh_list.cache_clear()
+        kmesh.get_kpoints_mesh_list(self.mesh, [0.5, 0.5, 0.5])
+
+    def time_irreducible_kpoints(self, n):
+        kmesh.get_irreducible_kpoints(self.mesh, [0, 0, 0], self.cell, self.positions, self.numbers)
+
+    def time_kmesh_hash(self, n):
+        kmesh.get_kmesh_hash(self.mesh, [0, 0, 0], self.cell)
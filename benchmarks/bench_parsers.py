@@ -0,0 +1,32 @@
+"""Benchmarks of the namelist writers of the perturbo.x and qe2pert.x inputs."""
+import os
+import tempfile
+
+from aiida_mobility.parsers.data_parser.perturbo_parser import PerturboParser
+from aiida_mobility.parsers.data_parser.qe2pert_parser import QE2pertParser
+
+from ._data import MeshKpoints
+
+
+class WriterSuite:
+
+    def setup(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'aiida.in')
+
+    def teardown(self):
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+        os.rmdir(self.tmpdir)
+
+    def time_perturbo_write(self):
+        parser = PerturboParser(
+            calc_mode='trans', boltz_emin=6.4, boltz_emax=6.9, band_min=5, band_max=6,
+            boltz_nstep=50, hole=False, phfreq_cutoff=1, delta_smear=10, tmp_dir='./tmp')
+        parser.write(self.filename)
+
+    def time_qe2pert_write(self):
+        parser = QE2pertParser(
+            prefix='aiida', outdir='./out', phdir='./save', kpoints=MeshKpoints([8, 8, 8]),
+            dft_band_min=1, dft_band_max=16, num_wann=8, lwannier=True, system_2d=False)
+        parser.write(self.filename)
@@ -0,0 +1,17 @@
+"""Benchmarks of the protocol lookup done at every workflow launch."""
+from aiida_mobility.utils.protocols.pw import ProtocolManager
+
+
+class ProtocolSuite:
+
+    params = ['theos-ht-1.0', 'ms-1.0']
+    param_names = ['protocol']
+
+    def time_protocol_manager(self, protocol):
+        ProtocolManager(protocol)
+
+    def time_get_protocol_data(self, protocol):
+        ProtocolManager(protocol).get_protocol_data()
+
+    def peakmem_get_protocol_data(self, protocol):
+        ProtocolManager(protocol).get_protocol_data()
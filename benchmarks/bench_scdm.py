@@ -0,0 +1,22 @@
+"""Benchmarks of the erfc fitting of the SCDM projectability."""
+from aiida_mobility.utils.scdm import fit_scdm_mu_sigma
+
+from ._data import make_bands, make_projectability
+
+
+class ScdmSuite:
+
+    params = [(1000, 20000), ('binned', 'full')]
+    param_names = ['num_kpoints', 'fit']
+    timeout = 300
+
+    def setup(self, num_kpoints, fit):
+        self.bands = make_bands(num_kpoints, 60) * 0.5 - 5
+        self.projections = make_projectability(self.bands)
+        self.thresholds = {'sigma_factor': 3, 'num_bins': 0 if fit == 'full' else 2000}
+
+    def time_fit_scdm_mu_sigma(self, num_kpoints, fit):
+        fit_scdm_mu_sigma(self.bands, self.projections, self.thresholds)
+
+    def peakmem_fit_scdm_mu_sigma(self, num_kpoints, fit):
+        fit_scdm_mu_sigma(self.bands, self.projections, self.thresholds)
@@ -0,0 +1,40 @@
+"""Benchmarks of the UPF helpers used to set up the Wannier90 parameters."""
+from aiida_mobility.utils import upf
+
+from ._data import make_upf
+
+
+class UpfSuite:
+    """Parse a SSSP-like scalar relativistic PAW and a dojo-like fully relativistic pseudo."""
+
+    params = ['sssp', 'dojo']
+    param_names = ['pseudo']
+
+    def setup(self, pseudo):
+        self.content = make_upf(soc=(pseudo == 'dojo'))
+
+    def _clear(self):
+        # the index is memoized by md5, clear it so every call parses the file again
+        upf._UPF_INDEX_CACHE.clear()
+
+    def time_parse_zvalence(self, pseudo):
+        self._clear()
+        upf.parse_zvalence(self.content)
+
+    def time_parse_pswfc(self, pseudo):
+        self._clear()
+        if pseudo == 'dojo':
+            upf.parse_pswfc_soc(self.content)
+        else:
+            upf.parse_pswfc_nosoc(self.content)
+
+    def time_parse_number_of_pswfc(self, pseudo):
+        self._clear()
+        upf.parse_number_of_pswfc(self.content)
+
+    def time_parse_number_of_pswfc_memoized(self, pseudo):
+        upf.parse_number_of_pswfc(self.content)
+
+    def peakmem_parse_number_of_pswfc(self, pseudo):
+        self._clear()
+        upf.parse_number_of_pswfc(self.content)
@@ -0,0 +1,36 @@
+"""Benchmarks of the local Wannier interpolation behind `PertuborWorkChain.get_wannier_bands`."""
+from aiida_mobility.utils.wannier import get_dos, get_kpoint_grid, interpolate_bands
+
+from ._data import make_wannier_model
+
+
+class InterpolateBandsSuite:
+
+    params = [(10, 30), (1, 4)]
+    param_names = ['mesh', 'num_threads']
+    timeout = 300
+
+    def setup(self, mesh, num_threads):
+        self.model = make_wannier_model(16)
+        self.kpoints = get_kpoint_grid([mesh] * 3)
+
+    def time_interpolate_bands(self, mesh, num_threads):
+        interpolate_bands(self.model, self.kpoints, num_threads=num_threads)
+
+    def time_interpolate_velocities(self, mesh, num_threads):
+        interpolate_bands(self.model, self.kpoints, velocities=True, num_threads=num_threads)
+
+    def peakmem_interpolate_bands(self, mesh, num_threads):
+        interpolate_bands(self.model, self.kpoints, num_threads=num_threads)
+
+
+class DosSuite:
+
+    params = [100, 10000]
+    param_names = ['num_points']
+
+    def setup(self, num_points):
+        self.energies, _ = interpolate_bands(make_wannier_model(16), get_kpoint_grid([20] * 3))
+
+    def time_get_dos(self, num_points):
+        get_dos(self.energies, num_points=num_points)
@@ -12,6 +12,6 @@ if __name__ == "__main__":
         include_package_data=True,
         setup_requires=["reentry"],
         reentry_register=True,
-        packages=find_packages(exclude=["aiida"]),
+        packages=find_packages(exclude=["aiida", "benchmarks"]),
         **kwargs
     )